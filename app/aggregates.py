@@ -0,0 +1,193 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Iterable
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .db import dialect_insert
+from .models import Incident, IncidentRollup
+
+# Rollups kept for the SOC dashboard: counts per hour and per day, broken
+# down by these incident columns.
+GRANULARITIES = ("hour", "day")
+DIMENSIONS = ("risk_label", "evidence_type")
+
+# key = (granularity, dimension, bucket_start, value)
+Deltas = Counter
+
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown granularity '{granularity}'")
+
+
+def bucket_step(granularity: str) -> timedelta:
+    return timedelta(hours=1) if granularity == "hour" else timedelta(days=1)
+
+
+def _add(deltas: Deltas, created_at: datetime | None, dimension: str, value: str | None, amount: int) -> None:
+    if created_at is None or value is None:
+        return
+    for granularity in GRANULARITIES:
+        deltas[(granularity, dimension, bucket_start(created_at, granularity), value)] += amount
+
+
+def created_deltas(rows: Iterable[tuple[datetime, str, str]]) -> Deltas:
+    """Deltas for newly created incidents given as (created_at, risk_label, evidence_type)."""
+    deltas: Deltas = Counter()
+    for created_at, risk_label, evidence_type in rows:
+        _add(deltas, created_at, "risk_label", risk_label, 1)
+        _add(deltas, created_at, "evidence_type", evidence_type, 1)
+    return deltas
+
+
+def relabel_deltas(created_at: datetime | None, previous: str | None, current: str | None) -> Deltas:
+    """Deltas for an incident whose risk_label changed from ``previous`` to ``current``."""
+    deltas: Deltas = Counter()
+    if previous != current:
+        _add(deltas, created_at, "risk_label", previous, -1)
+        _add(deltas, created_at, "risk_label", current, 1)
+    return deltas
+
+
+def _upsert(db: Session | AsyncSession, deltas: Deltas):
+    insert = dialect_insert(db)
+    stmt = insert(IncidentRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[
+            IncidentRollup.granularity,
+            IncidentRollup.dimension,
+            IncidentRollup.bucket_start,
+            IncidentRollup.value,
+        ],
+        set_={"count": IncidentRollup.count + stmt.excluded.count},
+    )
+    # Sorted so concurrent transactions lock rollup rows in the same order.
+    params = [
+        {"granularity": g, "dimension": d, "bucket_start": b, "value": v, "count": n}
+        for (g, d, b, v), n in sorted(deltas.items())
+        if n
+    ]
+    return stmt, params
+
+
+def apply_deltas(db: Session, deltas: Deltas) -> None:
+    """Add ``deltas`` to the rollups within the caller's transaction."""
+    stmt, params = _upsert(db, deltas)
+    if params:
+        db.execute(stmt, params)
+
+
+async def apply_deltas_async(db: AsyncSession, deltas: Deltas) -> None:
+    stmt, params = _upsert(db, deltas)
+    if params:
+        await db.execute(stmt, params)
+
+
+async def summary(
+    db: AsyncSession,
+    granularity: str,
+    dimension: str,
+    since: datetime,
+    until: datetime,
+) -> list[dict]:
+    """Counts per bucket in [since, until), read straight from the rollup table."""
+    rows = await db.execute(
+        select(IncidentRollup.bucket_start, IncidentRollup.value, IncidentRollup.count)
+        .where(
+            IncidentRollup.granularity == granularity,
+            IncidentRollup.dimension == dimension,
+            IncidentRollup.bucket_start >= bucket_start(since, granularity),
+            IncidentRollup.bucket_start < until,
+            IncidentRollup.count != 0,
+        )
+        .order_by(IncidentRollup.bucket_start)
+    )
+    buckets: dict[datetime, dict] = {}
+    for start, value, count in rows:
+        buckets.setdefault(start, {})[value] = count
+    return [{"bucket_start": start, "counts": counts} for start, counts in buckets.items()]
+
+
+def compute_from_scratch(db: Session, batch_size: int = 10000) -> Deltas:
+    """Recount every incident; streams rows so memory is O(buckets)."""
+    deltas: Deltas = Counter()
+    rows = db.execute(
+        select(Incident.created_at, Incident.risk_label, Incident.evidence_type).execution_options(yield_per=batch_size)
+    )
+    for created_at, risk_label, evidence_type in rows:
+        _add(deltas, created_at, "risk_label", risk_label, 1)
+        _add(deltas, created_at, "evidence_type", evidence_type, 1)
+    return deltas
+
+
+def stored(db: Session) -> Deltas:
+    rows = db.execute(
+        select(
+            IncidentRollup.granularity,
+            IncidentRollup.dimension,
+            IncidentRollup.bucket_start,
+            IncidentRollup.value,
+            IncidentRollup.count,
+        ).where(IncidentRollup.count != 0)
+    )
+    return Counter({(g, d, b, v): n for g, d, b, v, n in rows})
+
+
+def rebuild(db: Session) -> int:
+    """Replace all rollups with a full recount. Returns the number of rows written.
+
+    On Postgres the rollup table is locked first: writers that commit
+    incidents meanwhile block on their rollup upsert and apply their delta
+    on top of the rebuilt counts, so nothing is lost or double counted.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("LOCK TABLE incident_rollups IN EXCLUSIVE MODE"))
+    deltas = compute_from_scratch(db)
+    db.execute(delete(IncidentRollup))
+    apply_deltas(db, deltas)
+    db.commit()
+    return len(deltas)
+
+
+def verify(db: Session) -> dict:
+    """Compare stored rollups with a full recount without modifying anything."""
+    expected = compute_from_scratch(db)
+    actual = stored(db)
+    mismatches = []
+    for key in sorted(set(expected) | set(actual)):
+        if expected.get(key, 0) != actual.get(key, 0):
+            granularity, dimension, start, value = key
+            mismatches.append({
+                "granularity": granularity,
+                "dimension": dimension,
+                "bucket_start": start.isoformat(),
+                "value": value,
+                "expected": expected.get(key, 0),
+                "stored": actual.get(key, 0),
+            })
+    return {"buckets": len(expected), "mismatches": mismatches}
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    from .db import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Incident rollup maintenance")
+    parser.add_argument("command", choices=["rebuild", "verify"], help="rebuild: recompute rollups; verify: diff against a recount")
+    args = parser.parse_args()
+
+    with SessionLocal() as session:
+        if args.command == "rebuild":
+            print(f"Rebuilt {rebuild(session)} rollup rows")
+        else:
+            report = verify(session)
+            print(json.dumps(report, indent=2, default=str))
+            raise SystemExit(1 if report["mismatches"] else 0)
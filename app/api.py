@@ -1,34 +1,67 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field, ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import text
-from datetime import datetime, timedelta
+from sqlalchemy import insert, select, text, tuple_
+from sqlalchemy.orm import selectinload
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+import asyncio
+import base64
+import hashlib
+import ipaddress
+import json
+import logging
 import secrets
+from typing import Iterable
+from urllib.parse import quote
 
-from .db import Base, engine, get_db
-from .models import Incident, Evidence, User
+from .db import dialect_insert, engine, get_async_db, get_db
+from .models import CertAcknowledgement, Incident, IncidentSignature, Evidence, Indicator, User
 
-from . import storage
-
-from passlib.context import CryptContext
+from . import aggregates, auth, incidents, iocs, jobs, migrations, outbox, passwords, storage
 
 import os
 from fastapi import Request
-from .webhooks import post_cert_webhook, verify_signature, get_cert_webhook_config
+from .webhooks import get_cert_secrets, get_replay_cache, parse_signature_header, verify_signature
 
 
 router = APIRouter()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
+
+# X-Real-IP is client-controlled unless a proxy overwrites it, so it is only
+# trusted when TRUST_PROXY_HEADERS is set (the bundled nginx sets it) and,
+# if TRUSTED_PROXIES lists addresses or networks, the peer is one of them.
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "0").lower() in ("1", "true", "yes")
+TRUSTED_PROXIES = tuple(
+    ipaddress.ip_network(p.strip(), strict=False) for p in os.getenv("TRUSTED_PROXIES", "").split(",") if p.strip()
+)
 
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+def _from_trusted_proxy(peer: str | None) -> bool:
+    if not TRUST_PROXY_HEADERS or peer is None:
+        return False
+    if not TRUSTED_PROXIES:
+        return True
+    try:
+        address = ipaddress.ip_address(peer)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
 
+def client_ip(request: Request) -> str:
+    peer = request.client.host if request.client else None
+    if request.headers.get("X-Real-IP") and _from_trusted_proxy(peer):
+        return request.headers["X-Real-IP"]
+    return peer or "unknown"
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+
+def _too_many(retry_after: float, detail: str = "Too many login attempts") -> HTTPException:
+    return HTTPException(status_code=429, detail=detail, headers={"Retry-After": str(max(1, int(retry_after + 0.5)))})
 
 
 def generate_otp() -> str:
@@ -42,12 +75,15 @@ class UserCreate(BaseModel):
 
 
 @router.post("/users/")
-def register_user(user_in: UserCreate, db: Session = Depends(get_db)) -> dict:
-    existing = db.query(User).filter(User.email == user_in.email).first()
+async def register_user(user_in: UserCreate, db: AsyncSession = Depends(get_async_db)) -> dict:
+    existing = (await db.execute(select(User.id).where(User.email == user_in.email))).first()
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed = get_password_hash(user_in.password)
+    try:
+        hashed = await passwords.hash_password(user_in.password)
+    except passwords.PasswordPoolFull:
+        raise _too_many(1, "Server busy, retry shortly")
     otp = generate_otp()
     otp_expires = datetime.utcnow() + timedelta(minutes=10)
 
@@ -58,10 +94,10 @@ def register_user(user_in: UserCreate, db: Session = Depends(get_db)) -> dict:
         is_active=True,
         otp_code=otp,
         otp_expires_at=otp_expires,
+        created_at=datetime.utcnow(),
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
 
     return {"id": user.id, "email": user.email, "otp": otp}
 
@@ -93,29 +129,72 @@ def verify_otp(payload: OTPVerify, db: Session = Depends(get_db)) -> dict:
 
 
 @router.post("/login/token")
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)) -> dict:
-
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not user.hashed_password:
+async def login_for_access_token(
+    request: Request,
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_async_db),
+) -> dict:
+    ip = client_ip(request)
+    account = form_data.username.strip().lower()
+    # Throttle before any bcrypt work is spent on the attempt.
+    wait = max(passwords.ip_limiter.retry_after(ip), passwords.account_limiter.retry_after(account))
+    if wait:
+        raise _too_many(wait)
+    passwords.ip_limiter.hit(ip)
+
+    user = (await db.execute(select(User).where(User.email == form_data.username))).scalar_one_or_none()
+    try:
+        ok, new_hash = await passwords.verify_and_update(form_data.password, user.hashed_password if user else None)
+    except passwords.PasswordPoolFull:
+        raise _too_many(1, "Server busy, retry shortly")
+    if not ok:
+        passwords.account_limiter.hit(account)
         raise HTTPException(status_code=400, detail="Incorrect username or password")
+    passwords.account_limiter.reset(account)
+
+    if new_hash:
+        # Stored hash used an outdated scheme or cost; upgrade it in place.
+        user.hashed_password = new_hash
+        await db.commit()
+
+    tokens = await auth.create_session(db, user.id, user.email)
+    await db.commit()
+    return tokens
 
-    if not verify_password(form_data.password, user.hashed_password):
-        raise HTTPException(status_code=400, detail="Incorrect username or password")
 
-    token = secrets.token_urlsafe(32)
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
-    return {"access_token": token, "token_type": "bearer"}
+
+@router.post("/auth/refresh")
+async def refresh_access_token(payload: RefreshRequest, db: AsyncSession = Depends(get_async_db)) -> dict:
+    # Refresh tokens are single use: the presented one is revoked and a new
+    # session issued in the same transaction.
+    session = await auth.revoke_refresh_token(db, payload.refresh_token)
+    if session is None:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    user = await db.get(User, session.user_id)
+    if user is None or not user.is_active:
+        await db.rollback()
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    tokens = await auth.create_session(db, user.id, user.email)
+    await db.commit()
+    return tokens
+
+
+@router.post("/auth/logout")
+async def logout(payload: RefreshRequest, db: AsyncSession = Depends(get_async_db)) -> dict:
+    session = await auth.revoke_refresh_token(db, payload.refresh_token)
+    await db.commit()
+    return {"status": "logged_out", "revoked": session is not None}
 
 
 @router.on_event("startup")
 def on_startup() -> None:
-    Base.metadata.create_all(bind=engine)
-    # Lightweight migration to add OTP columns if they don't exist
-    from sqlalchemy import text as _text
-    with engine.begin() as conn:
-        conn.execute(_text("ALTER TABLE users ADD COLUMN IF NOT EXISTS otp_code VARCHAR(16)"))
-        conn.execute(_text("ALTER TABLE users ADD COLUMN IF NOT EXISTS otp_expires_at TIMESTAMP"))
-        conn.execute(_text("ALTER TABLE users ADD COLUMN IF NOT EXISTS created_at TIMESTAMP"))
+    # Schema changes are versioned migrations applied once per deploy
+    # (python -m app.migrations upgrade; app.serve runs it in the master).
+    # Workers only check that the database is current.
+    migrations.ensure_schema(engine)
 
 
 @router.get("/db-check")
@@ -124,51 +203,496 @@ def db_check(db: Session = Depends(get_db)) -> dict:
     return {"db": "ok"}
 
 
+# Backpressure for uploads: at most MAX_CONCURRENT_UPLOADS are hashed and
+# encrypted at once; others wait up to UPLOAD_QUEUE_TIMEOUT seconds, then
+# get 503 so clients back off instead of piling onto the worker.
+MAX_CONCURRENT_UPLOADS = int(os.getenv("MAX_CONCURRENT_UPLOADS", "8"))
+UPLOAD_QUEUE_TIMEOUT = float(os.getenv("UPLOAD_QUEUE_TIMEOUT", "10"))
+_upload_slots = asyncio.Semaphore(MAX_CONCURRENT_UPLOADS)
+
+
+@asynccontextmanager
+async def upload_slot():
+    try:
+        await asyncio.wait_for(_upload_slots.acquire(), timeout=UPLOAD_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Too many concurrent uploads", headers={"Retry-After": "5"})
+    try:
+        yield
+    finally:
+        _upload_slots.release()
+
+
 # Upload evidence and create incident
-@router.post("/incidents")
-def create_incident(
+@router.post("/incidents", dependencies=[Depends(auth.require_user)])
+async def create_incident(
     reporter_id: str = Form(...),
     evidence_type: str = Form(...),
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    description: str | None = Form(None, max_length=10000),
+    db: AsyncSession = Depends(get_async_db),
 ) -> dict:
-    # Read file bytes
-    file_bytes = file.file.read()
+    extractor = iocs.IOCExtractor()
+    async with upload_slot():
+        # Hash, encrypt and scan for indicators in one streaming pass, off the event loop
+        staged = await storage.stage_encrypted_upload(file, observers=[extractor.feed])
+        indicators = await storage.run_in_upload_pool(extractor.finish)
+    sha256 = staged.sha256
 
-    # Compute hash
-    sha256 = storage.compute_sha256(file_bytes)
+    try:
+        # Incident, blob reference and evidence in one transaction; ids come
+        # back via INSERT ... RETURNING instead of refresh round-trips.
+        incident_id, created_at = (
+            await db.execute(
+                insert(Incident)
+                .values(reporter_id=reporter_id, evidence_type=evidence_type, risk_label="Pending", description=description)
+                .returning(Incident.id, Incident.created_at)
+            )
+        ).one()
+        await aggregates.apply_deltas_async(
+            db, aggregates.created_deltas([(created_at, "Pending", evidence_type)])
+        )
 
-    # Save encrypted file
-    safe_filename = f"{reporter_id}_{sha256[:12]}"
-    storage_path = storage.save_encrypted_file(file_bytes, safe_filename)
+        # Store evidence metadata; identical files share one blob
+        storage_path = await storage.acquire_blob_async(db, staged)
+        evidence_id = (
+            await db.execute(
+                insert(Evidence)
+                .values(incident_id=incident_id, filename=file.filename, sha256=sha256, storage_path=storage_path)
+                .returning(Evidence.id)
+            )
+        ).scalar_one()
+        await iocs.store_async(db, indicators, incident_id, evidence_id)
+        # Classified in the background by `python -m app.jobs worker`
+        await jobs.enqueue(db, [incident_id], lane="interactive")
+        await db.commit()
+    finally:
+        staged.discard()
 
-    # Create incident
-    incident = Incident(
-        reporter_id=reporter_id,
-        evidence_type=evidence_type,
-        risk_label="Pending"
-    )
-    db.add(incident)
-    db.commit()
-    db.refresh(incident)
-
-    # Store evidence metadata
-    evidence = Evidence(
-        incident_id=incident.id,
-        filename=file.filename,
-        sha256=sha256,
-        storage_path=storage_path,
+    return {
+        "incident_id": incident_id,
+        "evidence_id": evidence_id,
+        "sha256": sha256,
+        "indicators": len(indicators),
+    }
+
+
+def _naive_utc(value: datetime) -> datetime:
+    """Timestamps are stored as naive UTC; convert aware inputs accordingly."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+# --- Incident listing ---
+
+def _encode_cursor(created_at: datetime, incident_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), incident_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, incident_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(incident_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/incidents", dependencies=[Depends(auth.require_user)])
+async def list_incidents(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
+    risk_label: str | None = None,
+    evidence_type: str | None = None,
+    reporter_id: str | None = None,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    db: AsyncSession = Depends(get_async_db),
+) -> dict:
+    """Incidents newest first, keyset-paginated on (created_at, id).
+
+    Pass ``next_cursor`` from the previous page as ``cursor``. Each page is
+    an index range scan, so latency does not grow with table size or page
+    depth. Evidence is loaded for the whole page in one extra query.
+    """
+    stmt = select(Incident).options(selectinload(Incident.evidences))
+    if risk_label is not None:
+        stmt = stmt.where(Incident.risk_label == risk_label)
+    if evidence_type is not None:
+        stmt = stmt.where(Incident.evidence_type == evidence_type)
+    if reporter_id is not None:
+        stmt = stmt.where(Incident.reporter_id == reporter_id)
+    if created_after is not None:
+        stmt = stmt.where(Incident.created_at >= _naive_utc(created_after))
+    if created_before is not None:
+        stmt = stmt.where(Incident.created_at < _naive_utc(created_before))
+    if cursor:
+        after_created_at, after_id = _decode_cursor(cursor)
+        stmt = stmt.where(tuple_(Incident.created_at, Incident.id) < tuple_(after_created_at, after_id))
+    stmt = stmt.order_by(Incident.created_at.desc(), Incident.id.desc()).limit(limit + 1)
+
+    incidents = (await db.execute(stmt)).scalars().all()
+    has_more = len(incidents) > limit
+    incidents = incidents[:limit]
+
+    items = [
+        {
+            "id": incident.id,
+            "reporter_id": incident.reporter_id,
+            "evidence_type": incident.evidence_type,
+            "risk_label": incident.risk_label,
+            "created_at": incident.created_at,
+            "evidence": [
+                {"id": ev.id, "filename": ev.filename, "sha256": ev.sha256, "created_at": ev.created_at}
+                for ev in incident.evidences
+            ],
+        }
+        for incident in incidents
+    ]
+    next_cursor = _encode_cursor(incidents[-1].created_at, incidents[-1].id) if has_more else None
+    return {"items": items, "next_cursor": next_cursor}
+
+
+# --- Dashboard aggregates ---
+
+@router.get("/stats/incidents", dependencies=[Depends(auth.require_user)])
+async def incident_stats(
+    granularity: str = Query("day", pattern="^(hour|day)$"),
+    dimension: str = Query("risk_label", pattern="^(risk_label|evidence_type)$"),
+    since: datetime | None = None,
+    until: datetime | None = None,
+    db: AsyncSession = Depends(get_async_db),
+) -> dict:
+    """Incident counts per time bucket, served from the rollup table.
+
+    Defaults to the last 48 hours for hourly buckets and the last 30 days
+    for daily ones. Cost is proportional to the number of buckets, not
+    the number of incidents.
+    """
+    until = _naive_utc(until) if until else datetime.utcnow()
+    since = _naive_utc(since) if since else until - (timedelta(hours=48) if granularity == "hour" else timedelta(days=30))
+    buckets = await aggregates.summary(db, granularity, dimension, since, until)
+
+    totals: dict[str, int] = {}
+    for bucket in buckets:
+        for value, count in bucket["counts"].items():
+            totals[value] = totals.get(value, 0) + count
+    return {
+        "granularity": granularity,
+        "dimension": dimension,
+        "since": since,
+        "until": until,
+        "totals": totals,
+        "buckets": buckets,
+    }
+
+
+# --- Bulk incident ingest (partner CERT feeds) ---
+
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "50000"))
+BULK_BATCH_SIZE = 1000
+
+
+class BulkIncident(BaseModel):
+    reporter_id: str = Field(min_length=1, max_length=64)
+    evidence_type: str = Field(min_length=1, max_length=32)
+    risk_label: str = Field(default="Pending", min_length=1, max_length=16)
+    description: str | None = Field(default=None, max_length=10000)
+    created_at: datetime | None = None
+
+
+async def _ndjson_lines(chunks):
+    """Split an async byte stream into lines without buffering the whole body."""
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+async def _upload_chunks(upload: UploadFile):
+    while chunk := await upload.read(64 * 1024):
+        yield chunk
+
+
+async def _bulk_sources(request: Request):
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        for _name, value in form.multi_items():
+            if hasattr(value, "read"):
+                yield _ndjson_lines(_upload_chunks(value))
+    else:
+        yield _ndjson_lines(request.stream())
+
+
+# --- Near-duplicate incidents ---
+
+@router.get("/incidents/{incident_id}/similar", dependencies=[Depends(auth.require_user)])
+async def similar_incidents(
+    incident_id: int,
+    limit: int = Query(10, ge=1, le=100),
+    threshold: float | None = Query(None, ge=0.0, le=1.0),
+    db: AsyncSession = Depends(get_async_db),
+) -> dict:
+    """The incident's near-duplicate cluster and its nearest indexed neighbours.
+
+    Incidents are indexed by the classification worker, so a brand-new
+    incident returns 404 until its job has run. ``threshold`` defaults to
+    SIMILARITY_THRESHOLD.
+    """
+    from . import similarity  # pulls in numpy; loaded on first use
+
+    if threshold is None:
+        threshold = similarity.SIMILARITY_THRESHOLD
+    indexed = await db.get(IncidentSignature, incident_id)
+    if indexed is None:
+        raise HTTPException(status_code=404, detail="Incident not indexed yet")
+    found = await similarity.neighbours(
+        db, similarity.from_bytes(indexed.signature), threshold=threshold, limit=limit, exclude=incident_id
     )
-    db.add(evidence)
-    db.commit()
-    db.refresh(evidence)
+    labels = dict(
+        (await db.execute(select(Incident.id, Incident.risk_label).where(Incident.id.in_([n for n, _c, _s in found])))).all()
+    ) if found else {}
+    return {
+        "incident_id": incident_id,
+        "cluster_id": indexed.cluster_id,
+        "cluster_size": await similarity.cluster_size(db, indexed.cluster_id),
+        "neighbours": [
+            {"id": n, "cluster_id": cluster, "similarity": round(score, 3), "risk_label": labels.get(n)}
+            for n, cluster, score in found
+        ],
+    }
+
+
+# --- Indicator lookup ---
+
+@router.get("/indicators/lookup", dependencies=[Depends(auth.require_user)])
+async def lookup_indicator(
+    value: str = Query(..., min_length=1, max_length=iocs.MAX_VALUE_LENGTH),
+    kind: str | None = Query(None, pattern="^(" + "|".join(iocs.KINDS) + ")$"),
+    limit: int = Query(50, ge=1, le=500),
+    before_id: int | None = None,
+    db: AsyncSession = Depends(get_async_db),
+) -> dict:
+    """Incidents whose evidence mentions ``value``, newest first.
+
+    ``value`` is normalized like extracted indicators (refanged,
+    lowercased where case does not matter), so ``evil[.]com`` finds
+    ``evil.com``. Pages with ``before_id`` = the last incident id returned.
+    """
+    kind = kind or iocs.guess_kind(value)
+    if kind is None:
+        raise HTTPException(status_code=400, detail="Not a recognised indicator; pass kind explicitly")
+    normalized = iocs.normalize(kind, value)
+    if normalized is None:
+        raise HTTPException(status_code=400, detail=f"Not a valid {kind}")
+
+    # Walks ix_indicators_value_kind_incident_id backwards; incidents are only
+    # read for the ids on this page.
+    ids = select(Indicator.incident_id).where(Indicator.value == normalized, Indicator.kind == kind)
+    if before_id is not None:
+        ids = ids.where(Indicator.incident_id < before_id)
+    ids = ids.distinct().order_by(Indicator.incident_id.desc()).limit(limit)
+    incident_ids = (await db.execute(ids)).scalars().all()
+    rows = (await db.execute(select(Incident).where(Incident.id.in_(incident_ids)))).scalars().all() if incident_ids else []
+    by_id = {incident.id: incident for incident in rows}
 
     return {
-        "incident_id": incident.id,
-        "evidence_id": evidence.id,
-        "sha256": sha256,
+        "kind": kind,
+        "value": normalized,
+        "incidents": [
+            {
+                "id": incident.id,
+                "reporter_id": incident.reporter_id,
+                "evidence_type": incident.evidence_type,
+                "risk_label": incident.risk_label,
+                "created_at": incident.created_at,
+            }
+            for incident in (by_id[i] for i in incident_ids if i in by_id)
+        ],
+        "next_before_id": incident_ids[-1] if len(incident_ids) == limit else None,
+    }
+
+
+@router.get("/jobs/stats", dependencies=[Depends(auth.require_user)])
+async def classification_queue_stats(db: AsyncSession = Depends(get_async_db)) -> dict:
+    """Classification queue depth and lag per priority lane."""
+    return await jobs.queue_stats(db)
+
+
+class ClassifyRequest(BaseModel):
+    text: str = Field(min_length=1, max_length=jobs.CLASSIFY_MAX_BYTES)
+
+
+@router.post("/classify", dependencies=[Depends(auth.require_user)])
+async def classify(payload: ClassifyRequest) -> dict:
+    """Score free text with the zero-shot classifier without creating an incident."""
+    from . import ml
+
+    ranked = await asyncio.to_thread(ml.classify_text, payload.text)
+    risk_label, category, score = jobs.risk_for(ranked)
+    return {
+        "risk_label": risk_label,
+        "category": category,
+        "score": score,
+        "labels": [{"label": label, "score": float(s)} for label, s in ranked],
+    }
+
+
+@router.post("/incidents:bulk", dependencies=[Depends(auth.require_user)])
+async def bulk_create_incidents(request: Request, db: AsyncSession = Depends(get_async_db)) -> dict:
+    """Create many incidents from NDJSON (request body or multipart file parts).
+
+    Each non-empty line is one incident object. Valid rows are inserted in
+    batches with a single multi-row INSERT ... RETURNING per batch and one
+    commit at the end; invalid lines are reported individually and skipped.
+    """
+    results: list[dict] = []
+    batch: list[tuple[int, dict]] = []
+    line_no = 0
+
+    async def flush() -> None:
+        rows = [row for _line, row in batch]
+        ids = (
+            await db.execute(insert(Incident).returning(Incident.id, sort_by_parameter_order=True), rows)
+        ).scalars().all()
+        results.extend({"line": line, "id": new_id} for (line, _row), new_id in zip(batch, ids))
+        await aggregates.apply_deltas_async(
+            db, aggregates.created_deltas((r["created_at"], r["risk_label"], r["evidence_type"]) for r in rows)
+        )
+        # Without evidence only a description can be classified.
+        await jobs.enqueue(
+            db, [new_id for r, new_id in zip(rows, ids) if r["risk_label"] == "Pending" and r["description"]]
+        )
+        batch.clear()
+
+    async for lines in _bulk_sources(request):
+        async for raw in lines:
+            line_no += 1
+            if not raw.strip():
+                continue
+            if line_no > BULK_MAX_ITEMS:
+                raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_ITEMS} items per request")
+            try:
+                item = BulkIncident.model_validate_json(raw)
+            except ValidationError as exc:
+                results.append({"line": line_no, "error": json.loads(exc.json(include_url=False))})
+                continue
+            row = item.model_dump()
+            if row["created_at"] is None:
+                row["created_at"] = datetime.utcnow()
+            else:
+                row["created_at"] = _naive_utc(row["created_at"])
+            batch.append((line_no, row))
+            if len(batch) >= BULK_BATCH_SIZE:
+                await flush()
+
+    if batch:
+        await flush()
+    await db.commit()
+
+    results.sort(key=lambda r: r["line"])
+    created = sum(1 for r in results if "id" in r)
+    return {"created": created, "failed": len(results) - created, "results": results}
+
+
+# --- Evidence download ---
+
+def _parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """Parse a single ``bytes=`` range into inclusive (start, end).
+
+    Returns None when the header should be ignored (absent, malformed or
+    multi-range, which we answer with the full body) and raises 416 when
+    the range cannot be satisfied.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first == "":
+            suffix = int(last)
+            if suffix <= 0:
+                raise ValueError
+            start, end = max(size - suffix, 0), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+            if last and end < start:
+                # Invalid byte-range-spec: ignore it and serve the whole file (RFC 9110 14.1.1).
+                return None
+    except ValueError:
+        return None
+    if start >= size:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, min(end, size - 1)
+
+
+def _verified_stream(path: str, chunks: Iterable[bytes], expected_sha256: str):
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk)
+        yield chunk
+    if digest.hexdigest() != expected_sha256:
+        # Headers are already sent; abort so the client sees a broken transfer.
+        logger.error("Evidence %s failed SHA-256 verification", path)
+        raise RuntimeError("evidence integrity check failed")
+
+
+@router.get("/evidence/{evidence_id}/content", dependencies=[Depends(auth.require_user)])
+def get_evidence_content(evidence_id: int, request: Request, db: Session = Depends(get_db)) -> StreamingResponse:
+    evidence = db.query(Evidence).filter(Evidence.id == evidence_id).first()
+    if not evidence:
+        raise HTTPException(status_code=404, detail="Evidence not found")
+
+    path = evidence.storage_path
+    # Legacy Fernet files can only be decrypted whole: do it once and serve
+    # from memory rather than decrypting again to stream.
+    legacy = storage.read_legacy(path)
+    size = len(legacy) if legacy is not None else storage.plaintext_size(path)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": f'"{evidence.sha256}"',
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(evidence.filename or str(evidence.id))}",
     }
 
+    byte_range = _parse_range(request.headers.get("range", ""), size) if size else None
+    if byte_range is None:
+        # Whole file: the stored SHA-256 is checked as the bytes go out.
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(
+            _verified_stream(path, [legacy] if legacy is not None else storage.decrypt_stream(path), evidence.sha256),
+            media_type="application/octet-stream",
+            headers=headers,
+        )
+
+    # Partial content: every segment touched is still GCM-authenticated.
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        [legacy[start : end + 1]] if legacy is not None else storage.decrypt_range(path, start, end),
+        status_code=206,
+        media_type="application/octet-stream",
+        headers=headers,
+    )
+
+
+@router.delete("/evidence/{evidence_id}", dependencies=[Depends(auth.require_user)])
+def delete_evidence(evidence_id: int, db: Session = Depends(get_db)) -> dict:
+    evidence = db.query(Evidence).filter(Evidence.id == evidence_id).first()
+    if not evidence:
+        raise HTTPException(status_code=404, detail="Evidence not found")
+    # Drops one blob reference; the file itself goes in `python -m app.storage gc`.
+    storage.delete_evidence(db, evidence)
+    db.commit()
+    return {"status": "deleted", "evidence_id": evidence_id}
+
 
 # --- CERT Webhook integration ---
 
@@ -176,60 +700,98 @@ class RiskUpdate(BaseModel):
     risk_label: str
 
 
-@router.post("/incidents/{incident_id}/risk")
-async def update_incident_risk(incident_id: int, payload: RiskUpdate, db: Session = Depends(get_db)) -> dict:
-    incident = db.query(Incident).filter(Incident.id == incident_id).first()
+@router.post("/incidents/{incident_id}/risk", dependencies=[Depends(auth.require_user)])
+async def update_incident_risk(incident_id: int, payload: RiskUpdate, db: AsyncSession = Depends(get_async_db)) -> dict:
+    # Row lock so a racing relabel or the classification worker cannot read
+    # the same prior label and apply the same rollup deltas twice.
+    incident = (
+        await db.execute(select(Incident).where(Incident.id == incident_id).with_for_update())
+    ).scalar_one_or_none()
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
 
-    prior = incident.risk_label
-    incident.risk_label = payload.risk_label
-    db.add(incident)
-    db.commit()
-    db.refresh(incident)
-
-    pushed = False
-    status = None
-    if payload.risk_label.lower() == "red":
-        # Fetch latest evidence for additional context
-        latest_evidence = (
-            db.query(Evidence)
-            .filter(Evidence.incident_id == incident.id)
-            .order_by(Evidence.created_at.desc())
-            .first()
-        )
-
-        cert_payload = {
-            "incident_id": incident.id,
-            "reporter_id": incident.reporter_id,
-            "evidence_type": incident.evidence_type,
-            "risk_label": incident.risk_label,
-            "updated_at": datetime.utcnow().isoformat() + "Z",
-            "evidence_sha256": getattr(latest_evidence, "sha256", None),
-            "evidence_filename": getattr(latest_evidence, "filename", None),
-        }
-        status, _text = await post_cert_webhook(cert_payload)
-        pushed = 200 <= status < 300
+    prior, outbox_id = await incidents.apply_risk_label(db, incident, payload.risk_label)
+    await db.commit()
+    if outbox_id is not None:
+        outbox.notify()
 
-    return {"id": incident.id, "previous": prior, "current": incident.risk_label, "webhook_sent": pushed, "webhook_status": status}
+    return {
+        "id": incident.id,
+        "previous": prior,
+        "current": incident.risk_label,
+        "webhook_queued": outbox_id is not None,
+        "outbox_id": outbox_id,
+    }
 
 
 class CertAck(BaseModel):
     received: bool
     incident_id: int | None = None
+    count: int = 1
+
+
+CERT_SIGNATURE_TOLERANCE_SECONDS = int(os.getenv("CERT_SIGNATURE_TOLERANCE_SECONDS", "300"))
+CERT_INGEST_MAX_EVENTS = int(os.getenv("CERT_INGEST_MAX_EVENTS", "1000"))
+
+
+def _parse_cert_events(raw: bytes, content_type: str) -> list[dict]:
+    # Parsed once from the bytes that were verified; NDJSON is what
+    # post_cert_batch sends, one event per line.
+    if content_type.split(";")[0].strip() == "application/x-ndjson":
+        events = [json.loads(line) for line in raw.splitlines() if line.strip()]
+    else:
+        events = [json.loads(raw)]
+    if not events or not all(isinstance(e, dict) for e in events):
+        raise ValueError("expected JSON objects")
+    return events
+
+
+def _optional_int(value) -> int | None:
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
 
 
 @router.post("/cert/ingest")
-async def cert_ingest(request: Request) -> CertAck:
+async def cert_ingest(request: Request, db: AsyncSession = Depends(get_async_db)) -> CertAck:
     raw = await request.body()
     sig = request.headers.get("X-CERT-Signature", "")
-    _url, secret = get_cert_webhook_config()
-    if not verify_signature(sig, raw, secret):
+    if not verify_signature(sig, raw, get_cert_secrets(), CERT_SIGNATURE_TOLERANCE_SECONDS):
         raise HTTPException(status_code=401, detail="invalid signature")
+    _ts, digest = parse_signature_header(sig)
 
     try:
-        data = await request.json()
-    except Exception:
+        events = _parse_cert_events(raw, request.headers.get("content-type", ""))
+    except (ValueError, UnicodeDecodeError):
         raise HTTPException(status_code=400, detail="invalid json")
+    if len(events) > CERT_INGEST_MAX_EVENTS:
+        raise HTTPException(status_code=413, detail=f"At most {CERT_INGEST_MAX_EVENTS} events per request")
+
+    # Fast in-process check first; the unique (signature, seq) key below
+    # catches replays that land on another worker.
+    if not get_replay_cache().add(digest):
+        raise HTTPException(status_code=409, detail="replayed request")
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            "signature": digest,
+            "seq": seq,
+            "incident_id": _optional_int(event.get("incident_id")),
+            "risk_label": str(event["risk_label"])[:32] if event.get("risk_label") is not None else None,
+            "payload": json.dumps(event, separators=(",", ":")),
+            "received_at": now,
+        }
+        for seq, event in enumerate(events)
+    ]
+    stmt = dialect_insert(db)(CertAcknowledgement).on_conflict_do_nothing(
+        index_elements=[CertAcknowledgement.signature, CertAcknowledgement.seq]
+    )
+    inserted = (await db.execute(stmt.returning(CertAcknowledgement.id), rows)).scalars().all()
+    if not inserted:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="replayed request")
+    await db.commit()
 
-    return CertAck(received=True, incident_id=int(data.get("incident_id")) if data.get("incident_id") is not None else None)
+    return CertAck(received=True, incident_id=rows[0]["incident_id"], count=len(inserted))
@@ -0,0 +1,232 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import AsyncSessionLocal
+from .models import RefreshToken
+
+logger = logging.getLogger(__name__)
+
+ACCESS_TOKEN_TTL_SECONDS = int(os.getenv("ACCESS_TOKEN_TTL_SECONDS", "900"))
+REFRESH_TOKEN_TTL_SECONDS = int(os.getenv("REFRESH_TOKEN_TTL_SECONDS", str(14 * 24 * 3600)))
+# How often each worker pulls revocations made by other workers.
+AUTH_REVOCATION_SYNC_SECONDS = float(os.getenv("AUTH_REVOCATION_SYNC_SECONDS", "5"))
+
+
+@lru_cache(maxsize=1)
+def get_token_secrets() -> tuple[bytes, ...]:
+    """Signing keys, resolved once. ``AUTH_TOKEN_SECRETS`` is comma-separated
+    for rotation: the first signs new tokens, all are accepted."""
+    configured = [s.strip() for s in os.getenv("AUTH_TOKEN_SECRETS", "").split(",") if s.strip()]
+    if not configured:
+        configured = [os.getenv("AUTH_TOKEN_SECRET", "dev_auth_secret")]
+    return tuple(s.encode("utf-8") for s in configured)
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(body: bytes, key: bytes) -> bytes:
+    return hmac.new(key, body, hashlib.sha256).digest()
+
+
+@dataclass(frozen=True, slots=True)
+class TokenClaims:
+    user_id: int
+    email: str
+    session_id: int
+    expires_at: int
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def issue_access_token(user_id: int, email: str, session_id: int, ttl_seconds: int = ACCESS_TOKEN_TTL_SECONDS) -> str:
+    """``<base64url(claims)>.<base64url(hmac-sha256)>``; verifiable without a DB hit."""
+    claims = {"sub": user_id, "email": email, "sid": session_id, "exp": int(time.time()) + ttl_seconds}
+    body = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8")).encode("ascii")
+    return body.decode("ascii") + "." + _b64encode(_sign(body, get_token_secrets()[0]))
+
+
+def verify_access_token(token: str, now: float | None = None) -> TokenClaims:
+    body, _, signature = token.partition(".")
+    if not body or not signature:
+        raise InvalidToken("malformed token")
+    try:
+        given = _b64decode(signature)
+        body_bytes = body.encode("ascii")
+    except (UnicodeEncodeError, ValueError):
+        # Tokens are base64url; anything else is malformed, not a server error.
+        raise InvalidToken("malformed token")
+    if not any(hmac.compare_digest(_sign(body_bytes, key), given) for key in get_token_secrets()):
+        raise InvalidToken("bad signature")
+    try:
+        claims = json.loads(_b64decode(body))
+        parsed = TokenClaims(int(claims["sub"]), str(claims["email"]), int(claims["sid"]), int(claims["exp"]))
+    except (ValueError, KeyError, TypeError):
+        raise InvalidToken("malformed claims")
+    if parsed.expires_at <= (time.time() if now is None else now):
+        raise InvalidToken("token expired")
+    if get_revocations().is_revoked(parsed.session_id):
+        raise InvalidToken("session revoked")
+    return parsed
+
+
+def hash_refresh_token(token: str) -> str:
+    # Refresh tokens are 256 random bits, so a plain SHA-256 is enough to
+    # make a leaked table useless; no slow KDF needed.
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class RevocationCache:
+    """Revoked session ids, kept only while their access tokens could still
+    be valid, so the set stays small. Revocations in this process are added
+    directly; others are pulled from refresh_tokens every sync interval."""
+
+    def __init__(self, sync_seconds: float = AUTH_REVOCATION_SYNC_SECONDS):
+        self.sync_seconds = sync_seconds
+        self._revoked: dict[int, float] = {}  # session id -> forget after (unix time)
+        self._lock = threading.Lock()
+        self._synced_until: datetime | None = None
+        self._task: asyncio.Task | None = None
+
+    def is_revoked(self, session_id: int) -> bool:
+        return session_id in self._revoked
+
+    def add(self, session_id: int, revoked_at: float | None = None) -> None:
+        with self._lock:
+            self._revoked[session_id] = (revoked_at or time.time()) + ACCESS_TOKEN_TTL_SECONDS
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    async def sync(self) -> int:
+        """Load revocations newer than the last sync; returns how many were read."""
+        now = datetime.utcnow()
+        # Overlap by one interval so commits racing the previous sync are not missed.
+        since = (
+            self._synced_until - timedelta(seconds=self.sync_seconds)
+            if self._synced_until is not None
+            else now - timedelta(seconds=ACCESS_TOKEN_TTL_SECONDS)
+        )
+        async with AsyncSessionLocal() as db:
+            rows = (
+                await db.execute(
+                    select(RefreshToken.id, RefreshToken.revoked_at).where(RefreshToken.revoked_at >= since)
+                )
+            ).all()
+        cutoff = time.time()
+        with self._lock:
+            for session_id, revoked_at in rows:
+                self._revoked[session_id] = revoked_at.replace(tzinfo=timezone.utc).timestamp() + ACCESS_TOKEN_TTL_SECONDS
+            self._revoked = {sid: until for sid, until in self._revoked.items() if until > cutoff}
+        self._synced_until = now
+        return len(rows)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="auth-revocations")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Revocation sync failed")
+            await asyncio.sleep(self.sync_seconds)
+
+
+_revocations = RevocationCache()
+
+
+def get_revocations() -> RevocationCache:
+    return _revocations
+
+
+async def create_session(db: AsyncSession, user_id: int, email: str) -> dict:
+    """Store a new hashed refresh token and return the token pair (caller commits)."""
+    refresh_token = secrets.token_urlsafe(32)
+    now = datetime.utcnow()
+    session_id = (
+        await db.execute(
+            insert(RefreshToken)
+            .values(
+                user_id=user_id,
+                token_hash=hash_refresh_token(refresh_token),
+                created_at=now,
+                expires_at=now + timedelta(seconds=REFRESH_TOKEN_TTL_SECONDS),
+            )
+            .returning(RefreshToken.id)
+        )
+    ).scalar_one()
+    return {
+        "access_token": issue_access_token(user_id, email, session_id),
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_TTL_SECONDS,
+    }
+
+
+async def revoke_refresh_token(db: AsyncSession, refresh_token: str) -> RefreshToken | None:
+    """Mark the session revoked; returns its row if it was live (caller commits)."""
+    now = datetime.utcnow()
+    row = (
+        await db.execute(
+            update(RefreshToken)
+            .where(
+                RefreshToken.token_hash == hash_refresh_token(refresh_token),
+                RefreshToken.revoked_at.is_(None),
+                RefreshToken.expires_at > now,
+            )
+            .values(revoked_at=now)
+            .returning(RefreshToken)
+        )
+    ).scalar_one_or_none()
+    if row is not None:
+        get_revocations().add(row.id)
+    return row
+
+
+_bearer = HTTPBearer(auto_error=False)
+
+
+async def require_user(credentials: HTTPAuthorizationCredentials | None = Depends(_bearer)) -> TokenClaims:
+    """Dependency for protected routes: HMAC check plus an in-memory revocation lookup."""
+    if credentials is None:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        return verify_access_token(credentials.credentials)
+    except InvalidToken as exc:
+        raise HTTPException(status_code=401, detail=str(exc), headers={"WWW-Authenticate": "Bearer"})
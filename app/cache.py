@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form used for cache keys: NFKC, collapsed whitespace, stripped."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def make_key(text: str, model: str, labels, multi_label: bool) -> str:
+    """Cache key for one classification request.
+
+    Hashes the normalized text together with the model id, the label set
+    (order-insensitive) and the ``multi_label`` flag.
+    """
+    h = hashlib.sha256()
+    h.update(normalize_text(text).encode("utf-8"))
+    h.update(b"\0")
+    h.update(model.encode("utf-8"))
+    h.update(b"\0")
+    h.update(json.dumps(sorted(labels or []), ensure_ascii=False).encode("utf-8"))
+    h.update(b"\0")
+    h.update(b"1" if multi_label else b"0")
+    return h.hexdigest()
+
+
+class ResultCache:
+    """Bounded LRU + TTL cache of classification results.
+
+    Entries live in memory up to ``max_entries``. When ``path`` is given
+    they are also written to a local SQLite file so results survive
+    restarts; disk hits are promoted back into memory. Values must be
+    JSON-serializable.
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl_seconds: float | None = 86400, path: str | None = None):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl_seconds = ttl_seconds if ttl_seconds and ttl_seconds > 0 else None
+        self.path = path
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+            self._db.execute("DELETE FROM results WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+
+    def get(self, key: str):
+        """Return the cached value for ``key`` or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at >= now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value, expires_at FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None and (row[1] is None or row[1] >= now):
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value) -> None:
+        expires_at = time.time() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            self._remember(key, value, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), expires_at),
+                )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM results")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "persistent": self._db is not None,
+            }
+
+    def _remember(self, key: str, value, expires_at) -> None:
+        if self.max_entries == 0:
+            return
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
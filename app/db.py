@@ -1,9 +1,14 @@
 import os
 from functools import lru_cache
-from typing import Generator
+from typing import AsyncGenerator, Generator
 
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from . import metrics
 
 
 Base = declarative_base()
@@ -17,9 +22,45 @@ def get_database_url() -> str:
     )
 
 
-engine = create_engine(get_database_url(), pool_pre_ping=True)
+def get_async_database_url() -> str:
+    """Same database as get_database_url(), through an asyncio driver."""
+    url = get_database_url()
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    # postgresql+psycopg selects psycopg 3's async mode under create_async_engine
+    return url
+
+
+def _pool_options(url: str, pool_class, name: str) -> dict:
+    """Queue pool that records checkout wait; in-memory SQLite keeps its default pool."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and (parsed.database in (None, "", ":memory:") or "mode=memory" in url):
+        return {}
+    return {"poolclass": metrics.timed_pool(pool_class, name)}
+
+
+engine = create_engine(get_database_url(), pool_pre_ping=True, **_pool_options(get_database_url(), QueuePool, "sync"))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async endpoints use their own pool so DB round-trips never block the event loop.
+async_engine = create_async_engine(
+    get_async_database_url(), pool_pre_ping=True,
+    **_pool_options(get_async_database_url(), AsyncAdaptedQueuePool, "async"),
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+metrics.instrument_engine(engine, "sync")
+metrics.instrument_engine(async_engine.sync_engine, "async")
+
+
+def dialect_insert(session: Session | AsyncSession):
+    """Return the dialect-specific ``insert`` construct (for ON CONFLICT upserts)."""
+    if session.bind.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert
+
 
 def get_db() -> Generator[Session, None, None]:
     db = SessionLocal()
@@ -29,3 +70,6 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
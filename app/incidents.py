@@ -0,0 +1,47 @@
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import aggregates, outbox
+from .models import Evidence, Incident
+
+
+async def apply_risk_label(db: AsyncSession, incident: Incident, risk_label: str) -> tuple[str | None, int | None]:
+    """Relabel ``incident`` in the caller's transaction.
+
+    Keeps the rollups in step and, for Red, writes a CERT event to the
+    outbox. ``incident`` must have been loaded ``with_for_update()`` so its
+    current label is the one the deltas are computed from. Returns
+    (previous label, outbox id or None). The caller commits and then calls
+    ``outbox.notify()`` if an event was queued.
+    """
+    prior = incident.risk_label
+    incident.risk_label = risk_label
+    db.add(incident)
+    await aggregates.apply_deltas_async(db, aggregates.relabel_deltas(incident.created_at, prior, risk_label))
+
+    if risk_label.lower() != "red":
+        return prior, None
+
+    # Fetch latest evidence for additional context
+    latest_evidence = (
+        await db.execute(
+            select(Evidence)
+            .where(Evidence.incident_id == incident.id)
+            .order_by(Evidence.created_at.desc())
+            .limit(1)
+        )
+    ).scalar_one_or_none()
+
+    cert_payload = {
+        "incident_id": incident.id,
+        "reporter_id": incident.reporter_id,
+        "evidence_type": incident.evidence_type,
+        "risk_label": incident.risk_label,
+        "updated_at": datetime.utcnow().isoformat() + "Z",
+        "evidence_sha256": getattr(latest_evidence, "sha256", None),
+        "evidence_filename": getattr(latest_evidence, "filename", None),
+    }
+    # Written with the label change; delivered by the outbox dispatcher
+    return prior, await outbox.enqueue(db, cert_payload)
@@ -0,0 +1,294 @@
+import codecs
+import ipaddress
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .db import dialect_insert
+from .models import Evidence, Indicator
+
+logger = logging.getLogger(__name__)
+
+# Indicators kept per evidence file; a log dump full of IPs should not
+# turn into a million rows.
+IOC_MAX_PER_EVIDENCE = int(os.getenv("IOC_MAX_PER_EVIDENCE", "5000"))
+# Longest token carried over a chunk boundary; longer runs without
+# whitespace are scanned as they are.
+MAX_CARRY = 4096
+MAX_VALUE_LENGTH = 512
+
+KINDS = ("url", "email", "ipv4", "ipv6", "sha256", "sha1", "md5", "filename", "domain")
+
+FILE_EXTENSIONS = (
+    "exe|dll|scr|bat|cmd|ps1|vbs|js|jar|msi|apk|bin|sh|py|elf|so|"
+    "doc|docx|docm|xls|xlsx|xlsm|ppt|pptx|pdf|rtf|hta|lnk|iso|img|zip|rar|7z|gz|tar"
+)
+
+# Order matters: earlier patterns claim their span so later, looser ones do
+# not re-report part of it. A URL's host is added separately by extract().
+_PATTERNS = [
+    # A bracketed IPv6 host is allowed; otherwise ']' ends the URL.
+    ("url", re.compile(r"\b(?:https?|ftp)://(?:\[[0-9a-f:.]+\][^\s<>\"'`)\]]*|[^\s<>\"'`)\]]+)", re.IGNORECASE)),
+    ("email", re.compile(r"\b[a-z0-9._%+-]+@(?:[a-z0-9-]+\.)+[a-z]{2,63}\b", re.IGNORECASE)),
+    ("ipv4", re.compile(r"\b(?:\d{1,3}\.){3}\d{1,3}\b")),
+    ("ipv6", re.compile(r"(?<![:\w])[0-9a-f]{0,4}(?::[0-9a-f]{0,4}){2,7}(?![:\w])", re.IGNORECASE)),
+    ("sha256", re.compile(r"\b[a-f0-9]{64}\b", re.IGNORECASE)),
+    ("sha1", re.compile(r"\b[a-f0-9]{40}\b", re.IGNORECASE)),
+    ("md5", re.compile(r"\b[a-f0-9]{32}\b", re.IGNORECASE)),
+    ("filename", re.compile(rf"\b[\w-][\w.-]{{0,200}}\.(?:{FILE_EXTENSIONS})\b", re.IGNORECASE)),
+    ("domain", re.compile(r"\b(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z][a-z0-9-]{1,62}\b", re.IGNORECASE)),
+]
+_PATTERN_BY_KIND = dict(_PATTERNS)
+
+# Domain-looking tokens that are almost always something else.
+_NOT_TLDS = {"txt", "log", "csv", "json", "xml", "html", "htm", "png", "jpg", "jpeg", "gif", "md", "yaml", "yml", "cfg", "ini"}
+
+# Defanged forms analysts paste into reports: hxxp://, evil[.]com, a(at)b.
+_REFANG = [
+    (re.compile(r"\bhxxp", re.IGNORECASE), "http"),
+    (re.compile(r"\[\.\]|\(\.\)|\{\.\}|\[dot\]", re.IGNORECASE), "."),
+    (re.compile(r"\[@\]|\(at\)|\[at\]", re.IGNORECASE), "@"),
+    (re.compile(r"\[:\]"), ":"),
+]
+
+
+def refang(text: str) -> str:
+    for pattern, replacement in _REFANG:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def normalize(kind: str, value: str) -> str | None:
+    """Canonical form used for storage and lookup, or None if ``value`` is not a valid ``kind``."""
+    value = refang(value.strip()).rstrip(".,;:")
+    if not value or len(value) > MAX_VALUE_LENGTH:
+        return None
+    if kind in ("ipv4", "ipv6"):
+        try:
+            address = ipaddress.ip_address(value)
+        except ValueError:
+            return None
+        return str(address) if (address.version == 4) == (kind == "ipv4") else None
+    if kind == "url":
+        scheme, _, rest = value.partition("://")
+        host, sep, path = rest.partition("/")
+        return f"{scheme.lower()}://{host.lower()}{sep}{path}"
+    if kind == "domain":
+        value = value.lower()
+        return None if value.rsplit(".", 1)[-1] in _NOT_TLDS else value
+    if kind == "filename":
+        return value
+    return value.lower()  # hashes, emails
+
+
+def guess_kind(value: str) -> str | None:
+    """Kind of a single indicator typed into the lookup endpoint."""
+    value = refang(value.strip())
+    for kind, pattern in _PATTERNS:
+        match = pattern.fullmatch(value)
+        if match and normalize(kind, value) is not None:
+            return kind
+    return None
+
+
+def url_host(url: str) -> tuple[str, str] | None:
+    """The host of a normalized URL as a (kind, value) indicator: domain, ipv4 or ipv6."""
+    try:
+        host = urlsplit(url).hostname
+    except ValueError:
+        return None
+    if not host:
+        return None
+    for kind in ("ipv4", "ipv6", "domain"):
+        value = normalize(kind, host)
+        if value is not None and (kind != "domain" or _PATTERN_BY_KIND["domain"].fullmatch(value)):
+            return kind, value
+    return None
+
+
+def extract(text: str) -> set[tuple[str, str]]:
+    """All (kind, normalized value) pairs in ``text``.
+
+    URLs also yield their host, so an incident can be found by pivoting on
+    the domain or IP alone.
+    """
+    found: set[tuple[str, str]] = set()
+
+    def claim(kind, match):
+        value = normalize(kind, match.group())
+        if value is None:
+            return match.group()
+        found.add((kind, value))
+        if kind == "url":
+            host = url_host(value)
+            if host is not None:
+                found.add(host)
+        # Blank out the match so later, looser patterns don't re-report it.
+        return " " * (match.end() - match.start())
+
+    text = refang(text)
+    for kind, pattern in _PATTERNS:
+        text = pattern.sub(lambda match: claim(kind, match), text)
+    return found
+
+
+class IOCExtractor:
+    """Streaming indicator extraction over plaintext chunks.
+
+    Pass :meth:`feed` as an observer to ``storage.stage_encrypted_*`` so
+    indicators are found in the same pass that hashes and encrypts the
+    upload. Text after the last whitespace of a chunk is carried into the
+    next one, so indicators split across chunk boundaries are still found.
+    """
+
+    def __init__(self, max_indicators: int = IOC_MAX_PER_EVIDENCE):
+        self.max_indicators = max_indicators
+        self.indicators: set[tuple[str, str]] = set()
+        self.truncated = False
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        self._carry = ""
+
+    def feed(self, chunk: bytes) -> None:
+        if self.truncated:
+            return
+        text = self._carry + self._decoder.decode(chunk).replace("\x00", " ")
+        cut = max(text.rfind(" "), text.rfind("\n"), text.rfind("\t"))
+        if cut < 0 and len(text) <= MAX_CARRY:
+            self._carry = text
+            return
+        if cut < 0 or len(text) - cut > MAX_CARRY:
+            cut = len(text)
+        self._scan(text[:cut])
+        self._carry = text[cut:]
+
+    def finish(self) -> set[tuple[str, str]]:
+        self._scan(self._carry + self._decoder.decode(b"", final=True))
+        self._carry = ""
+        return self.indicators
+
+    def _scan(self, text: str) -> None:
+        if not text or self.truncated:
+            return
+        self.indicators |= extract(text)
+        if len(self.indicators) > self.max_indicators:
+            self.indicators = set(sorted(self.indicators)[: self.max_indicators])
+            self.truncated = True
+
+
+def _rows(indicators, incident_id: int, evidence_id: int) -> list[dict]:
+    now = datetime.utcnow()
+    return [
+        {"kind": kind, "value": value, "incident_id": incident_id, "evidence_id": evidence_id, "created_at": now}
+        for kind, value in sorted(indicators)
+    ]
+
+
+def _insert(db: Session | AsyncSession):
+    return dialect_insert(db)(Indicator).on_conflict_do_nothing(
+        index_elements=[Indicator.evidence_id, Indicator.kind, Indicator.value]
+    )
+
+
+async def store_async(db: AsyncSession, indicators, incident_id: int, evidence_id: int) -> int:
+    """Insert indicators for one evidence file in the caller's transaction."""
+    rows = _rows(indicators, incident_id, evidence_id)
+    if rows:
+        await db.execute(_insert(db), rows)
+    return len(rows)
+
+
+def store(db: Session, indicators, incident_id: int, evidence_id: int) -> int:
+    rows = _rows(indicators, incident_id, evidence_id)
+    if rows:
+        db.execute(_insert(db), rows)
+    return len(rows)
+
+
+def scan_evidence(path: str) -> set[tuple[str, str]]:
+    """Decrypt an evidence file chunk by chunk and extract its indicators."""
+    from . import storage
+
+    extractor = IOCExtractor()
+    for chunk in storage.decrypt_stream(path):
+        extractor.feed(chunk)
+    return extractor.finish()
+
+
+def backfill(db: Session, after_id: int = 0, batch_size: int = 200, workers: int = 1) -> int:
+    """Extract indicators from evidence with id > ``after_id``; returns files scanned.
+
+    Re-running is safe: existing (evidence, kind, value) rows are skipped.
+    Evidence sharing a blob is decrypted once per batch.
+    """
+    scanned = 0
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        while True:
+            batch = db.execute(
+                select(Evidence.id, Evidence.incident_id, Evidence.sha256, Evidence.storage_path)
+                .where(Evidence.id > after_id)
+                .order_by(Evidence.id)
+                .limit(batch_size)
+            ).all()
+            if not batch:
+                return scanned
+            paths = {row.sha256 or row.storage_path: row.storage_path for row in batch}
+            keys = list(paths)
+            mapper = pool.map if pool is not None else map
+            results = {}
+            for key, found in zip(keys, mapper(_scan_or_none, [paths[k] for k in keys])):
+                results[key] = found
+            for row in batch:
+                found = results[row.sha256 or row.storage_path]
+                if found:
+                    store(db, found, row.incident_id, row.id)
+            db.commit()
+            scanned += len(batch)
+            after_id = batch[-1].id
+            logger.info("Scanned %d evidence files (through id %d)", scanned, after_id)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+def _scan_or_none(path: str) -> set[tuple[str, str]] | None:
+    try:
+        return scan_evidence(path)
+    except Exception as exc:  # missing file, wrong key, tampered segment
+        logger.warning("Skipping %s: %s", path, exc)
+        return None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .db import SessionLocal
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    parser = argparse.ArgumentParser(description="Indicator of compromise index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = sub.add_parser("backfill", help="Extract indicators from existing evidence")
+    backfill_parser.add_argument("--after-id", type=int, default=0, help="Resume after this evidence id")
+    backfill_parser.add_argument("--batch-size", type=int, default=200)
+    backfill_parser.add_argument("--workers", type=int, default=1, help="Processes decrypting and scanning")
+    extract_parser = sub.add_parser("extract", help="Print indicators found in a text file")
+    extract_parser.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        with SessionLocal() as session:
+            print(f"Scanned {backfill(session, args.after_id, args.batch_size, args.workers)} evidence files")
+    else:
+        with open(args.path, "rb") as f:
+            extractor = IOCExtractor()
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                extractor.feed(block)
+        for kind, value in sorted(extractor.finish()):
+            print(f"{kind}\t{value}")
@@ -0,0 +1,409 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import signal
+import socket
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, case, delete, exists, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import incidents, outbox, storage
+from .db import AsyncSessionLocal
+from .models import ClassificationJob, Evidence, Incident
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes: lower runs first. Uploads from the portal go in
+# "interactive"; re-queues of old incidents go in "backfill".
+LANES = {"interactive": 0, "default": 50, "backfill": 100}
+
+CLASSIFY_BATCH_SIZE = int(os.getenv("CLASSIFY_BATCH_SIZE", "16"))
+# How long a claimed job stays invisible; a worker that dies mid-batch has
+# its jobs picked up by another worker after this.
+CLASSIFY_VISIBILITY_SECONDS = float(os.getenv("CLASSIFY_VISIBILITY_SECONDS", "300"))
+CLASSIFY_MAX_ATTEMPTS = int(os.getenv("CLASSIFY_MAX_ATTEMPTS", "5"))
+CLASSIFY_POLL_SECONDS = float(os.getenv("CLASSIFY_POLL_SECONDS", "2"))
+# Only the start of the evidence is classified.
+CLASSIFY_MAX_BYTES = int(os.getenv("CLASSIFY_MAX_BYTES", "4096"))
+# A Red category below this score is reported as Amber instead.
+CLASSIFY_RED_MIN_SCORE = float(os.getenv("CLASSIFY_RED_MIN_SCORE", "0.5"))
+
+RISK_BY_LABEL = {
+    "ransomware": "Red",
+    "malware": "Red",
+    "data exfiltration": "Red",
+    "credential theft": "Red",
+    "phishing": "Amber",
+    "ddos": "Amber",
+    "spam": "Green",
+    "benign": "Green",
+}
+
+
+async def enqueue(db: AsyncSession, incident_ids: list[int], lane: str = "default") -> None:
+    """Queue incidents for classification in the caller's transaction."""
+    if not incident_ids:
+        return
+    now = datetime.utcnow()
+    await db.execute(
+        insert(ClassificationJob),
+        [
+            {"incident_id": incident_id, "priority": LANES[lane], "status": "pending",
+             "attempts": 0, "available_at": now, "created_at": now}
+            for incident_id in incident_ids
+        ],
+    )
+
+
+def risk_for(ranked: list[tuple[str, float]]) -> tuple[str, str, float]:
+    """Map a classifier ranking to (risk_label, top category, score)."""
+    label, score = ranked[0]
+    risk = RISK_BY_LABEL.get(label, "Amber")
+    if risk == "Red" and score < CLASSIFY_RED_MIN_SCORE:
+        risk = "Amber"
+    return risk, label, float(score)
+
+
+def evidence_text(path: str, max_bytes: int = CLASSIFY_MAX_BYTES) -> str | None:
+    """Leading text of an evidence file, or None if it does not look like text."""
+    legacy = storage.read_legacy(path)
+    if legacy is not None:
+        data = legacy[:max_bytes]
+    else:
+        size = storage.plaintext_size(path)
+        data = b"".join(storage.decrypt_range(path, 0, min(size, max_bytes) - 1)) if size else b""
+    if not data or b"\x00" in data:
+        return None
+    text = data.decode("utf-8", errors="ignore").strip()
+    printable = sum(ch.isprintable() or ch.isspace() for ch in text)
+    if not text or printable < 0.9 * len(text):
+        return None
+    return text
+
+
+async def incident_texts(incident_ids: list[int]) -> dict[int, str | None]:
+    """Description plus the start of the latest evidence, per incident.
+
+    Incidents with neither are missing from the result; those with only
+    binary evidence map to None.
+    """
+    async with AsyncSessionLocal() as db:
+        descriptions = dict(
+            (await db.execute(select(Incident.id, Incident.description).where(Incident.id.in_(incident_ids)))).all()
+        )
+        rows = (
+            await db.execute(
+                select(Evidence.incident_id, Evidence.storage_path)
+                .where(Evidence.incident_id.in_(incident_ids))
+                .order_by(Evidence.incident_id, Evidence.created_at)
+            )
+        ).all()
+    latest = {incident_id: path for incident_id, path in rows}  # last one wins
+    texts: dict[int, str | None] = {}
+    for incident_id in incident_ids:
+        parts = [descriptions.get(incident_id)]
+        if incident_id in latest:
+            try:
+                parts.append(await storage.run_in_upload_pool(evidence_text, latest[incident_id]))
+            except Exception:
+                logger.exception("Could not read evidence for incident %s", incident_id)
+        elif not descriptions.get(incident_id):
+            continue
+        texts[incident_id] = "\n".join(p for p in parts if p) or None
+    return texts
+
+
+def retry_delay(attempts: int) -> float:
+    return min(5 * 2 ** max(attempts - 1, 0), 600) * random.uniform(0.8, 1.2)
+
+
+class ClassificationWorker:
+    """Claims jobs in batches, classifies their text and writes back labels.
+
+    Jobs are claimed with ``FOR UPDATE SKIP LOCKED`` and leased by moving
+    ``available_at`` forward, so any number of worker processes can share
+    the queue. A label is only written if the incident is still Pending,
+    so an analyst's manual label is never overwritten; Red goes through
+    the same path as POST /incidents/{id}/risk. Each incident is also
+    added to the near-duplicate index, and one that closely matches an
+    already classified incident reuses that result instead of running
+    the model.
+    """
+
+    def __init__(self, batch_size: int = CLASSIFY_BATCH_SIZE, lanes: list[str] | None = None):
+        self.batch_size = max(1, batch_size)
+        self.priorities = [LANES[lane] for lane in lanes] if lanes else None
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"[:64]
+        self._stop = asyncio.Event()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    async def run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                processed = await self.run_once()
+            except Exception:
+                logger.exception("Classification batch failed")
+                processed = 0
+            if processed:
+                continue
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=CLASSIFY_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_once(self) -> int:
+        """Claim and process one batch; returns how many jobs were claimed."""
+        claimed = await self._claim()
+        if not claimed:
+            return 0
+        texts = await incident_texts([incident_id for _job_id, incident_id in claimed])
+        # Near-duplicates of an already classified incident reuse its result.
+        rankings, reused_from = await self._index(claimed, texts)
+
+        runnable = [
+            (job_id, incident_id) for job_id, incident_id in claimed
+            if texts.get(incident_id) and job_id not in rankings
+        ]
+        error = None
+        if runnable:
+            try:
+                ranked = await asyncio.to_thread(self._classify, [texts[incident_id] for _job_id, incident_id in runnable])
+                rankings.update({job_id: r for (job_id, _incident_id), r in zip(runnable, ranked)})
+            except Exception as exc:
+                logger.exception("Classifier failed on %d jobs", len(runnable))
+                error = f"{type(exc).__name__}: {exc}"[:512]
+
+        await self._complete(claimed, texts, rankings, error, reused_from)
+        return len(claimed)
+
+    async def _index(self, claimed, texts) -> tuple[dict[int, list], dict[int, int]]:
+        """Add the batch to the LSH index; returns reusable rankings and their sources by job id."""
+        from . import similarity  # numpy; only workers need it
+
+        signatures = await asyncio.to_thread(
+            lambda: {incident_id: similarity.signature(text) for incident_id, text in texts.items() if text}
+        )
+        rankings: dict[int, list] = {}
+        reused_from: dict[int, int] = {}
+        async with AsyncSessionLocal() as db:
+            for job_id, incident_id in claimed:
+                sig = signatures.get(incident_id)
+                if sig is None:
+                    continue
+                _cluster, found = await similarity.index_incident(db, incident_id, sig)
+                close = [n for n, _c, score in found if score >= similarity.SIMILARITY_REUSE_THRESHOLD]
+                if not close:
+                    continue
+                done = {
+                    row.incident_id: row
+                    for row in (
+                        await db.execute(
+                            select(ClassificationJob.incident_id, ClassificationJob.result_label, ClassificationJob.result_score)
+                            .where(
+                                ClassificationJob.incident_id.in_(close),
+                                ClassificationJob.status == "done",
+                                ClassificationJob.result_label.is_not(None),
+                            )
+                        )
+                    ).all()
+                }
+                source = next((n for n in close if n in done), None)  # most similar first
+                if source is not None:
+                    rankings[job_id] = [(done[source].result_label, done[source].result_score)]
+                    reused_from[job_id] = source
+            await db.commit()
+        return rankings, reused_from
+
+    @staticmethod
+    def _classify(texts: list[str]) -> list:
+        from . import ml  # heavy; only workers load it
+
+        return list(ml.classify_many(texts, batch_size=len(texts)))
+
+    async def _claim(self) -> list[tuple[int, int]]:
+        now = datetime.utcnow()
+        query = (
+            select(ClassificationJob.id, ClassificationJob.incident_id, ClassificationJob.attempts)
+            .where(ClassificationJob.status == "pending", ClassificationJob.available_at <= now)
+            .order_by(ClassificationJob.priority, ClassificationJob.available_at, ClassificationJob.id)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        if self.priorities is not None:
+            query = query.where(ClassificationJob.priority.in_(self.priorities))
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(query)).all()
+            if not rows:
+                return []
+            # Jobs that keep crashing their worker are given up on here.
+            exhausted = [r.id for r in rows if r.attempts >= CLASSIFY_MAX_ATTEMPTS]
+            claimed = [(r.id, r.incident_id) for r in rows if r.attempts < CLASSIFY_MAX_ATTEMPTS]
+            if exhausted:
+                await db.execute(
+                    update(ClassificationJob)
+                    .where(ClassificationJob.id.in_(exhausted))
+                    .values(status="failed", finished_at=now, last_error="lease expired too many times")
+                )
+            if claimed:
+                await db.execute(
+                    update(ClassificationJob)
+                    .where(ClassificationJob.id.in_([job_id for job_id, _ in claimed]))
+                    .values(
+                        attempts=ClassificationJob.attempts + 1,
+                        available_at=now + timedelta(seconds=CLASSIFY_VISIBILITY_SECONDS),
+                        worker=self.worker_id,
+                        started_at=now,
+                    )
+                )
+            await db.commit()
+        return claimed
+
+    async def _complete(self, claimed, texts, rankings, error, reused_from) -> None:
+        now = datetime.utcnow()
+        queued = False
+        async with AsyncSessionLocal() as db:
+            for job_id, incident_id in claimed:
+                job = update(ClassificationJob).where(ClassificationJob.id == job_id)
+                if job_id in rankings:
+                    risk, label, score = risk_for(rankings[job_id])
+                    incident = (
+                        await db.execute(select(Incident).where(Incident.id == incident_id).with_for_update())
+                    ).scalar_one_or_none()
+                    if incident is not None and incident.risk_label == "Pending":
+                        _prior, outbox_id = await incidents.apply_risk_label(db, incident, risk)
+                        queued = queued or outbox_id is not None
+                    await db.execute(job.values(
+                        status="done", result_label=label, result_score=score, finished_at=now, last_error=None,
+                        reused_from=reused_from.get(job_id),
+                    ))
+                elif error is None:
+                    # No text to classify (binary evidence or none at all): leave
+                    # the incident Pending for an analyst.
+                    reason = "no description or evidence" if incident_id not in texts else "no text to classify"
+                    await db.execute(job.values(status="skipped", finished_at=now, last_error=reason))
+                else:
+                    attempts = (await db.execute(
+                        select(ClassificationJob.attempts).where(ClassificationJob.id == job_id)
+                    )).scalar_one()
+                    values = (
+                        {"status": "failed", "finished_at": now}
+                        if attempts >= CLASSIFY_MAX_ATTEMPTS
+                        else {"available_at": now + timedelta(seconds=retry_delay(attempts)), "worker": None}
+                    )
+                    await db.execute(job.values(last_error=error, **values))
+            await db.commit()
+        if queued:
+            outbox.notify()
+
+
+async def queue_stats(db: AsyncSession) -> dict:
+    """Depth and lag per lane for pending jobs, plus the failed count.
+
+    ``ready`` jobs can be claimed now, ``in_flight`` are leased to a worker
+    and ``delayed`` wait for a retry. ``lag_seconds`` is the age of the
+    oldest ready job.
+    """
+    now = datetime.utcnow()
+    state = case(
+        (ClassificationJob.available_at <= now, "ready"),
+        (ClassificationJob.worker.is_not(None), "in_flight"),
+        else_="delayed",
+    )
+    rows = await db.execute(
+        select(ClassificationJob.priority, state, func.count(), func.min(ClassificationJob.created_at))
+        .where(ClassificationJob.status == "pending")
+        .group_by(ClassificationJob.priority, state)
+    )
+    names = {priority: name for name, priority in LANES.items()}
+    lanes = {name: {"ready": 0, "in_flight": 0, "delayed": 0, "lag_seconds": 0.0} for name in LANES}
+    for priority, job_state, count, oldest in rows:
+        lane = lanes.setdefault(names.get(priority, str(priority)), {"ready": 0, "in_flight": 0, "delayed": 0, "lag_seconds": 0.0})
+        lane[job_state] = count
+        if job_state == "ready" and oldest is not None:
+            lane["lag_seconds"] = max(0.0, (now - oldest).total_seconds())
+    failed = (
+        await db.execute(select(func.count()).where(ClassificationJob.status == "failed"))
+    ).scalar_one()
+    return {"lanes": lanes, "failed": failed}
+
+
+async def enqueue_pending(lane: str = "backfill") -> int:
+    """Queue every Pending incident with evidence that has no pending job."""
+    has_evidence = exists().where(Evidence.incident_id == Incident.id)
+    has_job = exists().where(and_(ClassificationJob.incident_id == Incident.id, ClassificationJob.status == "pending"))
+    async with AsyncSessionLocal() as db:
+        ids = (
+            await db.execute(select(Incident.id).where(Incident.risk_label == "Pending", has_evidence, ~has_job))
+        ).scalars().all()
+        for offset in range(0, len(ids), 1000):
+            await enqueue(db, list(ids[offset:offset + 1000]), lane=lane)
+        await db.commit()
+    return len(ids)
+
+
+async def prune(older_than_days: float) -> int:
+    """Delete finished jobs older than ``older_than_days``."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            delete(ClassificationJob).where(
+                ClassificationJob.status.in_(("done", "skipped", "failed")),
+                ClassificationJob.finished_at < cutoff,
+            )
+        )
+        await db.commit()
+    return result.rowcount
+
+
+async def _run_worker(args) -> None:
+    worker = ClassificationWorker(batch_size=args.batch_size, lanes=args.lanes)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    if args.warmup:
+        from . import ml
+
+        logger.info("Classifier ready: %s", await asyncio.to_thread(ml.warmup_classifier))
+    logger.info("Classification worker %s started (lanes=%s)", worker.worker_id, args.lanes or "all")
+    await worker.run()
+    from . import ml
+
+    logger.info("Classification worker %s stopped; classifier tiers: %s", worker.worker_id, ml.tier_stats())
+
+
+async def _print_stats() -> None:
+    async with AsyncSessionLocal() as db:
+        print(json.dumps(await queue_stats(db), indent=2))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    parser = argparse.ArgumentParser(description="Incident classification queue")
+    sub = parser.add_subparsers(dest="command", required=True)
+    worker_parser = sub.add_parser("worker", help="Process classification jobs until SIGTERM")
+    worker_parser.add_argument("--batch-size", type=int, default=CLASSIFY_BATCH_SIZE)
+    worker_parser.add_argument("--lanes", type=lambda s: s.split(","), default=None,
+                               help=f"Comma-separated lanes to serve (default: all of {', '.join(LANES)})")
+    worker_parser.add_argument("--no-warmup", dest="warmup", action="store_false")
+    backfill_parser = sub.add_parser("enqueue-pending", help="Queue all Pending incidents that have evidence")
+    backfill_parser.add_argument("--lane", choices=list(LANES), default="backfill")
+    prune_parser = sub.add_parser("prune", help="Delete finished jobs")
+    prune_parser.add_argument("--days", type=float, default=7)
+    sub.add_parser("stats", help="Print queue depth and lag")
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        asyncio.run(_run_worker(args))
+    elif args.command == "enqueue-pending":
+        print(f"Queued {asyncio.run(enqueue_pending(args.lane))} incidents")
+    elif args.command == "prune":
+        print(f"Deleted {asyncio.run(prune(args.days))} jobs")
+    else:
+        asyncio.run(_print_stats())
@@ -1,7 +1,17 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+import os
+import time
+
+from fastapi import Depends, FastAPI, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from . import auth, metrics
 from .api import router as api_router
 
+# Reuse uvicorn's logger so startup reports show up without extra config.
+logger = logging.getLogger("uvicorn.error")
+
 
 def create_app() -> FastAPI:
     application = FastAPI(title="Defence Cyber Incident & Safety Portal - API")
@@ -20,10 +30,109 @@ def create_app() -> FastAPI:
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    # Outermost, so latency includes CORS handling. METRICS_ENABLED=0 turns
+    # off per-request recording (/metrics still serves the other series).
+    if os.getenv("METRICS_ENABLED", "1").lower() not in ("0", "false", "no"):
+        application.add_middleware(metrics.MetricsMiddleware, routes_app=application)
+
+    # /health answers 503 until the classifier is warm, so load balancers
+    # only route to workers that can serve a classification immediately.
+    application.state.ready = False
+    application.state.classifier = None
+    created = time.perf_counter()
+
+    def mark_ready(classifier: str) -> None:
+        application.state.classifier = classifier
+        application.state.ready = True
+        logger.info("Worker %d ready %.2fs after app creation (classifier %s)", os.getpid(), time.perf_counter() - created, classifier)
+
+    @application.on_event("startup")
+    async def preload_classifier() -> None:
+        # Load the zero-shot model once per worker before serving traffic.
+        # Set ML_PRELOAD=0 to skip (e.g. in dev or on API-only replicas).
+        # Warmup runs in the background: routes that don't need the model
+        # are served meanwhile, and /health reports not ready.
+        if os.getenv("ML_PRELOAD", "1").lower() in ("0", "false", "no"):
+            mark_ready("disabled")
+            return
+        from . import ml
+
+        async def warm() -> None:
+            try:
+                stats = await asyncio.to_thread(ml.warmup_classifier)
+            except Exception:
+                logger.exception("Zero-shot model preload failed; it will be loaded on first use")
+                mark_ready("lazy")
+            else:
+                logger.info("Classifier ready in worker %d: %s", os.getpid(), stats)
+                mark_ready("warm")
+
+        application.state.warmup_task = asyncio.create_task(warm())
+
+    @application.on_event("startup")
+    def start_webhook_dispatcher() -> None:
+        # Deliver queued CERT webhooks in the background (WEBHOOK_DISPATCHER=0
+        # disables it, e.g. when a dedicated process does the delivery).
+        if os.getenv("WEBHOOK_DISPATCHER", "1").lower() in ("0", "false", "no"):
+            return
+        from . import outbox
+
+        outbox.get_dispatcher().start()
+
+    @application.on_event("startup")
+    def start_revocation_sync() -> None:
+        # Pull logouts made on other workers into this worker's revocation cache.
+        auth.get_revocations().start()
+
+    @application.on_event("shutdown")
+    async def stop_revocation_sync() -> None:
+        await auth.get_revocations().stop()
+
+    @application.on_event("shutdown")
+    async def stop_webhook_dispatcher() -> None:
+        from . import outbox
+
+        await outbox.get_dispatcher().stop()
+
+    @application.on_event("shutdown")
+    def stop_profiler_thread() -> None:
+        metrics.profiler.stop()
+
+    @application.on_event("shutdown")
+    def stop_password_pool() -> None:
+        from . import passwords
+
+        passwords.shutdown_password_pool()
 
     @application.get("/health")
-    def health() -> dict:
-        return {"status": "ok"}
+    def health():
+        body = {"status": "ok", "pid": os.getpid(), "classifier": application.state.classifier}
+        if not application.state.ready:
+            body["status"] = "warming"
+            return JSONResponse(body, status_code=503)
+        return body
+
+    # /metrics and /debug/* sit outside /api/, so nginx does not expose them.
+    @application.get("/metrics", include_in_schema=False)
+    def prometheus_metrics() -> Response:
+        return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+    # The profiler runs in the worker that handles the request; the pid in
+    # each response says which one.
+    @application.post("/debug/profiler/start", dependencies=[Depends(auth.require_user)])
+    def start_profiler(interval_ms: float = Query(10.0, ge=1.0, le=1000.0), reset: bool = True) -> dict:
+        metrics.profiler.start(interval_ms / 1000, reset=reset)
+        return {"pid": os.getpid(), **metrics.profiler.status()}
+
+    @application.post("/debug/profiler/stop", dependencies=[Depends(auth.require_user)])
+    def stop_profiler() -> dict:
+        metrics.profiler.stop()
+        return {"pid": os.getpid(), **metrics.profiler.status()}
+
+    @application.get("/debug/profiler", dependencies=[Depends(auth.require_user)])
+    def profiler_stacks(limit: int | None = Query(None, ge=1)) -> PlainTextResponse:
+        """Collapsed stacks (``thread;frame;...;frame count``) for flamegraph.pl or speedscope."""
+        return PlainTextResponse(metrics.profiler.collapsed(limit), headers={"X-Worker-Pid": str(os.getpid())})
 
     # Mount application API under /api/v1 to align with nginx and frontend
     application.include_router(api_router, prefix="/api/v1")
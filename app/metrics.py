@@ -0,0 +1,467 @@
+"""In-process metrics in the Prometheus text format, plus a sampling profiler.
+
+Counters, gauges and histograms live in one module-level registry and are
+rendered by :func:`render` for ``GET /metrics``. Updates take a per-series
+lock and a bisect, so instrumenting hot paths costs well under a
+microsecond. Values are per process: with ``app.serve`` each worker keeps
+its own series, so scrape a single-worker replica or aggregate over many
+scrapes.
+
+The profiler samples every thread's stack with ``sys._current_frames()``
+from a background thread and counts collapsed stacks (flame graph input).
+It is off until :func:`profiler.start` is called.
+"""
+import bisect
+import collections
+import os
+import sys
+import threading
+import time
+from typing import Callable, Iterable
+
+# Seconds; covers sub-millisecond queries up to slow model batches.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+BYTE_BUCKETS = (1024, 16 * 1024, 128 * 1024, 1024**2, 8 * 1024**2, 64 * 1024**2, 512 * 1024**2)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values))
+    return "{" + pairs + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _default(self):
+        return self.labels()
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += self.samples()
+        return "\n".join(lines)
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = float(value)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+    def samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+            for key, child in list(self._children.items())
+        ]
+
+
+class Gauge(Counter):
+    """A value that goes up and down; ``function`` makes it computed at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), function: Callable[[], dict | float] | None = None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._default().dec(amount)
+
+    def set(self, value: float) -> None:
+        self._default().set(value)
+
+    def samples(self) -> list[str]:
+        if self.function is None:
+            return super().samples()
+        try:
+            result = self.function()
+        except Exception:  # a broken callback must not break the scrape
+            return []
+        if not isinstance(result, dict):
+            result = {(): result}
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key if isinstance(key, tuple) else (key,))} {_format_value(value)}"
+            for key, value in result.items()
+        ]
+
+
+class _HistogramValue:
+    __slots__ = ("upper_bounds", "counts", "sum", "_lock")
+
+    def __init__(self, upper_bounds):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.upper_bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default().observe(value)
+
+    def time(self, *labelvalues):
+        """Context manager observing the elapsed seconds of its block."""
+        return _Timer(self.labels(*labelvalues))
+
+    def samples(self) -> list[str]:
+        lines = []
+        for key, child in list(self._children.items()):
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames + ("le",), key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("child", "started")
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.started)
+
+
+REGISTRY: list[_Metric] = []
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+# --- HTTP ---
+
+HTTP_REQUESTS = Counter("http_requests_total", "Requests by route and status.", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "Time to the end of the response body.", ("method", "route"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests being handled.", ("method", "route"))
+
+# Resolved route templates by (method, path); cleared when full so ids in
+# paths cannot grow it without bound.
+_ROUTE_CACHE_SIZE = 4096
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and in-flight count per route template."""
+
+    def __init__(self, app, routes_app=None):
+        self.app = app
+        self.routes_app = routes_app
+        self._routes: dict[tuple[str, str], str] = {}
+
+    def _route(self, scope) -> str:
+        """Template of the route that will handle ``scope``, e.g. ``/api/v1/evidence/{evidence_id}/content``."""
+        key = (scope["method"], scope["path"])
+        route = self._routes.get(key)
+        if route is not None:
+            return route
+        from starlette.routing import Match
+
+        route = partial = None
+        for candidate in getattr(self.routes_app, "routes", ()):
+            path = getattr(candidate, "path", None)
+            if path is None:
+                continue
+            match, _child = candidate.matches(scope)
+            if match is Match.FULL:
+                route = path
+                break
+            if match is Match.PARTIAL and partial is None:  # wrong method: 405
+                partial = path
+        route = route or partial or "unmatched"
+        if len(self._routes) >= _ROUTE_CACHE_SIZE:
+            self._routes.clear()
+        self._routes[key] = route
+        return route
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method, route = scope["method"], self._route(scope)
+        in_flight = HTTP_IN_FLIGHT.labels(method, route)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            if route == "unmatched":
+                # Routers FastAPI nests rather than flattens are only
+                # resolved during routing, which records the route here.
+                route = getattr(scope.get("route"), "path", route)
+            HTTP_LATENCY.labels(method, route).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(method, route, status).inc()
+
+
+# --- Database ---
+
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed.", ("engine", "operation"))
+DB_ERRORS = Counter("db_errors_total", "SQL statements that raised.", ("engine",))
+DB_QUERY_LATENCY = Histogram("db_query_duration_seconds", "Cursor execute time per statement.", ("engine", "operation"))
+DB_POOL_WAIT = Histogram("db_pool_checkout_wait_seconds", "Time waiting for a pooled connection.", ("engine",))
+
+_pools: dict[str, object] = {}
+
+
+def _pool_gauge(read: Callable) -> Callable[[], dict]:
+    def collect() -> dict:
+        values = {}
+        for name, engine in _pools.items():
+            try:
+                values[(name,)] = read(engine.pool)
+            except (AttributeError, NotImplementedError):  # pools without a fixed size
+                continue
+        return values
+    return collect
+
+
+DB_POOL_SIZE = Gauge("db_pool_size", "Configured pool size.", ("engine",), function=_pool_gauge(lambda p: p.size()))
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections in use.", ("engine",), function=_pool_gauge(lambda p: p.checkedout()))
+DB_POOL_OVERFLOW = Gauge("db_pool_overflow", "Connections open beyond the pool size.", ("engine",), function=_pool_gauge(lambda p: max(0, p.overflow())))
+
+
+def _operation(statement: str) -> str:
+    word = statement.lstrip().split(None, 1)[:1]
+    op = word[0].upper() if word else ""
+    return op if op in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH") else "OTHER"
+
+
+def instrument_engine(engine, name: str) -> None:
+    """Count and time every statement and pool checkout on a (sync) Engine.
+
+    For an AsyncEngine pass ``async_engine.sync_engine``. Listeners stay
+    attached across ``dispose()``.
+    """
+    from sqlalchemy import event
+
+    _pools[name] = engine
+    queries_by_op = {op: (DB_QUERIES.labels(name, op), DB_QUERY_LATENCY.labels(name, op))
+                     for op in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "OTHER")}
+    errors = DB_ERRORS.labels(name)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["_metrics_started"].pop()
+        count, latency = queries_by_op[_operation(statement)]
+        count.inc()
+        latency.observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        stack = context.connection.info.get("_metrics_started") if context.connection is not None else None
+        if stack:
+            stack.pop()
+        errors.inc()
+
+
+def timed_pool(pool_class, name: str):
+    """Subclass of ``pool_class`` that records checkout wait under ``name``."""
+    wait = DB_POOL_WAIT.labels(name)
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super(timed, self)._do_get()
+        finally:
+            wait.observe(time.perf_counter() - started)
+
+    timed = type(f"Timed{pool_class.__name__}", (pool_class,), {"_do_get": _do_get})
+    return timed
+
+
+# --- Evidence storage ---
+
+STORAGE_UPLOAD_BYTES = Counter("storage_upload_bytes_total", "Plaintext bytes staged from uploads.")
+STORAGE_UPLOAD_SIZE = Histogram("storage_upload_size_bytes", "Plaintext size per staged upload.", buckets=BYTE_BUCKETS)
+STORAGE_STAGE_LATENCY = Histogram("storage_stage_duration_seconds", "Time to read, hash and encrypt one upload.")
+STORAGE_CRYPTO_SECONDS = Counter("storage_hash_encrypt_seconds_total", "Time spent hashing and encrypting upload chunks.")
+STORAGE_OBSERVER_SECONDS = Counter("storage_observer_seconds_total", "Time spent in chunk observers (e.g. indicator extraction).")
+
+# --- Classifier ---
+
+ML_LOAD_SECONDS = Gauge("ml_model_load_seconds", "Load time of the current zero-shot model.", ("model",))
+ML_INFERENCE_LATENCY = Histogram("ml_inference_duration_seconds", "Zero-shot pipeline call time per batch.")
+ML_BATCH_SIZE = Histogram("ml_batch_size_texts", "Texts per zero-shot pipeline call.", buckets=SIZE_BUCKETS)
+ML_INFERENCE_TEXTS = Counter("ml_inference_texts_total", "Texts scored by the zero-shot model.")
+ML_TIER_TEXTS = Counter("ml_tier_texts_total", "Texts answered by the embedding tier or escalated to zero-shot.", ("tier",))
+
+# --- CERT webhooks ---
+
+WEBHOOK_REQUESTS = Counter("webhook_requests_total", "CERT webhook POSTs by response status.", ("kind", "status"))
+WEBHOOK_LATENCY = Histogram("webhook_request_duration_seconds", "CERT webhook POST time.", ("kind",))
+
+
+# --- Sampling profiler ---
+
+class SamplingProfiler:
+    """Counts collapsed stacks of every thread, sampled every ``interval`` seconds.
+
+    Sampling runs in its own thread and only reads frames, so the cost is
+    one stack walk per thread per sample. Output of :meth:`collapsed` is
+    the ``frame;frame;frame count`` format flame graph tools read.
+    """
+
+    def __init__(self, max_stacks: int = 20_000, max_depth: int = 64):
+        self.max_stacks = max_stacks
+        self.max_depth = max_depth
+        self.interval = 0.01
+        self.samples = 0
+        self.started_at: float | None = None
+        self._stacks: collections.Counter = collections.Counter()
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, interval: float = 0.01, reset: bool = True) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            if reset:
+                self._stacks.clear()
+                self.samples = 0
+            self.interval = max(0.001, interval)
+            self.started_at = time.time()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                key = names.get(ident, str(ident)) + ";" + ";".join(reversed(stack))
+                if key in self._stacks or len(self._stacks) < self.max_stacks:
+                    self._stacks[key] += 1
+            self.samples += 1
+
+    def collapsed(self, limit: int | None = None) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common(limit))
+
+    def status(self) -> dict:
+        return {
+            "running": self.running,
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "stacks": len(self._stacks),
+            "started_at": self.started_at,
+        }
+
+
+profiler = SamplingProfiler()
+PROFILER_SAMPLES = Gauge("profiler_samples", "Samples taken by the sampling profiler since it was last reset.",
+                         function=lambda: profiler.samples)
@@ -0,0 +1,184 @@
+"""Versioned, run-once schema migrations.
+
+Applied versions are recorded in ``schema_migrations``. ``upgrade()`` runs
+the pending ones under a lock (a Postgres advisory lock), so many replicas
+starting together apply each step once and the rest wait and then find
+nothing to do. Serving processes only call ``check()``, which reads the
+recorded version and changes nothing.
+
+Migration 1 creates every table the models define, so a fresh database
+is complete after it and later steps find their columns and indexes
+already there; they still check before altering so databases created
+before this module upgrade cleanly. New tables added to the models after
+this point need their own migration.
+
+    python -m app.migrations upgrade
+    python -m app.migrations status
+"""
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Callable, NamedTuple
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+
+from . import models  # noqa: F401  (registers the tables on Base)
+from .db import Base, engine
+
+logger = logging.getLogger(__name__)
+
+# Serving processes apply pending migrations themselves instead of failing
+# their startup check (for single-process development servers).
+SCHEMA_AUTO_MIGRATE = os.getenv("SCHEMA_AUTO_MIGRATE", "0").lower() in ("1", "true", "yes")
+
+# Arbitrary key shared by every process that migrates this database.
+_ADVISORY_LOCK_KEY = 0x5EC1A7E
+
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(128), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+    Column("duration_ms", Integer, nullable=False),
+)
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[[Connection], None]
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+def _add_column(conn: Connection, table: str, column: str, ddl_type: str) -> None:
+    if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+
+def _create_index(conn: Connection, name: str, table: str, columns: str) -> None:
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+def _baseline(conn: Connection) -> None:
+    Base.metadata.create_all(bind=conn)
+
+
+def _user_otp_columns(conn: Connection) -> None:
+    _add_column(conn, "users", "otp_code", "VARCHAR(16)")
+    _add_column(conn, "users", "otp_expires_at", "TIMESTAMP")
+    _add_column(conn, "users", "created_at", "TIMESTAMP")
+
+
+def _evidence_and_listing_indexes(conn: Connection) -> None:
+    _create_index(conn, "ix_evidence_sha256", "evidence", "sha256")
+    _create_index(conn, "ix_evidence_incident_id", "evidence", "incident_id")
+    _create_index(conn, "ix_incidents_created_at_id", "incidents", "created_at, id")
+    for column in ("risk_label", "evidence_type", "reporter_id"):
+        _create_index(conn, f"ix_incidents_{column}_created_at_id", "incidents", f"{column}, created_at, id")
+
+
+def _incident_description(conn: Connection) -> None:
+    _add_column(conn, "incidents", "description", "TEXT")
+
+
+def _classification_reused_from(conn: Connection) -> None:
+    _add_column(conn, "classification_jobs", "reused_from", "INTEGER")
+
+
+# Append only; never renumber or edit an applied step.
+MIGRATIONS = [
+    Migration(1, "baseline", _baseline),
+    Migration(2, "user_otp_columns", _user_otp_columns),
+    Migration(3, "evidence_and_listing_indexes", _evidence_and_listing_indexes),
+    Migration(4, "incident_description", _incident_description),
+    Migration(5, "classification_reused_from", _classification_reused_from),
+]
+LATEST = MIGRATIONS[-1].version
+
+
+def current_version(conn: Connection) -> int:
+    """Highest applied version; 0 for a database that has never been migrated."""
+    if not inspect(conn).has_table("schema_migrations"):
+        return 0
+    return conn.execute(select(schema_migrations.c.version).order_by(schema_migrations.c.version.desc()).limit(1)).scalar() or 0
+
+
+def _lock(conn: Connection) -> None:
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _ADVISORY_LOCK_KEY})
+    # SQLite serializes writers on the database file.
+
+
+def upgrade(bind: Engine = engine) -> list[str]:
+    """Apply pending migrations; returns the names applied (empty if up to date)."""
+    with bind.connect() as conn:
+        if current_version(conn) >= LATEST:
+            return []
+    applied = []
+    with bind.begin() as conn:
+        _lock(conn)
+        schema_migrations.create(conn, checkfirst=True)
+        # Re-read under the lock: another process may have just finished.
+        version = current_version(conn)
+        for migration in MIGRATIONS:
+            if migration.version <= version:
+                continue
+            started = time.perf_counter()
+            migration.apply(conn)
+            duration_ms = int((time.perf_counter() - started) * 1000)
+            conn.execute(schema_migrations.insert().values(
+                version=migration.version, name=migration.name, applied_at=datetime.utcnow(), duration_ms=duration_ms,
+            ))
+            logger.info("Applied migration %d %s (%d ms)", migration.version, migration.name, duration_ms)
+            applied.append(migration.name)
+    return applied
+
+
+def check(bind: Engine = engine) -> int:
+    """Raise SchemaOutOfDate unless every migration has been applied; returns the version."""
+    try:
+        with bind.connect() as conn:
+            version = current_version(conn)
+    except DBAPIError as exc:
+        raise SchemaOutOfDate(f"cannot read schema version: {exc}") from exc
+    if version < LATEST:
+        raise SchemaOutOfDate(
+            f"database schema is at version {version}, code expects {LATEST}; "
+            "run `python -m app.migrations upgrade` (or set SCHEMA_AUTO_MIGRATE=1)"
+        )
+    return version
+
+
+def ensure_schema(bind: Engine = engine) -> None:
+    """Startup hook for serving processes: check, or upgrade if SCHEMA_AUTO_MIGRATE is set."""
+    if SCHEMA_AUTO_MIGRATE:
+        upgrade(bind)
+    check(bind)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    parser = argparse.ArgumentParser(description="Database schema migrations")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("upgrade", help="Apply pending migrations")
+    sub.add_parser("status", help="Show applied and pending migrations")
+    args = parser.parse_args()
+
+    if args.command == "upgrade":
+        applied = upgrade()
+        print(f"Applied {len(applied)} migration(s); schema at version {LATEST}")
+    else:
+        with engine.connect() as connection:
+            version = current_version(connection)
+        for m in MIGRATIONS:
+            print(f"{m.version:>4} {'applied' if m.version <= version else 'pending':<8} {m.name}")
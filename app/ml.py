@@ -1,10 +1,28 @@
-from transformers import pipeline
+import gc
+import itertools
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from functools import lru_cache
+
+try:
+    from . import metrics
+    from .cache import ResultCache, make_key
+except ImportError:  # run as a script: python app/ml.py ...
+    import metrics
+    from cache import ResultCache, make_key
 
 # Zero-shot classification for cybersecurity incident types
 # CySecBERT (markusbayer/CySecBERT) is an MLM model and does not provide a
 # sequence classification head. We therefore use a strong NLI model for
 # zero-shot classification and map texts to security labels.
 
+logger = logging.getLogger(__name__)
+
 # Candidate labels to detect — adjust as needed
 SECURITY_LABELS = [
     "phishing",
@@ -17,23 +35,337 @@ SECURITY_LABELS = [
     "benign",
 ]
 
+# Popular choices: 'facebook/bart-large-mnli' (English),
+# 'MoritzLaurer/mDeBERTa-v3-base-xnli-multilingual-nli-2mil7' (multilingual)
+DEFAULT_ZERO_SHOT_MODEL = "facebook/bart-large-mnli"
+
+WARMUP_TEXT = "Verify your account credentials at the link below to avoid suspension."
+
+# One pipeline per worker process. Loading is serialized by _classifier_lock;
+# inference is serialized by _inference_lock because the fast tokenizers are
+# not safe to call from several threads at once.
+_classifier = None
+_classifier_model = None
+_classifier_stats: dict = {}
+_classifier_lock = threading.RLock()
+_inference_lock = threading.Lock()
+
+
+def get_zero_shot_model() -> str:
+    """Return the configured zero-shot model.
+
+    ``ZERO_SHOT_MODEL_PATH`` (a local directory) takes precedence over
+    ``ZERO_SHOT_MODEL`` (a hub id).
+    """
+    return os.getenv("ZERO_SHOT_MODEL_PATH") or os.getenv("ZERO_SHOT_MODEL", DEFAULT_ZERO_SHOT_MODEL)
+
+
+def resident_memory_mb() -> float:
+    """Current resident set size of this process in MiB."""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Non-Linux fallback: peak RSS (KiB on Linux/BSD, bytes on macOS).
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
 
-def get_classifier():
-    """Return a zero-shot classification pipeline.
+
+def load_classifier(model: str | None = None):
+    """Load the zero-shot pipeline for ``model``, replacing any cached one."""
+    global _classifier, _classifier_model, _classifier_stats
+    from transformers import pipeline
+
+    model = model or get_zero_shot_model()
+    with _classifier_lock:
+        release_classifier()
+        rss_before = resident_memory_mb()
+        started = time.perf_counter()
+        clf = pipeline(task="zero-shot-classification", model=model)
+        load_seconds = time.perf_counter() - started
+        rss_after = resident_memory_mb()
+
+        _classifier = clf
+        _classifier_model = model
+        _classifier_stats = {
+            "model": model,
+            "load_seconds": round(load_seconds, 3),
+            "rss_mb": round(rss_after, 1),
+            "rss_delta_mb": round(rss_after - rss_before, 1),
+        }
+        metrics.ML_LOAD_SECONDS.labels(model).set(load_seconds)
+        logger.info(
+            "Loaded zero-shot model %s in %.2fs (RSS %.0f MiB, +%.0f MiB)",
+            model, load_seconds, rss_after, rss_after - rss_before,
+        )
+        return clf
+
+
+def release_classifier() -> None:
+    """Drop the cached pipeline so its weights can be freed."""
+    global _classifier, _classifier_model, _classifier_stats
+    with _classifier_lock:
+        if _classifier is None:
+            return
+        logger.info("Releasing zero-shot model %s", _classifier_model)
+        _classifier = None
+        _classifier_model = None
+        _classifier_stats = {}
+        gc.collect()
+
+
+def get_classifier(model: str | None = None):
+    """Return the process-wide zero-shot classification pipeline.
 
     Uses an NLI model because CySecBERT lacks a sequence classification head.
+    The pipeline is built once and reused; it is reloaded only when the
+    requested model id or local path differs from the cached one.
+    """
+    model = model or get_zero_shot_model()
+    clf = _classifier
+    if clf is not None and _classifier_model == model:
+        return clf
+    with _classifier_lock:
+        if _classifier is not None and _classifier_model == model:
+            return _classifier
+        return load_classifier(model)
+
+
+def warmup_classifier(model: str | None = None) -> dict:
+    """Load the classifier and run one inference so the first request is fast.
+
+    Returns load time, warmup time and resident memory for worker sizing.
     """
-    # Popular choices: 'facebook/bart-large-mnli' (English),
-    # 'MoritzLaurer/mDeBERTa-v3-base-xnli-multilingual-nli-2mil7' (multilingual)
-    return pipeline(
-        task="zero-shot-classification",
-        model="facebook/bart-large-mnli",
+    clf = get_classifier(model)
+    started = time.perf_counter()
+    with _inference_lock:
+        clf(WARMUP_TEXT, candidate_labels=SECURITY_LABELS, multi_label=True)
+    warmup_seconds = time.perf_counter() - started
+
+    stats = dict(_classifier_stats)
+    stats["warmup_seconds"] = round(warmup_seconds, 3)
+    if tiering_enabled():
+        # Load the encoder and label embeddings too, so the first tiered request is fast.
+        get_label_embeddings()
+        stats["embedding_model"] = _encoder_model
+    stats["rss_mb"] = round(resident_memory_mb(), 1)
+    logger.info(
+        "Zero-shot model %s warm (warmup %.2fs, RSS %.0f MiB)",
+        stats.get("model"), warmup_seconds, stats["rss_mb"],
     )
+    return stats
+
+
+def classifier_stats() -> dict:
+    """Load statistics of the currently cached classifier (empty if none)."""
+    return dict(_classifier_stats)
+
+
+def _rank(result) -> list:
+    """Normalize one pipeline result to [(label, score)] sorted by score."""
+    label_to_score = dict(zip(result["labels"], result["scores"]))
+    return sorted(label_to_score.items(), key=lambda kv: kv[1], reverse=True)
+
+
+def _run_zero_shot(texts, labels, multi_label=True) -> list:
+    """Score several texts against the same labels in one pipeline call.
+
+    All (text, label) premise/hypothesis pairs go through the model as a
+    single padded batch instead of one forward pass per pair.
+    """
+    texts = list(texts)
+    if not texts:
+        return []
+    clf = get_classifier()
+    with _inference_lock:
+        started = time.perf_counter()
+        results = clf(
+            texts,
+            candidate_labels=list(labels),
+            multi_label=multi_label,
+            batch_size=len(texts) * len(labels),
+        )
+        metrics.ML_INFERENCE_LATENCY.observe(time.perf_counter() - started)
+    metrics.ML_BATCH_SIZE.observe(len(texts))
+    metrics.ML_INFERENCE_TEXTS.inc(len(texts))
+    if isinstance(results, dict):
+        results = [results]
+    return [_rank(r) for r in results]
+
+
+class _BatchItem:
+    __slots__ = ("text", "labels", "multi_label", "future")
+
+    def __init__(self, text, labels, multi_label):
+        self.text = text
+        self.labels = labels
+        self.multi_label = multi_label
+        self.future = Future()
+
+
+class ZeroShotBatcher:
+    """Micro-batching front end for the zero-shot classifier.
+
+    Concurrent callers enqueue single texts; a background thread waits up
+    to ``max_wait_ms`` for up to ``max_batch_size`` texts, runs them as one
+    batch and resolves each caller's future with its own ranked result.
+    Requests with different label sets or ``multi_label`` flags are
+    batched separately.
+    """
+
+    def __init__(self, max_batch_size: int = 16, max_wait_ms: float = 5.0):
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.batches = 0
+        self.items = 0
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, text, labels=None, multi_label=True) -> Future:
+        """Queue ``text`` for classification and return a future of its ranking."""
+        item = _BatchItem(text, tuple(labels or SECURITY_LABELS), bool(multi_label))
+        self._ensure_started()
+        self._queue.put(item)
+        return item.future
+
+    def classify(self, text, labels=None, multi_label=True, timeout: float | None = None) -> list:
+        return self.submit(text, labels, multi_label).result(timeout=timeout)
+
+    def stop(self) -> None:
+        """Finish queued work and stop the background thread."""
+        with self._start_lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self._queue.put(None)
+            thread.join()
+            self._thread = None
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="zero-shot-batcher", daemon=True)
+                self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            stopping = False
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._process(batch)
+            if stopping:
+                return
+
+    def _process(self, batch) -> None:
+        groups: dict = {}
+        for item in batch:
+            groups.setdefault((item.labels, item.multi_label), []).append(item)
+
+        for (labels, multi_label), items in groups.items():
+            try:
+                ranked = _run_zero_shot([i.text for i in items], labels, multi_label)
+            except BaseException as exc:  # propagate to every waiting caller
+                for i in items:
+                    i.future.set_exception(exc)
+                continue
+            for i, result in zip(items, ranked):
+                i.future.set_result(result)
+
+        self.batches += 1
+        self.items += len(batch)
+
+
+_batcher: ZeroShotBatcher | None = None
+_batcher_lock = threading.Lock()
+
+
+def batching_enabled() -> bool:
+    return os.getenv("ML_BATCHING", "1").lower() not in ("0", "false", "no")
+
+
+def get_batcher() -> ZeroShotBatcher:
+    """Return the process-wide batcher configured from the environment.
+
+    ``ML_BATCH_MAX_SIZE`` caps texts per batch (default 16) and
+    ``ML_BATCH_MAX_WAIT_MS`` caps how long the first request waits for
+    company (default 5 ms).
+    """
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = ZeroShotBatcher(
+                    max_batch_size=int(os.getenv("ML_BATCH_MAX_SIZE", "16")),
+                    max_wait_ms=float(os.getenv("ML_BATCH_MAX_WAIT_MS", "5")),
+                )
+    return _batcher
+
+
+_result_cache: ResultCache | None = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache | None:
+    """Return the process-wide classification result cache, or None if disabled.
+
+    ``ML_RESULT_CACHE_SIZE`` bounds in-memory entries (default 4096, 0
+    disables), ``ML_RESULT_CACHE_TTL`` sets expiry in seconds (default one
+    day) and ``ML_RESULT_CACHE_PATH`` enables a SQLite file that survives
+    restarts.
+    """
+    global _result_cache
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                size = int(os.getenv("ML_RESULT_CACHE_SIZE", "4096"))
+                path = os.getenv("ML_RESULT_CACHE_PATH") or None
+                if size <= 0 and not path:
+                    return None
+                _result_cache = ResultCache(
+                    max_entries=size,
+                    ttl_seconds=float(os.getenv("ML_RESULT_CACHE_TTL", "86400")),
+                    path=path,
+                )
+    return _result_cache
+
+
+def result_cache_stats() -> dict:
+    cache = get_result_cache()
+    return cache.stats() if cache is not None else {}
+
+
+def _cached_ranking(cache, key):
+    hit = cache.get(key) if cache is not None else None
+    return [tuple(pair) for pair in hit] if hit is not None else None
 
 
 def classify_text(text, labels=None, multi_label=True):
     """Classify input text into cybersecurity categories.
 
+    Goes through the embedding tier first (see :func:`classify_tiered`)
+    when ``ML_TIERED=1``. Zero-shot results are memoized by normalized
+    text, model, labels and ``multi_label``; concurrent misses are
+    coalesced by the micro-batcher unless ``ML_BATCHING=0``.
+
     Args:
         text (str): The text to classify.
         labels (list[str]): Candidate labels to score.
@@ -42,20 +374,960 @@ def classify_text(text, labels=None, multi_label=True):
     Returns:
         list[tuple[str, float]]: (label, score) sorted by score descending.
     """
+    if tiering_enabled():
+        return classify_tiered(text, labels, multi_label)
+    return _classify_zero_shot(text, labels, multi_label)
+
+
+def _classify_zero_shot(text, labels=None, multi_label=True):
     if labels is None:
         labels = SECURITY_LABELS
-    clf = get_classifier()
-    result = clf(text, candidate_labels=labels, multi_label=multi_label)
-    # Normalize to list of (label, score)
-    label_to_score = dict(zip(result["labels"], result["scores"]))
-    top_ranked = sorted(label_to_score.items(), key=lambda kv: kv[1], reverse=True)
-    return top_ranked
+    cache = get_result_cache()
+    key = make_key(text, get_zero_shot_model(), labels, multi_label) if cache is not None else None
+    cached = _cached_ranking(cache, key)
+    if cached is not None:
+        return cached
+
+    if batching_enabled():
+        ranked = get_batcher().classify(text, labels, multi_label)
+    else:
+        ranked = _run_zero_shot([text], labels, multi_label)[0]
+    if cache is not None:
+        cache.put(key, ranked)
+    return ranked
+
+
+# --- Embedding-similarity first tier ---
+#
+# A small bi-encoder embeds the text once and compares it with cached label
+# embeddings. Only when the top two labels are too close (low margin) does
+# the request escalate to the BART-MNLI cross-encoder above.
+
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Same hypothesis phrasing the zero-shot pipeline uses for its labels.
+HYPOTHESIS_TEMPLATE = "This example is {}."
+
+# Softmax temperature applied to cosine similarities.
+EMBEDDING_TEMPERATURE = 0.05
+
+_encoder = None
+_encoder_model = None
+_encoder_lock = threading.RLock()
+_label_embeddings: dict = {}
+_tier_lock = threading.Lock()
+_tier_counts = {"fast": 0, "escalated": 0}
+
+
+def get_embedding_model() -> str:
+    return os.getenv("EMBEDDING_MODEL_PATH") or os.getenv("EMBEDDING_MODEL", DEFAULT_EMBEDDING_MODEL)
+
+
+def tiering_enabled() -> bool:
+    """Whether classify_text/classify_many try the embedding tier first.
+
+    Opt-in with ``ML_TIERED=1``: it loads a second model, and fast-tier
+    scores are a softmax over labels rather than independent per-label
+    probabilities, so thresholds tuned on zero-shot scores (such as
+    ``CLASSIFY_RED_MIN_SCORE``) need re-checking before turning it on.
+    """
+    return os.getenv("ML_TIERED", "0").lower() in ("1", "true", "yes")
+
+
+def get_escalation_margin() -> float:
+    """Minimum top-1/top-2 probability gap the fast tier answers on its own."""
+    return float(os.getenv("ML_ESCALATION_MARGIN", "0.15"))
+
+
+class _Encoder:
+    """Mean-pooled, L2-normalized sentence embeddings from a HF encoder."""
+
+    def __init__(self, model: str):
+        from transformers import AutoModel, AutoTokenizer
+
+        self.model_id = model
+        self.tokenizer = AutoTokenizer.from_pretrained(model)
+        self.model = AutoModel.from_pretrained(model)
+        self.model.eval()
+
+    def encode(self, texts):
+        import torch
+
+        inputs = self.tokenizer(list(texts), padding=True, truncation=True, return_tensors="pt")
+        with torch.inference_mode():
+            hidden = self.model(**inputs).last_hidden_state
+        mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+        pooled = torch.nn.functional.normalize(pooled, p=2, dim=1)
+        return pooled.cpu().numpy()
+
+
+def get_encoder(model: str | None = None) -> _Encoder:
+    """Return the process-wide sentence encoder, reloading if the model changed."""
+    global _encoder, _encoder_model
+    model = model or get_embedding_model()
+    with _encoder_lock:
+        if _encoder is None or _encoder_model != model:
+            started = time.perf_counter()
+            _encoder = None
+            _label_embeddings.clear()
+            gc.collect()
+            _encoder = _Encoder(model)
+            _encoder_model = model
+            logger.info("Loaded embedding model %s in %.2fs", model, time.perf_counter() - started)
+        return _encoder
+
+
+def get_label_embeddings(labels=None, model: str | None = None):
+    """Return the (n_labels, dim) hypothesis embeddings for ``labels``.
+
+    Cached per (model, label set, template); switching the embedding model
+    drops every cached entry.
+    """
+    labels = tuple(labels or SECURITY_LABELS)
+    encoder = get_encoder(model)
+    key = (encoder.model_id, labels, HYPOTHESIS_TEMPLATE)
+    with _encoder_lock:
+        cached = _label_embeddings.get(key)
+        if cached is None:
+            cached = encoder.encode([HYPOTHESIS_TEMPLATE.format(label) for label in labels])
+            _label_embeddings[key] = cached
+        return cached
+
+
+def classify_fast_many(texts, labels=None) -> list:
+    """Rank labels for several texts with one encoder call.
+
+    Returns:
+        list[tuple[list[tuple[str, float]], float]]: per text, the ranking
+        (softmax over similarities, descending) and the margin between the
+        top two scores.
+    """
+    import numpy as np
+
+    labels = list(labels or SECURITY_LABELS)
+    label_vecs = get_label_embeddings(labels)
+    encoder = get_encoder()
+    with _encoder_lock:
+        text_vecs = encoder.encode(list(texts))
+
+    logits = (text_vecs @ label_vecs.T) / EMBEDDING_TEMPERATURE
+    probs = np.exp(logits - logits.max(axis=1, keepdims=True))
+    probs /= probs.sum(axis=1, keepdims=True)
+
+    results = []
+    for row in probs.tolist():
+        ranked = sorted(zip(labels, row), key=lambda kv: kv[1], reverse=True)
+        margin = ranked[0][1] - ranked[1][1] if len(ranked) > 1 else 1.0
+        results.append((ranked, margin))
+    return results
+
+
+def classify_fast(text, labels=None):
+    """Rank labels by cosine similarity between text and label embeddings.
+
+    Returns:
+        tuple[list[tuple[str, float]], float]: the ranking (softmax over
+        similarities, descending) and the margin between the top two scores.
+    """
+    return classify_fast_many([text], labels)[0]
+
+
+def _count_tiers(fast: int, escalated: int) -> None:
+    with _tier_lock:
+        _tier_counts["fast"] += fast
+        _tier_counts["escalated"] += escalated
+    if fast:
+        metrics.ML_TIER_TEXTS.labels("fast").inc(fast)
+    if escalated:
+        metrics.ML_TIER_TEXTS.labels("escalated").inc(escalated)
+
+
+def classify_tiered(text, labels=None, multi_label=True, margin: float | None = None):
+    """Answer from the embedding tier, escalating low-margin texts.
+
+    Texts whose fast-tier margin is below ``margin`` (default
+    ``ML_ESCALATION_MARGIN``) are re-scored by the zero-shot model.
+    Fast-tier scores are a softmax over labels, so ``multi_label`` only
+    affects escalated results.
+
+    Returns:
+        list[tuple[str, float]]: (label, score) sorted by score descending.
+    """
+    if margin is None:
+        margin = get_escalation_margin()
+    ranked, gap = classify_fast(text, labels)
+    if gap >= margin:
+        _count_tiers(1, 0)
+        return ranked
+
+    _count_tiers(0, 1)
+    return _classify_zero_shot(text, labels, multi_label)
+
+
+def tier_stats() -> dict:
+    """Counts of fast-tier answers vs. escalations since process start."""
+    with _tier_lock:
+        fast = _tier_counts["fast"]
+        escalated = _tier_counts["escalated"]
+    total = fast + escalated
+    return {
+        "fast": fast,
+        "escalated": escalated,
+        "escalation_rate": escalated / total if total else 0.0,
+        "escalation_margin": get_escalation_margin(),
+        "embedding_model": _encoder_model,
+    }
+
+
+def classify_many(texts, batch_size: int = 16, labels=None, multi_label=True):
+    """Classify an iterable of texts, yielding one ranking per text in order.
+
+    Texts are consumed lazily ``batch_size`` at a time, so arbitrarily long
+    inputs (e.g. a generator over a file) run in bounded memory. Each chunk
+    goes through the embedding tier first when ``ML_TIERED=1``; only its
+    low-margin texts then reach the zero-shot model.
+
+    Args:
+        texts (Iterable[str]): Texts to classify.
+        batch_size (int): Texts per model call.
+        labels (list[str]): Candidate labels to score.
+        multi_label (bool): Allow multiple labels to be true.
+
+    Yields:
+        list[tuple[str, float]]: (label, score) sorted by score descending.
+    """
+    if labels is None:
+        labels = SECURITY_LABELS
+    batch_size = max(1, int(batch_size))
+    tiered = tiering_enabled()
+    margin = get_escalation_margin()
+    iterator = iter(texts)
+    while True:
+        chunk = list(itertools.islice(iterator, batch_size))
+        if not chunk:
+            return
+        if not tiered:
+            yield from _zero_shot_many(chunk, labels, multi_label)
+            continue
+
+        results = []
+        escalate = []
+        for i, (ranked, gap) in enumerate(classify_fast_many(chunk, labels)):
+            results.append(ranked)
+            if gap < margin:
+                escalate.append(i)
+        _count_tiers(len(chunk) - len(escalate), len(escalate))
+        if escalate:
+            for i, ranked in zip(escalate, _zero_shot_many([chunk[i] for i in escalate], labels, multi_label)):
+                results[i] = ranked
+        yield from results
+
+
+def _zero_shot_many(texts, labels, multi_label) -> list:
+    """Zero-shot rankings for ``texts``; result cache hits skip the model."""
+    cache = get_result_cache()
+    if cache is None:
+        return _run_zero_shot(texts, labels, multi_label)
+
+    model = get_zero_shot_model()
+    keys = [make_key(t, model, labels, multi_label) for t in texts]
+    results = [_cached_ranking(cache, k) for k in keys]
+    missing = [i for i, r in enumerate(results) if r is None]
+    if missing:
+        for i, ranked in zip(missing, _run_zero_shot([texts[i] for i in missing], labels, multi_label)):
+            cache.put(keys[i], ranked)
+            results[i] = ranked
+    return results
+
+
+def classify_csv(
+    dataset: str,
+    output: str,
+    text_column: str,
+    chunk_size: int = 1000,
+    batch_size: int = 16,
+    labels=None,
+    multi_label=True,
+) -> int:
+    """Score every row of a CSV and write predictions incrementally.
+
+    The CSV is read ``chunk_size`` rows at a time and each chunk is appended
+    to ``output`` before the next is read. Output is Parquet when the path
+    ends in ``.parquet`` (requires pyarrow), CSV otherwise. Returns the
+    number of rows written.
+    """
+    import pandas as pd
+
+    if labels is None:
+        labels = SECURITY_LABELS
+    to_parquet = output.lower().endswith(".parquet")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+
+    parquet_writer = None
+    rows_done = 0
+    started = time.perf_counter()
+    try:
+        for chunk in pd.read_csv(dataset, chunksize=chunk_size):
+            if text_column not in chunk.columns:
+                raise ValueError(f"Text column '{text_column}' not in CSV columns: {list(chunk.columns)}")
+            texts = chunk[text_column].fillna("").astype(str).tolist()
+
+            records = []
+            for row_idx, ranked in zip(chunk.index, classify_many(texts, batch_size, labels, multi_label)):
+                record = {"row": int(row_idx), "top_label": ranked[0][0], "top_score": float(ranked[0][1])}
+                for label, score in ranked:
+                    record[f"score_{label}"] = float(score)
+                records.append(record)
+            out = pd.DataFrame.from_records(records, columns=["row", "top_label", "top_score"] + [f"score_{label}" for label in labels])
+
+            if to_parquet:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+
+                table = pa.Table.from_pandas(out, preserve_index=False)
+                if parquet_writer is None:
+                    parquet_writer = pq.ParquetWriter(output, table.schema)
+                parquet_writer.write_table(table)
+            else:
+                out.to_csv(output, mode="w" if rows_done == 0 else "a", header=rows_done == 0, index=False)
+
+            rows_done += len(out)
+            elapsed = time.perf_counter() - started
+            print(f"classified {rows_done} rows ({rows_done / elapsed:.1f} rows/sec)", file=sys.stderr, flush=True)
+    finally:
+        if parquet_writer is not None:
+            parquet_writer.close()
+    return rows_done
+
+
+# --- Fine-tuned CySecBERT classifier (ml.py --train) ---
+
+DEFAULT_FINETUNED_DIR = os.path.join("models", "cysecbert-threat-cls")
+
+# Artifacts written by export_optimized(), relative to the model directory.
+OPTIMIZED_SUBDIR = "optimized"
+TORCH_INT8_FILE = "model.int8.pt"
+ONNX_FP32_FILE = "model.onnx"
+ONNX_INT8_FILE = "model.int8.onnx"
+# Fingerprint of the fp32 files an export was made from; int8 artifacts that
+# no longer match (the model was retrained since) are not served.
+EXPORT_SOURCE_FILE = "source.json"
+WEIGHT_FILES = ("model.safetensors", "pytorch_model.bin")
+
+FINETUNED_BACKENDS = ("onnx-int8", "torch-int8", "fp32")
+
+_finetuned: dict = {}
+_finetuned_lock = threading.Lock()
+
+
+def load_labeled_splits(dataset: str, text_column: str, label_column: str, seed: int = 42):
+    """Read the training CSV and return (train_df, val_df, id2label, label2id).
+
+    Both frames have ``text``, ``label`` and ``label_id`` columns. The split
+    is stratified and deterministic for a given ``seed``, so the validation
+    rows used by --benchmark match the ones --train evaluated on.
+    """
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+
+    df = pd.read_csv(dataset)
+    if text_column not in df.columns:
+        raise ValueError(f"Text column '{text_column}' not in CSV columns: {list(df.columns)}")
+    if label_column not in df.columns:
+        raise ValueError(f"Label column '{label_column}' not in CSV columns: {list(df.columns)}")
+
+    df = df[[text_column, label_column]].dropna()
+    df = df.rename(columns={text_column: "text", label_column: "label"})
+
+    # Build label set and mapping
+    unique_labels = sorted(df["label"].astype(str).unique())
+    label2id = {label: i for i, label in enumerate(unique_labels)}
+    id2label = {i: label for label, i in label2id.items()}
+    df["label_id"] = df["label"].astype(str).map(label2id)
+
+    train_df, val_df = train_test_split(df, test_size=0.2, random_state=seed, stratify=df["label_id"])
+    return train_df, val_df, id2label, label2id
+
+
+DEFAULT_BASE_MODEL = "markusbayer/CySecBERT"
+# Tokenized splits are cached here as Arrow files, one directory per key.
+DEFAULT_TOKENIZED_CACHE = os.path.join("data", ".tokenized")
+
+
+def _file_sha256(path: str) -> str:
+    import hashlib
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def tokenized_cache_key(dataset: str, tokenizer, max_length: int, text_column: str, label_column: str, seed: int) -> str:
+    """Changes whenever the CSV contents, tokenizer, max length, columns or split seed change."""
+    import hashlib
+
+    h = hashlib.sha256()
+    for part in (_file_sha256(dataset), tokenizer.name_or_path, type(tokenizer).__name__, len(tokenizer),
+                 max_length, text_column, label_column, seed):
+        h.update(str(part).encode("utf-8") + b"\0")
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    if backend is not None:  # vocab, normalizer and pre-tokenizer of fast tokenizers
+        h.update(backend.to_str().encode("utf-8"))
+    return h.hexdigest()[:20]
+
+
+def load_tokenized_splits(
+    dataset: str,
+    text_column: str,
+    label_column: str,
+    tokenizer,
+    max_length: int = 256,
+    seed: int = 42,
+    cache_dir: str = DEFAULT_TOKENIZED_CACHE,
+):
+    """Tokenized train/validation splits, cached on disk.
+
+    Returns (train_ds, val_ds, id2label, label2id, cache_hit). Splits hold
+    ``input_ids``, ``attention_mask``, ``labels`` and ``length`` (unpadded
+    token count, used for length-grouped batching). They are saved with
+    ``save_to_disk`` and loaded back memory-mapped, so later runs skip both
+    pandas and the tokenizer.
+    """
+    import json
+
+    from datasets import Dataset, DatasetDict, load_from_disk
+
+    path = os.path.join(cache_dir, tokenized_cache_key(dataset, tokenizer, max_length, text_column, label_column, seed))
+    labels_path = os.path.join(path, "labels.json")
+    cache_hit = os.path.exists(labels_path)
+    if not cache_hit:
+        train_df, val_df, id2label, _label2id = load_labeled_splits(dataset, text_column, label_column, seed)
+
+        def encode(batch):
+            encoded = tokenizer(batch["text"], truncation=True, max_length=max_length)
+            encoded["length"] = [len(ids) for ids in encoded["input_ids"]]
+            return encoded
+
+        splits = DatasetDict({
+            name: Dataset.from_pandas(
+                frame[["text", "label_id"]].rename(columns={"label_id": "labels"}), preserve_index=False
+            )
+            for name, frame in (("train", train_df), ("validation", val_df))
+        }).map(encode, batched=True, remove_columns=["text"])
+
+        # Write to a temporary directory and rename, so an interrupted run
+        # never leaves a half-written cache entry behind.
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        splits.save_to_disk(tmp_path)
+        with open(os.path.join(tmp_path, "labels.json"), "w", encoding="utf-8") as f:
+            json.dump({str(i): label for i, label in id2label.items()}, f)
+        try:
+            os.replace(tmp_path, path)
+        except OSError:  # another run finished first
+            import shutil
+
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        logger.info("Cached tokenized splits in %s", path)
+
+    splits = load_from_disk(path)
+    with open(labels_path, encoding="utf-8") as f:
+        id2label = {int(i): label for i, label in json.load(f).items()}
+    label2id = {label: i for i, label in id2label.items()}
+    return splits["train"], splits["validation"], id2label, label2id, cache_hit
+
+
+def configure_torch_threads(intra_op: int | None = None, inter_op: int | None = None) -> dict:
+    """Set torch CPU thread pools (defaults: TORCH_NUM_THREADS / TORCH_INTEROP_THREADS).
+
+    The inter-op pool can only be sized before torch starts any parallel
+    work, so call this before loading models.
+    """
+    import torch
+
+    intra_op = intra_op or int(os.getenv("TORCH_NUM_THREADS", "0")) or None
+    inter_op = inter_op or int(os.getenv("TORCH_INTEROP_THREADS", "0")) or None
+    if intra_op:
+        torch.set_num_threads(intra_op)
+    if inter_op:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError:
+            logger.warning("Inter-op threads already initialized; keeping %d", torch.get_num_interop_threads())
+    return {"intra_op": torch.get_num_threads(), "inter_op": torch.get_num_interop_threads()}
+
+
+def train_finetuned(
+    dataset: str,
+    text_column: str,
+    label_column: str,
+    model_out: str = DEFAULT_FINETUNED_DIR,
+    base_model: str = DEFAULT_BASE_MODEL,
+    epochs: int = 3,
+    batch_size: int = 8,
+    lr: float = 2e-5,
+    seed: int = 42,
+    max_length: int = 256,
+    cache_dir: str = DEFAULT_TOKENIZED_CACHE,
+    torch_threads: int | None = None,
+    interop_threads: int | None = None,
+    resume: bool = False,
+    patience: int = 2,
+    max_steps: int = -1,
+    legacy: bool = False,
+) -> dict:
+    """Fine-tune ``base_model`` on the CSV and save it to ``model_out``.
+
+    Uses the cached tokenized splits, length-grouped batches (so each batch
+    is padded only to its own longest text), early stopping on macro-F1
+    after ``patience`` epochs without improvement, and can resume from the
+    last checkpoint in ``<model_out>/trainer``. ``legacy=True`` runs the
+    previous pipeline (re-tokenize every run, random batches, no early
+    stopping) for comparison. Returns timings and throughput, which are
+    also written to ``<model_out>/train_report.json``.
+    """
+    import json
+
+    started = time.perf_counter()
+    threads = configure_torch_threads(torch_threads, interop_threads) if not legacy else None
+
+    import numpy as np
+    from sklearn.metrics import accuracy_score, f1_score
+    from transformers import (
+        AutoModelForSequenceClassification,
+        AutoTokenizer,
+        DataCollatorWithPadding,
+        EarlyStoppingCallback,
+        Trainer,
+        TrainingArguments,
+        set_seed,
+    )
+    from transformers.trainer_utils import get_last_checkpoint
+
+    set_seed(seed)
+    os.makedirs(model_out, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(base_model, use_fast=True)
+
+    tokenize_started = time.perf_counter()
+    if legacy:
+        from datasets import Dataset
+
+        train_df, val_df, id2label, label2id = load_labeled_splits(dataset, text_column, label_column, seed)
+        train_ds, val_ds = (
+            Dataset.from_pandas(frame[["text", "label_id"]].rename(columns={"label_id": "labels"}), preserve_index=False)
+            .map(lambda batch: tokenizer(batch["text"], truncation=True), batched=True, remove_columns=["text"])
+            for frame in (train_df, val_df)
+        )
+        cache_hit = False
+    else:
+        train_ds, val_ds, id2label, label2id, cache_hit = load_tokenized_splits(
+            dataset, text_column, label_column, tokenizer, max_length, seed, cache_dir
+        )
+    tokenize_seconds = time.perf_counter() - tokenize_started
+
+    model = AutoModelForSequenceClassification.from_pretrained(
+        base_model,
+        num_labels=len(id2label),
+        id2label=id2label,
+        label2id=label2id,
+    )
+
+    def compute_metrics(eval_pred):
+        logits, labels = eval_pred
+        preds = np.argmax(logits, axis=-1)
+        return {
+            "accuracy": float(accuracy_score(labels, preds)),
+            "f1_macro": float(f1_score(labels, preds, average="macro")),
+        }
+
+    output_dir = os.path.join(model_out, "trainer")
+    training_args = TrainingArguments(
+        output_dir=output_dir,
+        num_train_epochs=epochs,
+        max_steps=max_steps,
+        per_device_train_batch_size=batch_size,
+        per_device_eval_batch_size=batch_size,
+        learning_rate=lr,
+        eval_strategy="epoch",
+        save_strategy="epoch",
+        save_total_limit=2,
+        load_best_model_at_end=True,
+        metric_for_best_model="f1_macro",
+        group_by_length=not legacy,
+        length_column_name="length",
+        dataloader_pin_memory=False,
+        logging_steps=50,
+        report_to=[],
+        seed=seed,
+    )
+
+    trainer = Trainer(
+        model=model,
+        args=training_args,
+        train_dataset=train_ds,
+        eval_dataset=val_ds,
+        processing_class=tokenizer,
+        data_collator=DataCollatorWithPadding(tokenizer=tokenizer),
+        compute_metrics=compute_metrics,
+        callbacks=[] if legacy else [EarlyStoppingCallback(early_stopping_patience=patience)],
+    )
+
+    checkpoint = get_last_checkpoint(output_dir) if resume and os.path.isdir(output_dir) else None
+    if checkpoint:
+        logger.info("Resuming from %s", checkpoint)
+    train_started = time.perf_counter()
+    train_output = trainer.train(resume_from_checkpoint=checkpoint)
+    train_seconds = time.perf_counter() - train_started
+
+    model.save_pretrained(model_out)
+    tokenizer.save_pretrained(model_out)
+    # int8 exports of the previous weights are stale now; re-run --export_optimized.
+    stale_exports = os.path.join(model_out, OPTIMIZED_SUBDIR)
+    if os.path.isdir(stale_exports):
+        import shutil
+
+        shutil.rmtree(stale_exports, ignore_errors=True)
+        logger.info("Removed stale optimized exports in %s", stale_exports)
+
+    # Save label maps for later inference
+    with open(os.path.join(model_out, "labels.txt"), "w", encoding="utf-8") as f:
+        for idx in range(len(id2label)):
+            f.write(f"{idx}\t{id2label[idx]}\n")
+
+    report = {
+        "pipeline": "legacy" if legacy else "cached",
+        "tokenized_cache_hit": cache_hit,
+        "tokenize_seconds": tokenize_seconds,
+        "train_seconds": train_seconds,
+        "wall_seconds": time.perf_counter() - started,
+        "train_samples_per_second": train_output.metrics.get("train_samples_per_second"),
+        "train_rows": len(train_ds),
+        "epochs_run": trainer.state.epoch,
+        "resumed_from": checkpoint,
+        "best_metric": trainer.state.best_metric,
+        "torch_threads": threads,
+        "max_length": None if legacy else max_length,
+    }
+    with open(os.path.join(model_out, "train_report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def _optimized_path(model_dir: str, filename: str) -> str:
+    return os.path.join(model_dir, OPTIMIZED_SUBDIR, filename)
+
+
+def _onnxruntime_available() -> bool:
+    try:
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _source_fingerprint(model_dir: str) -> dict:
+    """(size, mtime_ns) of config.json and the fp32 weights in ``model_dir``."""
+    fingerprint = {}
+    for name in ("config.json",) + WEIGHT_FILES:
+        path = os.path.join(model_dir, name)
+        if os.path.exists(path):
+            stat = os.stat(path)
+            fingerprint[name] = [stat.st_size, stat.st_mtime_ns]
+    return fingerprint
+
+
+def export_is_current(model_dir: str = DEFAULT_FINETUNED_DIR) -> bool:
+    """True if the optimized exports were made from the fp32 weights now on disk."""
+    import json
+
+    try:
+        with open(_optimized_path(model_dir, EXPORT_SOURCE_FILE), encoding="utf-8") as f:
+            recorded = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return recorded == _source_fingerprint(model_dir)
+
+
+def available_backends(model_dir: str = DEFAULT_FINETUNED_DIR) -> list:
+    """Backends with an up-to-date artifact on disk, fastest first."""
+    if not export_is_current(model_dir):
+        return ["fp32"]
+    backends = []
+    if _onnxruntime_available() and os.path.exists(_optimized_path(model_dir, ONNX_INT8_FILE)):
+        backends.append("onnx-int8")
+    if os.path.exists(_optimized_path(model_dir, TORCH_INT8_FILE)):
+        backends.append("torch-int8")
+    backends.append("fp32")
+    return backends
+
+
+def export_optimized(model_dir: str = DEFAULT_FINETUNED_DIR) -> dict:
+    """Write int8 variants of a fine-tuned model next to the fp32 weights.
+
+    Always writes a torch dynamic-quantized state dict (int8 ``Linear``
+    layers). If onnxruntime is installed, also exports ONNX and a
+    dynamically quantized ONNX model. Returns artifact paths.
+    """
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+    out_dir = os.path.join(model_dir, OPTIMIZED_SUBDIR)
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    model = AutoModelForSequenceClassification.from_pretrained(model_dir)
+    model.eval()
+
+    artifacts = {}
+    quantized = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    torch.save(quantized.state_dict(), _optimized_path(model_dir, TORCH_INT8_FILE))
+    artifacts["torch-int8"] = _optimized_path(model_dir, TORCH_INT8_FILE)
+
+    if _onnxruntime_available():
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        sample = tokenizer("suspicious login from unknown device", return_tensors="pt")
+        input_names = [name for name in tokenizer.model_input_names if name in sample]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["logits"] = {0: "batch"}
+        onnx_path = _optimized_path(model_dir, ONNX_FP32_FILE)
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            onnx_path,
+            input_names=input_names,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=17,
+        )
+        quantize_dynamic(onnx_path, _optimized_path(model_dir, ONNX_INT8_FILE), weight_type=QuantType.QInt8)
+        artifacts["onnx-int8"] = _optimized_path(model_dir, ONNX_INT8_FILE)
+    else:
+        logger.info("onnxruntime not installed; skipping ONNX export")
+
+    # Written last, so an interrupted export is never taken as current.
+    import json
+
+    with open(_optimized_path(model_dir, EXPORT_SOURCE_FILE), "w", encoding="utf-8") as f:
+        json.dump(_source_fingerprint(model_dir), f)
+    return artifacts
+
+
+class _TorchRunner:
+    def __init__(self, tokenizer, model):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.id2label = model.config.id2label
+
+    def predict_proba(self, texts):
+        import torch
+
+        inputs = self.tokenizer(list(texts), return_tensors="pt", truncation=True, padding=True)
+        with torch.inference_mode():
+            logits = self.model(**inputs).logits
+        return torch.nn.functional.softmax(logits, dim=-1).cpu().numpy()
+
+
+class _OnnxRunner:
+    def __init__(self, tokenizer, path, id2label):
+        import onnxruntime as ort
+
+        self.tokenizer = tokenizer
+        self.session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.id2label = id2label
+
+    def predict_proba(self, texts):
+        import numpy as np
+
+        inputs = self.tokenizer(list(texts), return_tensors="np", truncation=True, padding=True)
+        feed = {name: inputs[name].astype(np.int64) for name in self.input_names}
+        logits = self.session.run(["logits"], feed)[0]
+        logits = logits - logits.max(axis=-1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=-1, keepdims=True)
+
+
+def _build_runner(model_dir: str, backend: str):
+    from transformers import AutoConfig, AutoTokenizer, AutoModelForSequenceClassification
+
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    if backend == "fp32":
+        model = AutoModelForSequenceClassification.from_pretrained(model_dir)
+        model.eval()
+        return _TorchRunner(tokenizer, model)
+
+    if backend in ("onnx-int8", "torch-int8") and not export_is_current(model_dir):
+        raise ValueError(f"{backend} export in {model_dir} is missing or older than the weights; re-run --export_optimized")
+    config = AutoConfig.from_pretrained(model_dir)
+    if backend == "onnx-int8":
+        return _OnnxRunner(tokenizer, _optimized_path(model_dir, ONNX_INT8_FILE), config.id2label)
+    if backend == "torch-int8":
+        import torch
+
+        model = AutoModelForSequenceClassification.from_config(config)
+        model.eval()
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        model.load_state_dict(torch.load(_optimized_path(model_dir, TORCH_INT8_FILE), map_location="cpu"))
+        return _TorchRunner(tokenizer, model)
+    raise ValueError(f"Unknown backend '{backend}'; expected one of {FINETUNED_BACKENDS}")
+
+
+@lru_cache(maxsize=8)
+def _weights_digest(model_dir: str, fingerprint: str) -> str:
+    """SHA-256 of config.json and the fp32 weights.
+
+    ``fingerprint`` (their sizes and mtimes) is only the cache key, so the
+    weights are read once per save rather than on every prediction.
+    """
+    import hashlib
+    import json
+
+    digest = hashlib.sha256()
+    for name in sorted(json.loads(fingerprint)):
+        digest.update(name.encode("utf-8") + b"\0")
+        with open(os.path.join(model_dir, name), "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def _finetuned_version(model_dir: str, backend: str) -> str:
+    """Identify a saved model by path, weights hash and backend so retraining busts caches."""
+    import json
+
+    fingerprint = json.dumps(_source_fingerprint(model_dir), sort_keys=True)
+    return f"{os.path.abspath(model_dir)}@{_weights_digest(model_dir, fingerprint)}:{backend}"
+
+
+def load_finetuned(model_dir: str = DEFAULT_FINETUNED_DIR, backend: str | None = None):
+    """Return (runner, version) for a fine-tuned model, loading it once.
+
+    ``backend`` (or ``ML_FINETUNED_BACKEND``) selects ``onnx-int8``,
+    ``torch-int8`` or ``fp32``; the default ``auto`` prefers the fastest
+    exported artifact that was made from the current weights.
+    """
+    if not os.path.isdir(model_dir):
+        raise FileNotFoundError(f"Fine-tuned model directory not found: {model_dir}. Run with --train first.")
+    backend = backend or os.getenv("ML_FINETUNED_BACKEND", "auto")
+    if backend == "auto":
+        backend = available_backends(model_dir)[0]
+    version = _finetuned_version(model_dir, backend)
+    with _finetuned_lock:
+        cached = _finetuned.get(model_dir)
+        if cached is not None and cached[1] == version:
+            return cached
+        started = time.perf_counter()
+        cached = (_build_runner(model_dir, backend), version)
+        _finetuned[model_dir] = cached
+        logger.info("Loaded fine-tuned model %s (%s) in %.2fs", model_dir, backend, time.perf_counter() - started)
+        return cached
+
+
+def predict_finetuned(text, model_dir: str = DEFAULT_FINETUNED_DIR, backend: str | None = None):
+    """Score ``text`` with the fine-tuned sequence classifier.
+
+    Returns:
+        list[tuple[str, float]]: (label, softmax score) sorted by score descending.
+    """
+    runner, version = load_finetuned(model_dir, backend)
+    id2label = runner.id2label
+
+    cache = get_result_cache()
+    key = make_key(text, f"finetuned:{version}", list(id2label.values()), False) if cache is not None else None
+    cached = _cached_ranking(cache, key)
+    if cached is not None:
+        return cached
+
+    with _finetuned_lock:
+        scores = runner.predict_proba([text])[0]
+
+    ranked = sorted([(id2label[i], float(s)) for i, s in enumerate(scores)], key=lambda x: x[1], reverse=True)
+    if cache is not None:
+        cache.put(key, ranked)
+    return ranked
+
+
+def _artifact_size(model_dir: str, backend: str) -> int:
+    if backend == "onnx-int8":
+        return os.path.getsize(_optimized_path(model_dir, ONNX_INT8_FILE))
+    if backend == "torch-int8":
+        return os.path.getsize(_optimized_path(model_dir, TORCH_INT8_FILE))
+    return sum(os.path.getsize(os.path.join(model_dir, n)) for n in WEIGHT_FILES if os.path.exists(os.path.join(model_dir, n)))
+
+
+def benchmark_finetuned(
+    model_dir: str,
+    dataset: str,
+    text_column: str,
+    label_column: str,
+    seed: int = 42,
+    batch_size: int = 16,
+    latency_samples: int = 50,
+) -> dict:
+    """Compare every available backend against fp32 on the validation split.
+
+    Reports single-text latency (p50/p95), batched throughput, artifact size,
+    accuracy / macro-F1 and their drift from fp32, plus how often the
+    backend's top label agrees with fp32. Results are also written to
+    ``<model_dir>/optimized/benchmark.json``.
+    """
+    import json
+
+    import numpy as np
+    from sklearn.metrics import accuracy_score, f1_score
+
+    _train_df, val_df, _id2label, _label2id = load_labeled_splits(dataset, text_column, label_column, seed)
+    texts = val_df["text"].astype(str).tolist()
+
+    report = {"model_dir": model_dir, "validation_rows": len(texts), "backends": {}}
+    reference_preds = None
+    for backend in ["fp32"] + [b for b in available_backends(model_dir) if b != "fp32"]:
+        runner = _build_runner(model_dir, backend)
+        label2id = {label: int(i) for i, label in runner.id2label.items()}
+        y_true = val_df["label"].astype(str).map(label2id).to_numpy()
+
+        runner.predict_proba(texts[:1])  # warmup
+        latencies = []
+        for text in texts[:latency_samples]:
+            started = time.perf_counter()
+            runner.predict_proba([text])
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        probs = np.concatenate([runner.predict_proba(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)])
+        elapsed = time.perf_counter() - started
+        preds = probs.argmax(axis=-1)
+
+        result = {
+            "latency_ms_p50": float(np.percentile(latencies, 50)),
+            "latency_ms_p95": float(np.percentile(latencies, 95)),
+            "throughput_per_s": len(texts) / elapsed,
+            "size_mb": _artifact_size(model_dir, backend) / (1024 * 1024),
+            "accuracy": float(accuracy_score(y_true, preds)),
+            "f1_macro": float(f1_score(y_true, preds, average="macro")),
+        }
+        if reference_preds is None:
+            reference_preds = preds
+            reference = result
+        else:
+            result["accuracy_drift"] = result["accuracy"] - reference["accuracy"]
+            result["f1_macro_drift"] = result["f1_macro"] - reference["f1_macro"]
+            result["agreement_with_fp32"] = float((preds == reference_preds).mean())
+        report["backends"][backend] = result
+
+    out_dir = os.path.join(model_dir, OPTIMIZED_SUBDIR)
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "benchmark.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    return report
 
 
 if __name__ == "__main__":
     import argparse
-    import os
-    from typing import List
+    import json
 
     def run_zero_shot_demo():
         examples = [
@@ -75,139 +1347,84 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Cybersecurity text classification utilities")
     parser.add_argument("--train", action="store_true", help="Fine-tune CySecBERT on the CSV dataset")
     parser.add_argument("--predict", type=str, default=None, help="Run prediction using a fine-tuned model on given text")
+    parser.add_argument("--classify-csv", action="store_true", help="Zero-shot classify every row of --dataset and write predictions to --output")
+    parser.add_argument("--output", type=str, default=os.path.join("data", "predictions.csv"), help="Predictions file for --classify-csv (.csv or .parquet)")
+    parser.add_argument("--chunk_size", type=int, default=1000, help="CSV rows read per chunk in --classify-csv")
+    parser.add_argument("--export-optimized", action="store_true", help="Write int8 (torch dynamic / ONNX Runtime) variants of the fine-tuned model")
+    parser.add_argument("--benchmark", action="store_true", help="Compare latency, throughput, size and accuracy of fine-tuned backends on the validation split")
+    parser.add_argument("--backend", type=str, default=None, choices=("auto",) + FINETUNED_BACKENDS, help="Fine-tuned backend for --predict (default: ML_FINETUNED_BACKEND or auto)")
     parser.add_argument("--dataset", type=str, default=os.path.join("data", "Cybersecurity_Dataset.csv"), help="Path to CSV dataset")
     parser.add_argument("--text_column", type=str, default="Cleaned Threat Description", help="Text column name in the CSV")
     parser.add_argument("--label_column", type=str, default="Threat Category", help="Label column name in the CSV")
-    parser.add_argument("--model_out", type=str, default=os.path.join("models", "cysecbert-threat-cls"), help="Directory to save/load fine-tuned model")
+    parser.add_argument("--model_out", type=str, default=DEFAULT_FINETUNED_DIR, help="Directory to save/load fine-tuned model")
     parser.add_argument("--epochs", type=int, default=3, help="Number of training epochs")
     parser.add_argument("--batch_size", type=int, default=8, help="Per-device train/eval batch size")
     parser.add_argument("--lr", type=float, default=2e-5, help="Learning rate")
     parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument("--max_length", type=int, default=256, help="Truncate training texts to this many tokens")
+    parser.add_argument("--cache_dir", type=str, default=DEFAULT_TOKENIZED_CACHE, help="Where tokenized splits are cached")
+    parser.add_argument("--torch_threads", type=int, default=None, help="torch intra-op threads (default: TORCH_NUM_THREADS or torch's choice)")
+    parser.add_argument("--interop_threads", type=int, default=None, help="torch inter-op threads (default: TORCH_INTEROP_THREADS or torch's choice)")
+    parser.add_argument("--resume", action="store_true", help="Resume --train from the last checkpoint in <model_out>/trainer")
+    parser.add_argument("--patience", type=int, default=2, help="Stop after this many epochs without macro-F1 improvement")
+    parser.add_argument("--max_steps", type=int, default=-1, help="Stop training after this many steps (overrides --epochs)")
+    parser.add_argument("--legacy_pipeline", action="store_true", help="Train with the old uncached, ungrouped pipeline (for comparison)")
     args = parser.parse_args()
 
-    if not args.train and not args.predict:
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+
+    if not (args.train or args.predict or args.classify_csv or args.export_optimized or args.benchmark):
         run_zero_shot_demo()
         raise SystemExit(0)
 
-    if args.train:
-        import pandas as pd
-        import numpy as np
-        from sklearn.model_selection import train_test_split
-        from datasets import Dataset
-        # Metrics via scikit-learn to avoid optional dependency warnings
-        import torch
-        from transformers import (
-            AutoTokenizer,
-            AutoModelForSequenceClassification,
-            DataCollatorWithPadding,
-            Trainer,
-            TrainingArguments,
-            set_seed,
+    if args.classify_csv:
+        total = classify_csv(
+            args.dataset,
+            args.output,
+            args.text_column,
+            chunk_size=args.chunk_size,
+            batch_size=args.batch_size,
         )
+        print(f"Wrote {total} predictions to: {args.output}")
 
-        set_seed(args.seed)
-
-        os.makedirs(args.model_out, exist_ok=True)
-
-        df = pd.read_csv(args.dataset)
-        if args.text_column not in df.columns:
-            raise ValueError(f"Text column '{args.text_column}' not in CSV columns: {list(df.columns)}")
-        if args.label_column not in df.columns:
-            raise ValueError(f"Label column '{args.label_column}' not in CSV columns: {list(df.columns)}")
-
-        df = df[[args.text_column, args.label_column]].dropna()
-        df = df.rename(columns={args.text_column: "text", args.label_column: "label"})
-
-        # Build label set and mapping
-        unique_labels: List[str] = sorted(df["label"].astype(str).unique())
-        label2id = {label: i for i, label in enumerate(unique_labels)}
-        id2label = {i: label for label, i in label2id.items()}
-        df["label_id"] = df["label"].map(label2id)
-
-        train_df, val_df = train_test_split(df, test_size=0.2, random_state=args.seed, stratify=df["label_id"])
-        train_ds = Dataset.from_pandas(train_df[["text", "label_id"]])
-        val_ds = Dataset.from_pandas(val_df[["text", "label_id"]])
-
-        model_name = "markusbayer/CySecBERT"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
-        model = AutoModelForSequenceClassification.from_pretrained(
-            model_name,
-            num_labels=len(unique_labels),
-            id2label=id2label,
-            label2id=label2id,
-        )
-
-        def tokenize_fn(batch):
-            return tokenizer(batch["text"], truncation=True)
-
-        train_ds = train_ds.map(tokenize_fn, batched=True)
-        val_ds = val_ds.map(tokenize_fn, batched=True)
-        data_collator = DataCollatorWithPadding(tokenizer=tokenizer)
-
-        from sklearn.metrics import accuracy_score, f1_score
-
-        def compute_metrics(eval_pred):
-            logits, labels = eval_pred
-            preds = np.argmax(logits, axis=-1)
-            return {
-                "accuracy": float(accuracy_score(labels, preds)),
-                "f1_macro": float(f1_score(labels, preds, average="macro")),
-            }
-
-        training_args = TrainingArguments(
-            output_dir=os.path.join(args.model_out, "trainer"),
-            num_train_epochs=args.epochs,
-            per_device_train_batch_size=args.batch_size,
-            per_device_eval_batch_size=args.batch_size,
-            learning_rate=args.lr,
-            evaluation_strategy="epoch",
-            save_strategy="epoch",
-            load_best_model_at_end=True,
-            metric_for_best_model="f1_macro",
-            logging_steps=50,
-            report_to=[],
+    if args.train:
+        report = train_finetuned(
+            args.dataset,
+            args.text_column,
+            args.label_column,
+            model_out=args.model_out,
+            epochs=args.epochs,
+            batch_size=args.batch_size,
+            lr=args.lr,
             seed=args.seed,
+            max_length=args.max_length,
+            cache_dir=args.cache_dir,
+            torch_threads=args.torch_threads,
+            interop_threads=args.interop_threads,
+            resume=args.resume,
+            patience=args.patience,
+            max_steps=args.max_steps,
+            legacy=args.legacy_pipeline,
         )
-
-        trainer = Trainer(
-            model=model,
-            args=training_args,
-            train_dataset=train_ds,
-            eval_dataset=val_ds,
-            tokenizer=tokenizer,
-            data_collator=data_collator,
-            compute_metrics=compute_metrics,
-        )
-
-        trainer.train()
-
-        model.save_pretrained(args.model_out)
-        tokenizer.save_pretrained(args.model_out)
-
-        # Save label maps for later inference
-        with open(os.path.join(args.model_out, "labels.txt"), "w", encoding="utf-8") as f:
-            for idx in range(len(id2label)):
-                f.write(f"{idx}\t{id2label[idx]}\n")
-
+        print(json.dumps(report, indent=2))
         print(f"Model fine-tuned and saved to: {args.model_out}")
 
-    if args.predict is not None:
-        from transformers import AutoTokenizer, AutoModelForSequenceClassification
-        import torch
-        import numpy as np
-
-        if not os.path.isdir(args.model_out):
-            raise FileNotFoundError(f"Fine-tuned model directory not found: {args.model_out}. Run with --train first.")
+    if args.export_optimized:
+        for backend_name, path in export_optimized(args.model_out).items():
+            print(f"{backend_name:<12} {path}")
 
-        tokenizer = AutoTokenizer.from_pretrained(args.model_out)
-        model = AutoModelForSequenceClassification.from_pretrained(args.model_out)
-        id2label = model.config.id2label
-
-        inputs = tokenizer(args.predict, return_tensors="pt", truncation=True)
-        with torch.no_grad():
-            outputs = model(**inputs)
-            scores = torch.nn.functional.softmax(outputs.logits, dim=-1)[0].cpu().numpy()
+    if args.benchmark:
+        bench = benchmark_finetuned(
+            args.model_out,
+            args.dataset,
+            args.text_column,
+            args.label_column,
+            seed=args.seed,
+            batch_size=args.batch_size,
+        )
+        print(json.dumps(bench, indent=2))
 
-        pred_ranked = sorted([(id2label[i], float(s)) for i, s in enumerate(scores)], key=lambda x: x[1], reverse=True)
+    if args.predict is not None:
+        pred_ranked = predict_finetuned(args.predict, args.model_out, args.backend)
         for lbl, sc in pred_ranked:
-            print(f"{lbl:<20} {sc:6.2%}")
\ No newline at end of file
+            print(f"{lbl:<20} {sc:6.2%}")
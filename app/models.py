@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Integer, String, DateTime, ForeignKey
+from sqlalchemy import BigInteger, Float, Index, Integer, LargeBinary, SmallInteger, String, Text, DateTime, ForeignKey, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.orm import Mapped, mapped_column
 
@@ -9,11 +9,20 @@ from .db import Base
 
 class Incident(Base):
     __tablename__ = "incidents"
+    # Keyset pagination walks (created_at, id) newest first, optionally
+    # within one filter value; each composite index serves one such scan.
+    __table_args__ = (
+        Index("ix_incidents_created_at_id", "created_at", "id"),
+        Index("ix_incidents_risk_label_created_at_id", "risk_label", "created_at", "id"),
+        Index("ix_incidents_evidence_type_created_at_id", "evidence_type", "created_at", "id"),
+        Index("ix_incidents_reporter_id_created_at_id", "reporter_id", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     reporter_id: Mapped[str] = mapped_column(String(64), index=True)
     evidence_type: Mapped[str] = mapped_column(String(32))
     risk_label: Mapped[str] = mapped_column(String(16), index=True)
+    description: Mapped[str] = mapped_column(Text, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 
@@ -21,15 +30,163 @@ class Evidence(Base):
     __tablename__ = "evidence"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
-    incident_id: Mapped[int] = mapped_column(ForeignKey("incidents.id"))
+    incident_id: Mapped[int] = mapped_column(ForeignKey("incidents.id"), index=True)
     filename: Mapped[str] = mapped_column(String(256))
-    sha256: Mapped[str] = mapped_column(String(64))
+    sha256: Mapped[str] = mapped_column(String(64), index=True)
     storage_path: Mapped[str] = mapped_column(String(512))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     incident = relationship("Incident", backref="evidences")
 
 
+class EvidenceBlob(Base):
+    """One encrypted, content-addressed file shared by all evidence with that hash."""
+
+    __tablename__ = "evidence_blobs"
+
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    storage_path: Mapped[str] = mapped_column(String(512))
+    size_bytes: Mapped[int] = mapped_column(BigInteger)
+    ref_count: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    released_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+
+class IncidentRollup(Base):
+    """Pre-aggregated incident counts per time bucket and dimension value.
+
+    Maintained incrementally by app.aggregates; rebuild with
+    ``python -m app.aggregates rebuild``.
+    """
+
+    __tablename__ = "incident_rollups"
+
+    granularity: Mapped[str] = mapped_column(String(8), primary_key=True)
+    dimension: Mapped[str] = mapped_column(String(16), primary_key=True)
+    bucket_start: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    value: Mapped[str] = mapped_column(String(64), primary_key=True)
+    count: Mapped[int] = mapped_column(BigInteger, default=0)
+
+
+class WebhookOutbox(Base):
+    """CERT webhook events, written in the same transaction as the change
+    that caused them and delivered later by app.outbox.OutboxDispatcher."""
+
+    __tablename__ = "webhook_outbox"
+    __table_args__ = (Index("ix_webhook_outbox_status_next_attempt_at", "status", "next_attempt_at"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    event_type: Mapped[str] = mapped_column(String(32))
+    payload: Mapped[str] = mapped_column(Text)
+    status: Mapped[str] = mapped_column(String(16), default="pending")
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    last_status: Mapped[int] = mapped_column(Integer, nullable=True)
+    last_error: Mapped[str] = mapped_column(String(512), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    sent_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+
+class ClassificationJob(Base):
+    """Background risk classification of an incident, claimed by
+    app.jobs workers with SKIP LOCKED. Lower ``priority`` runs first; a
+    claimed job is invisible until ``available_at`` (its lease) passes."""
+
+    __tablename__ = "classification_jobs"
+    __table_args__ = (
+        Index("ix_classification_jobs_claim", "status", "priority", "available_at", "id"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    incident_id: Mapped[int] = mapped_column(ForeignKey("incidents.id"), index=True)
+    priority: Mapped[int] = mapped_column(Integer, default=0)
+    status: Mapped[str] = mapped_column(String(16), default="pending")
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    available_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    worker: Mapped[str] = mapped_column(String(64), nullable=True)
+    result_label: Mapped[str] = mapped_column(String(32), nullable=True)
+    result_score: Mapped[float] = mapped_column(Float, nullable=True)
+    # Set when the result was copied from a near-duplicate incident.
+    reused_from: Mapped[int] = mapped_column(Integer, nullable=True)
+    last_error: Mapped[str] = mapped_column(String(512), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+
+class Indicator(Base):
+    """An indicator of compromise found in an evidence file, stored in the
+    normalized form produced by app.iocs. The (value, kind, incident_id) index
+    serves "which incidents mention X" lookups without touching incidents."""
+
+    __tablename__ = "indicators"
+    __table_args__ = (
+        UniqueConstraint("evidence_id", "kind", "value", name="uq_indicators_evidence_kind_value"),
+        Index("ix_indicators_value_kind_incident_id", "value", "kind", "incident_id"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(16))
+    value: Mapped[str] = mapped_column(String(512))
+    incident_id: Mapped[int] = mapped_column(ForeignKey("incidents.id"), index=True)
+    evidence_id: Mapped[int] = mapped_column(ForeignKey("evidence.id"))
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class IncidentSignature(Base):
+    """MinHash signature of an incident's text (app.similarity) and the
+    near-duplicate cluster it was assigned to when indexed."""
+
+    __tablename__ = "incident_signatures"
+
+    incident_id: Mapped[int] = mapped_column(ForeignKey("incidents.id"), primary_key=True)
+    cluster_id: Mapped[int] = mapped_column(Integer, index=True)
+    signature: Mapped[bytes] = mapped_column(LargeBinary)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class LshBucket(Base):
+    """LSH band table: incidents whose signatures agree on a whole band
+    share a (band, bucket) row key and are candidate near-duplicates."""
+
+    __tablename__ = "lsh_buckets"
+
+    band: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    bucket: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    incident_id: Mapped[int] = mapped_column(ForeignKey("incidents.id"), primary_key=True)
+
+
+class CertAcknowledgement(Base):
+    """One row per event accepted by /cert/ingest. ``signature`` is the
+    request's HMAC digest and ``seq`` the event's line in an NDJSON batch;
+    the pair is unique, so a replayed request is rejected across workers."""
+
+    __tablename__ = "cert_acks"
+    __table_args__ = (UniqueConstraint("signature", "seq", name="uq_cert_acks_signature_seq"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    signature: Mapped[str] = mapped_column(String(64))
+    seq: Mapped[int] = mapped_column(Integer, default=0)
+    incident_id: Mapped[int] = mapped_column(Integer, nullable=True, index=True)
+    risk_label: Mapped[str] = mapped_column(String(32), nullable=True)
+    payload: Mapped[str] = mapped_column(Text)
+    received_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class RefreshToken(Base):
+    """A login session. Only the SHA-256 of the refresh token is stored; the
+    row id is the ``sid`` claim in access tokens issued for the session."""
+
+    __tablename__ = "refresh_tokens"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
+    token_hash: Mapped[str] = mapped_column(String(64), unique=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    expires_at: Mapped[datetime] = mapped_column(DateTime)
+    revoked_at: Mapped[datetime] = mapped_column(DateTime, nullable=True, index=True)
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -0,0 +1,186 @@
+import asyncio
+import json
+import logging
+import os
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import AsyncSessionLocal
+from .models import WebhookOutbox
+from .webhooks import close_http_client, post_cert_batch, post_cert_webhook
+
+logger = logging.getLogger(__name__)
+
+# Delivery tuning; see OutboxDispatcher.
+WEBHOOK_CONCURRENCY = int(os.getenv("WEBHOOK_CONCURRENCY", "4"))
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "1"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "10"))
+WEBHOOK_RETRY_BASE_SECONDS = float(os.getenv("WEBHOOK_RETRY_BASE_SECONDS", "2"))
+WEBHOOK_RETRY_MAX_SECONDS = float(os.getenv("WEBHOOK_RETRY_MAX_SECONDS", "600"))
+WEBHOOK_POLL_SECONDS = float(os.getenv("WEBHOOK_POLL_SECONDS", "2"))
+# How long a claimed event stays invisible to other dispatchers; a worker
+# that dies mid-delivery has its events retried after this.
+WEBHOOK_LEASE_SECONDS = float(os.getenv("WEBHOOK_LEASE_SECONDS", "60"))
+
+
+async def enqueue(db: AsyncSession, payload: dict, event_type: str = "incident.red") -> int:
+    """Add an event to the outbox in the caller's transaction and return its id."""
+    return (
+        await db.execute(
+            insert(WebhookOutbox)
+            .values(
+                event_type=event_type,
+                payload=json.dumps(payload, separators=(",", ":")),
+                status="pending",
+                attempts=0,
+                next_attempt_at=datetime.utcnow(),
+                created_at=datetime.utcnow(),
+            )
+            .returning(WebhookOutbox.id)
+        )
+    ).scalar_one()
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with +/-20% jitter, capped at WEBHOOK_RETRY_MAX_SECONDS."""
+    delay = min(WEBHOOK_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0)), WEBHOOK_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+class OutboxDispatcher:
+    """Background task that delivers pending outbox events.
+
+    Due events are claimed with ``FOR UPDATE SKIP LOCKED`` and leased by
+    pushing ``next_attempt_at`` forward, so several workers can run a
+    dispatcher safely. Events are POSTed through the shared keep-alive
+    client with at most ``concurrency`` requests in flight, optionally
+    ``batch_size`` events per signed NDJSON request. Failures are retried
+    with exponential backoff until ``max_attempts``, then marked failed.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = WEBHOOK_CONCURRENCY,
+        batch_size: int = WEBHOOK_BATCH_SIZE,
+        max_attempts: int = WEBHOOK_MAX_ATTEMPTS,
+        poll_seconds: float = WEBHOOK_POLL_SECONDS,
+    ):
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.max_attempts = max(1, max_attempts)
+        self.poll_seconds = poll_seconds
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._slots = asyncio.Semaphore(self.concurrency)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="webhook-outbox")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await close_http_client()
+
+    def notify(self) -> None:
+        """Wake the dispatcher now instead of at the next poll."""
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                delivered = await self.dispatch_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Webhook outbox dispatch failed")
+                delivered = 0
+            if delivered:
+                continue  # there may be more due events
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def dispatch_once(self) -> int:
+        """Claim and deliver one round of due events; returns how many were claimed."""
+        events = await self._claim(self.concurrency * self.batch_size)
+        if not events:
+            return 0
+        batches = [events[i:i + self.batch_size] for i in range(0, len(events), self.batch_size)]
+        await asyncio.gather(*(self._deliver(batch) for batch in batches))
+        return len(events)
+
+    async def _claim(self, limit: int) -> list[tuple[int, int, dict]]:
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            rows = (
+                await db.execute(
+                    select(WebhookOutbox.id, WebhookOutbox.attempts, WebhookOutbox.payload)
+                    .where(WebhookOutbox.status == "pending", WebhookOutbox.next_attempt_at <= now)
+                    .order_by(WebhookOutbox.next_attempt_at, WebhookOutbox.id)
+                    .limit(limit)
+                    .with_for_update(skip_locked=True)
+                )
+            ).all()
+            if not rows:
+                return []
+            await db.execute(
+                update(WebhookOutbox)
+                .where(WebhookOutbox.id.in_([r.id for r in rows]))
+                .values(next_attempt_at=now + timedelta(seconds=WEBHOOK_LEASE_SECONDS))
+            )
+            await db.commit()
+        return [(r.id, r.attempts, json.loads(r.payload)) for r in rows]
+
+    async def _deliver(self, batch: list[tuple[int, int, dict]]) -> None:
+        status, error = None, None
+        async with self._slots:
+            try:
+                if len(batch) == 1:
+                    status, _body = await post_cert_webhook(batch[0][2])
+                else:
+                    status, _body = await post_cert_batch([payload for _id, _attempts, payload in batch])
+            except Exception as exc:  # network errors are retried like HTTP errors
+                error = f"{type(exc).__name__}: {exc}"[:512]
+
+        now = datetime.utcnow()
+        ok = status is not None and 200 <= status < 300
+        async with AsyncSessionLocal() as db:
+            for event_id, attempts, _payload in batch:
+                attempts += 1
+                if ok:
+                    values = {"status": "sent", "sent_at": now}
+                elif attempts >= self.max_attempts:
+                    values = {"status": "failed"}
+                else:
+                    values = {"next_attempt_at": now + timedelta(seconds=retry_delay(attempts))}
+                values.update(attempts=attempts, last_status=status, last_error=error)
+                await db.execute(update(WebhookOutbox).where(WebhookOutbox.id == event_id).values(**values))
+            await db.commit()
+        if not ok:
+            logger.warning("CERT webhook delivery failed for %s (status=%s, error=%s)", [e[0] for e in batch], status, error)
+
+
+_dispatcher: OutboxDispatcher | None = None
+
+
+def get_dispatcher() -> OutboxDispatcher:
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = OutboxDispatcher()
+    return _dispatcher
+
+
+def notify() -> None:
+    if _dispatcher is not None:
+        _dispatcher.notify()
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# bcrypt cost; raising it makes existing hashes "deprecated" and they are
+# re-hashed at the new cost on the user's next successful login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Processes doing bcrypt, and how many hash/verify calls may be queued or
+# running at once before new ones are rejected with 429.
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(min(2, os.cpu_count() or 1))))
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", str(PASSWORD_WORKERS * 8)))
+
+
+class PasswordPoolFull(Exception):
+    """Raised when PASSWORD_QUEUE_LIMIT hash/verify calls are already pending."""
+
+
+@lru_cache(maxsize=1)
+def _context():
+    # Built lazily in each pool process; the API process never needs it.
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+def hash_password_sync(password: str) -> str:
+    return _context().hash(password)
+
+
+def verify_and_update_sync(password: str, hashed: str | None) -> tuple[bool, str | None]:
+    """(matches, new_hash); new_hash is set when ``hashed`` uses outdated parameters.
+
+    With no stored hash a dummy verify still runs so unknown accounts take
+    as long to reject as wrong passwords.
+    """
+    if not hashed:
+        _context().dummy_verify()
+        return False, None
+    try:
+        return _context().verify_and_update(password, hashed)
+    except ValueError:  # unrecognised or corrupt hash
+        return False, None
+
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+_pending = 0
+
+
+def get_password_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: the API process has threads (upload pool, ML batcher)
+                # that must not be forked mid-operation.
+                _pool = ProcessPoolExecutor(
+                    max_workers=max(1, PASSWORD_WORKERS),
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _pool
+
+
+def shutdown_password_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def pool_stats() -> dict:
+    return {"workers": PASSWORD_WORKERS, "pending": _pending, "queue_limit": PASSWORD_QUEUE_LIMIT}
+
+
+async def _run(fn, *args):
+    global _pending
+    # Reject up front rather than queueing: a credential-stuffing burst
+    # gets fast 429s instead of an ever-growing backlog of bcrypt work.
+    if _pending >= PASSWORD_QUEUE_LIMIT:
+        raise PasswordPoolFull()
+    _pending += 1
+    try:
+        return await asyncio.wrap_future(get_password_pool().submit(fn, *args))
+    finally:
+        _pending -= 1
+
+
+async def hash_password(password: str) -> str:
+    return await _run(hash_password_sync, password)
+
+
+async def verify_and_update(password: str, hashed: str | None) -> tuple[bool, str | None]:
+    return await _run(verify_and_update_sync, password, hashed)
+
+
+class AttemptLimiter:
+    """Fixed-window attempt counter per key, holding at most ``max_keys`` keys.
+
+    The least recently touched keys are dropped when full, so memory stays
+    bounded no matter how many accounts or addresses are tried.
+    """
+
+    def __init__(self, max_attempts: int, window_seconds: float, max_keys: int = 100_000):
+        self.max_attempts = max_attempts
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+        self._windows: OrderedDict[str, tuple[float, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _current(self, key: str, now: float) -> tuple[float, int]:
+        started, count = self._windows.get(key, (now, 0))
+        if now - started >= self.window_seconds:
+            return now, 0
+        return started, count
+
+    def retry_after(self, key: str, now: float | None = None) -> float:
+        """Seconds until ``key`` may try again; 0 if it is not limited."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            started, count = self._current(key, now)
+            if count < self.max_attempts:
+                return 0.0
+            return max(0.0, started + self.window_seconds - now)
+
+    def hit(self, key: str, now: float | None = None) -> None:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            started, count = self._current(key, now)
+            self._windows[key] = (started, count + 1)
+            self._windows.move_to_end(key)
+            while len(self._windows) > self.max_keys:
+                self._windows.popitem(last=False)
+
+    def reset(self, key: str) -> None:
+        with self._lock:
+            self._windows.pop(key, None)
+
+
+# Every login attempt counts against the client address; only failures
+# count against the account, and a successful login clears them.
+ip_limiter = AttemptLimiter(
+    max_attempts=int(os.getenv("LOGIN_IP_MAX_ATTEMPTS", "30")),
+    window_seconds=float(os.getenv("LOGIN_IP_WINDOW_SECONDS", "60")),
+    max_keys=int(os.getenv("LOGIN_LIMITER_MAX_KEYS", "100000")),
+)
+account_limiter = AttemptLimiter(
+    max_attempts=int(os.getenv("LOGIN_ACCOUNT_MAX_FAILURES", "5")),
+    window_seconds=float(os.getenv("LOGIN_ACCOUNT_WINDOW_SECONDS", "900")),
+    max_keys=int(os.getenv("LOGIN_LIMITER_MAX_KEYS", "100000")),
+)
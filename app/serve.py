@@ -0,0 +1,128 @@
+"""Production server: a gunicorn master pre-forking uvicorn workers.
+
+The master imports the app and loads the zero-shot model before forking,
+so every worker shares the same read-only weight pages copy-on-write
+instead of holding its own copy. Each worker then runs its warmup
+inference (see ``main.preload_classifier``) and limits torch to its share
+of the cores.
+
+    python -m app.serve --workers 4 --bind 0.0.0.0:8000
+"""
+import gc
+import logging
+import os
+import sys
+
+from gunicorn.app.base import BaseApplication
+
+logger = logging.getLogger("gunicorn.error")
+
+
+def available_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not Linux
+        return os.cpu_count() or 1
+
+
+def default_workers() -> int:
+    return int(os.getenv("WEB_CONCURRENCY", "0")) or available_cpus()
+
+
+def torch_threads_per_worker(workers: int) -> int:
+    """Intra-op threads for each worker; TORCH_NUM_THREADS overrides the even split."""
+    return int(os.getenv("TORCH_NUM_THREADS", "0")) or max(1, available_cpus() // max(1, workers))
+
+
+def preload_model() -> dict | None:
+    """Load the classifier in the master, without running inference.
+
+    Inference would start torch's thread pools, which do not survive
+    fork; each worker warms up after forking instead.
+    """
+    if os.getenv("ML_PRELOAD", "1").lower() in ("0", "false", "no"):
+        return None
+    from . import ml
+
+    try:
+        ml.get_classifier()
+    except Exception:
+        logger.exception("Zero-shot model preload in master failed; workers will load their own")
+        return None
+    return ml.classifier_stats()
+
+
+def post_fork(server, worker) -> None:
+    threads = torch_threads_per_worker(server.cfg.workers)
+    if "torch" in sys.modules:
+        from . import ml
+
+        ml.configure_torch_threads(threads, 1)
+    else:
+        # torch is imported lazily; these are read when it initializes.
+        os.environ.setdefault("OMP_NUM_THREADS", str(threads))
+        os.environ.setdefault("MKL_NUM_THREADS", str(threads))
+
+    # Connection pools must not be shared across processes.
+    from .db import async_engine, engine
+
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+    logger.info("Worker %d forked (torch threads %d)", worker.pid, threads)
+
+
+class Server(BaseApplication):
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self) -> None:
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from . import migrations
+        from .main import app
+
+        # Migrate once here rather than racing N workers through it; their
+        # startup then only checks the recorded version.
+        applied = migrations.upgrade()
+        if applied:
+            logger.info("Applied migrations: %s", ", ".join(applied))
+        stats = preload_model()
+        if stats:
+            logger.info("Master loaded classifier: %s", stats)
+        # Move everything loaded so far out of the collector's reach: a
+        # collection in a worker would otherwise write to every object
+        # header and un-share the pages they live on.
+        gc.collect()
+        gc.freeze()
+        return app
+
+
+def run(workers: int, bind: str, timeout: int = 120, max_requests: int = 0) -> None:
+    Server({
+        "bind": bind,
+        "workers": workers,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+        "post_fork": post_fork,
+        # Workers warm up off the event loop, so the default timeout only
+        # has to cover startup, not model loading.
+        "timeout": timeout,
+        "graceful_timeout": 30,
+        "max_requests": max_requests,
+        "max_requests_jitter": max_requests // 10,
+    }).run()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve the API with pre-forked workers")
+    parser.add_argument("--workers", type=int, default=default_workers(), help="Worker processes (default: WEB_CONCURRENCY or CPU count)")
+    parser.add_argument("--bind", default=os.getenv("BIND", "0.0.0.0:8000"))
+    parser.add_argument("--timeout", type=int, default=120, help="Seconds before a silent worker is restarted")
+    parser.add_argument("--max-requests", type=int, default=0, help="Recycle workers after this many requests (0: never)")
+    args = parser.parse_args()
+    run(args.workers, args.bind, args.timeout, args.max_requests)
@@ -0,0 +1,193 @@
+import hashlib
+import os
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .cache import normalize_text
+from .models import IncidentSignature, LshBucket
+
+# MinHash over character shingles, banded for LSH. NUM_PERM = BANDS * ROWS;
+# two texts share a bucket with probability 1 - (1 - s**ROWS)**BANDS for
+# Jaccard similarity s, i.e. ~50% at s = 0.7 and >99% at s = 0.85.
+# Changing any of these invalidates stored signatures (rebuild with
+# `python -m app.similarity reindex`).
+SHINGLE_SIZE = 5
+BANDS = 16
+ROWS = 8
+NUM_PERM = BANDS * ROWS
+MAX_CHARS = 8192
+_PRIME = np.uint64((1 << 31) - 1)
+_SEED = 20240917
+
+# Neighbours at or above this estimated Jaccard similarity join a cluster;
+# at or above the reuse threshold their classification is reused.
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.7"))
+SIMILARITY_REUSE_THRESHOLD = float(os.getenv("SIMILARITY_REUSE_THRESHOLD", "0.9"))
+# Candidates scored per query, most shared buckets first.
+MAX_CANDIDATES = int(os.getenv("SIMILARITY_MAX_CANDIDATES", "200"))
+
+# Fixed seed: every process must use the same permutations.
+_rng = np.random.default_rng(_SEED)
+_A = _rng.integers(1, int(_PRIME), size=NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, int(_PRIME), size=NUM_PERM, dtype=np.uint64)
+_SHINGLE_WEIGHTS = np.array([256 ** (SHINGLE_SIZE - 1 - j) for j in range(SHINGLE_SIZE)], dtype=np.uint64)
+
+
+def shingles(text: str) -> np.ndarray:
+    """Distinct hashed character shingles of the normalized text, as uint64 < 2**31."""
+    data = np.frombuffer(normalize_text(text).lower()[:MAX_CHARS].encode("utf-8"), dtype=np.uint8)
+    if data.size < SHINGLE_SIZE:
+        return np.empty(0, dtype=np.uint64)
+    windows = np.lib.stride_tricks.sliding_window_view(data, SHINGLE_SIZE).astype(np.uint64)
+    return np.unique((windows @ _SHINGLE_WEIGHTS) % _PRIME)
+
+
+def signature(text: str) -> np.ndarray | None:
+    """MinHash signature (NUM_PERM uint32), or None if the text is too short."""
+    x = shingles(text)
+    if x.size == 0:
+        return None
+    # (a * x + b) mod p for every permutation and shingle at once; a, x < 2**31
+    # so the product fits in uint64.
+    hashed = (_A[:, None] * x[None, :] + _B[:, None]) % _PRIME
+    return hashed.min(axis=1).astype(np.uint32)
+
+
+def band_keys(sig: np.ndarray) -> list[tuple[int, int]]:
+    """(band, bucket) pairs for the LSH tables; bucket is a signed 64-bit hash."""
+    rows = sig.astype("<u4").reshape(BANDS, ROWS)
+    return [
+        (band, int.from_bytes(hashlib.blake2b(rows[band].tobytes(), digest_size=8).digest(), "little", signed=True))
+        for band in range(BANDS)
+    ]
+
+
+def to_bytes(sig: np.ndarray) -> bytes:
+    return sig.astype("<u4").tobytes()
+
+
+def from_bytes(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype="<u4")
+
+
+def estimate(sig: np.ndarray, others: np.ndarray) -> np.ndarray:
+    """Estimated Jaccard similarity of ``sig`` to each row of ``others``."""
+    return (others == sig[None, :]).mean(axis=1)
+
+
+async def neighbours(
+    db: AsyncSession,
+    sig: np.ndarray,
+    threshold: float = SIMILARITY_THRESHOLD,
+    limit: int = 20,
+    exclude: int | None = None,
+) -> list[tuple[int, int, float]]:
+    """Indexed incidents similar to ``sig`` as (incident_id, cluster_id, similarity), best first."""
+    hits = Counter(
+        (
+            await db.execute(
+                select(LshBucket.incident_id).where(
+                    # One index probe per band (a row-value IN is not index-assisted everywhere).
+                    or_(*(and_(LshBucket.band == band, LshBucket.bucket == bucket) for band, bucket in band_keys(sig)))
+                )
+            )
+        ).scalars()
+    )
+    hits.pop(exclude, None)
+    if not hits:
+        return []
+    candidates = [incident_id for incident_id, _ in hits.most_common(MAX_CANDIDATES)]
+    rows = (
+        await db.execute(
+            select(IncidentSignature.incident_id, IncidentSignature.cluster_id, IncidentSignature.signature)
+            .where(IncidentSignature.incident_id.in_(candidates))
+        )
+    ).all()
+    if not rows:
+        return []
+    scores = estimate(sig, np.stack([from_bytes(r.signature) for r in rows]))
+    ranked = sorted(
+        ((r.incident_id, r.cluster_id, float(score)) for r, score in zip(rows, scores) if score >= threshold),
+        key=lambda item: (-item[2], item[0]),
+    )
+    return ranked[:limit]
+
+
+async def index_incident(db: AsyncSession, incident_id: int, sig: np.ndarray) -> tuple[int, list[tuple[int, int, float]]]:
+    """Add an incident to the LSH tables in the caller's transaction.
+
+    It joins the cluster of its most similar indexed neighbour, or starts
+    its own. Returns (cluster_id, neighbours). Incidents indexed at the
+    same time by different workers may not see each other and can end up
+    in separate clusters.
+    """
+    existing = await db.get(IncidentSignature, incident_id)
+    if existing is not None:
+        return existing.cluster_id, await neighbours(db, sig, exclude=incident_id)
+    found = await neighbours(db, sig, exclude=incident_id)
+    cluster_id = found[0][1] if found else incident_id
+    db.add(IncidentSignature(
+        incident_id=incident_id, cluster_id=cluster_id, signature=to_bytes(sig), created_at=datetime.utcnow(),
+    ))
+    db.add_all(LshBucket(band=band, bucket=bucket, incident_id=incident_id) for band, bucket in band_keys(sig))
+    await db.flush()
+    return cluster_id, found
+
+
+async def cluster_size(db: AsyncSession, cluster_id: int) -> int:
+    return (
+        await db.execute(select(func.count()).where(IncidentSignature.cluster_id == cluster_id))
+    ).scalar_one()
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    import logging
+
+    from sqlalchemy import delete
+
+    from .db import AsyncSessionLocal
+    from .models import Incident
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    logger = logging.getLogger(__name__)
+
+    async def reindex(batch_size: int) -> int:
+        """Rebuild the LSH tables from every incident's description and evidence."""
+        from .jobs import incident_texts
+
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(LshBucket))
+            await db.execute(delete(IncidentSignature))
+            await db.commit()
+        indexed, after_id = 0, 0
+        while True:
+            async with AsyncSessionLocal() as db:
+                ids = (
+                    await db.execute(
+                        select(Incident.id).where(Incident.id > after_id).order_by(Incident.id).limit(batch_size)
+                    )
+                ).scalars().all()
+                if not ids:
+                    return indexed
+                texts = await incident_texts(ids)
+                for incident_id in ids:
+                    sig = signature(texts[incident_id]) if texts.get(incident_id) else None
+                    if sig is not None:
+                        await index_incident(db, incident_id, sig)
+                        indexed += 1
+                await db.commit()
+                after_id = ids[-1]
+                logger.info("Indexed %d incidents (through id %d)", indexed, after_id)
+
+    parser = argparse.ArgumentParser(description="Near-duplicate incident index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    reindex_parser = sub.add_parser("reindex", help="Rebuild signatures and LSH buckets for all incidents")
+    reindex_parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    print(f"Indexed {asyncio.run(reindex(args.batch_size))} incidents")
@@ -1,9 +1,50 @@
+import asyncio
 import hashlib
-from cryptography.fernet import Fernet
 import os
+import struct
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import BinaryIO, Callable, Iterator, Sequence
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import metrics
+from .db import dialect_insert
+from .models import Evidence, EvidenceBlob, Indicator
 
 UPLOAD_DIR = "secure_storage"
 
+# Content-addressed layout: blobs/ab/cd/<full sha256>.enc. Identical files
+# share one blob; evidence_blobs.ref_count tracks how many Evidence rows
+# point at it.
+BLOB_DIR = os.path.join(UPLOAD_DIR, "blobs")
+
+# Evidence is encrypted in fixed-size segments so files can be written and
+# read back in constant memory. Layout:
+#
+#   header  = MAGIC | segment_size (u32 BE) | nonce_prefix (8 random bytes)
+#   segment = AES-256-GCM(plaintext[i*size:(i+1)*size]) incl. 16-byte tag
+#
+# Segment i uses nonce = nonce_prefix | i (u32 BE) and authenticates the
+# header plus a "last segment" flag, so reordering, truncation and header
+# tampering all fail decryption. Legacy .enc files are single Fernet tokens.
+MAGIC = b"EVSEG\x01"
+_HEADER = struct.Struct(">6sI8s")
+HEADER_SIZE = _HEADER.size
+TAG_SIZE = 16
+SEGMENT_SIZE = int(os.getenv("EVIDENCE_SEGMENT_SIZE", str(64 * 1024)))
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Called with each plaintext chunk while an upload is staged.
+ChunkObserver = Callable[[bytes], None]
+
+
 def compute_sha256(file_bytes: bytes) -> str:
     sha256_hash = hashlib.sha256()
     sha256_hash.update(file_bytes)
@@ -12,30 +53,437 @@ def compute_sha256(file_bytes: bytes) -> str:
 # Generate a key once and store securely (e.g., in env variable)
 # #todo move to better technologies like HSM
 # For demonstration, we store it in a file but in production we will move to HSM
-if not os.path.exists("secret.key"):
-    with open("secret.key", "wb") as f:
-        f.write(Fernet.generate_key())
+KEY_PATH = "secret.key"
+
+
+@lru_cache(maxsize=1)
+def get_ciphers():
+    """(Fernet, AESGCM) for evidence files, built on first use.
+
+    Deferred so importing the app neither touches the key file nor loads
+    ``cryptography``.
+    """
+    from cryptography.fernet import Fernet
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+    if not os.path.exists(KEY_PATH):
+        with open(KEY_PATH, "wb") as f:
+            f.write(Fernet.generate_key())
+
+    # Load the saved key
+    with open(KEY_PATH, "rb") as f:
+        key = f.read()
 
-# Load the saved key
-with open("secret.key", "rb") as f:
-    key = f.read()
+    # Segment key derived from the same secret so there is still one key to manage.
+    segment_cipher = AESGCM(
+        HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b"evidence-segments-v1").derive(key)
+    )
+    return Fernet(key), segment_cipher
 
-cipher = Fernet(key)
 
 def encrypt_file(file_bytes: bytes) -> bytes:
-    return cipher.encrypt(file_bytes)
+    """Legacy whole-file Fernet encryption."""
+    return get_ciphers()[0].encrypt(file_bytes)
+
 
 def decrypt_file(encrypted_bytes: bytes) -> bytes:
-    return cipher.decrypt(encrypted_bytes)
+    """Legacy whole-file Fernet decryption."""
+    return get_ciphers()[0].decrypt(encrypted_bytes)
+
+
+def _segment_nonce(prefix: bytes, index: int) -> bytes:
+    return prefix + struct.pack(">I", index)
+
+
+def _segment_aad(header: bytes, last: bool) -> bytes:
+    return header + (b"\x01" if last else b"\x00")
+
+
+class SegmentEncryptor:
+    """Incrementally encrypt a byte stream into the segmented format.
+
+    Feed plaintext with :meth:`update` and call :meth:`finalize` once; the
+    SHA-256 and size of the plaintext are computed along the way. At most
+    one segment plus the latest chunk is buffered.
+    """
+
+    def __init__(self, out: BinaryIO, segment_size: int = SEGMENT_SIZE):
+        self.out = out
+        self.segment_size = segment_size
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self._prefix = os.urandom(8)
+        self._header = _HEADER.pack(MAGIC, segment_size, self._prefix)
+        self._buffer = bytearray()
+        self._index = 0
+        self._cipher = get_ciphers()[1]
+        out.write(self._header)
+
+    def update(self, data: bytes) -> None:
+        self.sha256.update(data)
+        self.size += len(data)
+        self._buffer += data
+        # Keep at least one byte back so the final segment is never empty
+        # unless the whole stream is.
+        while len(self._buffer) > self.segment_size:
+            self._emit(bytes(self._buffer[: self.segment_size]), last=False)
+            del self._buffer[: self.segment_size]
+
+    def finalize(self) -> str:
+        """Write the last segment and return the plaintext SHA-256 hex digest."""
+        self._emit(bytes(self._buffer), last=True)
+        self._buffer.clear()
+        return self.sha256.hexdigest()
+
+    def _emit(self, plaintext: bytes, last: bool) -> None:
+        nonce = _segment_nonce(self._prefix, self._index)
+        self.out.write(self._cipher.encrypt(nonce, plaintext, _segment_aad(self._header, last)))
+        self._index += 1
+
+
+class StagedBlob:
+    """An encrypted upload in a temporary file, waiting for its final name."""
+
+    def __init__(self, tmp_path: str, sha256: str, size: int):
+        self.tmp_path = tmp_path
+        self.sha256 = sha256
+        self.size = size
+
+    def discard(self) -> None:
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+# Hashing, encryption and file writes for async endpoints run here instead
+# of on the event loop. hashlib and OpenSSL release the GIL on large
+# buffers, so threads give real parallelism.
+_upload_pool: ThreadPoolExecutor | None = None
+_upload_pool_lock = threading.Lock()
+
+
+def get_upload_pool() -> ThreadPoolExecutor:
+    """Bounded pool for upload crypto/IO; size from UPLOAD_WORKERS (default min(4, CPUs))."""
+    global _upload_pool
+    if _upload_pool is None:
+        with _upload_pool_lock:
+            if _upload_pool is None:
+                workers = int(os.getenv("UPLOAD_WORKERS", str(min(4, os.cpu_count() or 1))))
+                _upload_pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="upload")
+    return _upload_pool
+
+
+async def run_in_upload_pool(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(get_upload_pool(), fn, *args)
+
+
+def blob_path(sha256: str) -> str:
+    return os.path.join(BLOB_DIR, sha256[:2], sha256[2:4], sha256 + ".enc")
+
+
+def _feed(encryptor: SegmentEncryptor, observers: Sequence[ChunkObserver], chunk: bytes) -> None:
+    started = time.perf_counter()
+    encryptor.update(chunk)
+    encrypted = time.perf_counter()
+    metrics.STORAGE_CRYPTO_SECONDS.inc(encrypted - started)
+    if observers:
+        for observe in observers:
+            observe(chunk)
+        metrics.STORAGE_OBSERVER_SECONDS.inc(time.perf_counter() - encrypted)
+
+
+def _record_staged(staged: "StagedBlob", started: float) -> None:
+    metrics.STORAGE_STAGE_LATENCY.observe(time.perf_counter() - started)
+    metrics.STORAGE_UPLOAD_SIZE.observe(staged.size)
+    metrics.STORAGE_UPLOAD_BYTES.inc(staged.size)
+
+
+def stage_encrypted_stream(
+    source: BinaryIO,
+    chunk_size: int = READ_CHUNK_SIZE,
+    observers: Sequence[ChunkObserver] = (),
+) -> StagedBlob:
+    """Hash and encrypt ``source`` into a temporary file in one streaming pass.
+
+    Each plaintext chunk is also passed to every callable in ``observers``
+    (e.g. ``IOCExtractor.feed``), so they see the upload without a second read.
+    """
+    started = time.perf_counter()
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            encryptor = SegmentEncryptor(out)
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+                _feed(encryptor, observers, chunk)
+            digest = encryptor.finalize()
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    staged = StagedBlob(tmp_path, digest, encryptor.size)
+    _record_staged(staged, started)
+    return staged
+
+
+async def stage_encrypted_upload(
+    upload,
+    chunk_size: int = READ_CHUNK_SIZE,
+    observers: Sequence[ChunkObserver] = (),
+) -> StagedBlob:
+    """Async :func:`stage_encrypted_stream` for objects with ``async read(n)``.
+
+    Reads happen on the event loop (Starlette offloads disk-backed
+    uploads itself); hashing, encryption and writes run in the upload pool.
+    """
+    started = time.perf_counter()
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_DIR, suffix=".part")
+    out = os.fdopen(fd, "wb")
+    try:
+        encryptor = await run_in_upload_pool(SegmentEncryptor, out)
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                break
+            await run_in_upload_pool(_feed, encryptor, observers, chunk)
+        digest = await run_in_upload_pool(encryptor.finalize)
+        await run_in_upload_pool(out.close)
+    except BaseException:
+        out.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    staged = StagedBlob(tmp_path, digest, encryptor.size)
+    _record_staged(staged, started)
+    return staged
+
+
+def _blob_upsert(db: Session | AsyncSession, staged: StagedBlob):
+    insert = dialect_insert(db)
+    stmt = insert(EvidenceBlob).values(
+        sha256=staged.sha256,
+        storage_path=blob_path(staged.sha256),
+        size_bytes=staged.size,
+        ref_count=1,
+        created_at=datetime.utcnow(),
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[EvidenceBlob.sha256],
+        set_={"ref_count": EvidenceBlob.ref_count + 1, "released_at": None},
+    )
+
+
+def _place_blob(staged: StagedBlob) -> str:
+    path = blob_path(staged.sha256)
+    if os.path.exists(path):
+        staged.discard()
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(staged.tmp_path, path)
+    return path
+
+
+def acquire_blob(db: Session, staged: StagedBlob) -> str:
+    """Reference ``staged`` from the current transaction and return its blob path.
+
+    Inserts the blob row or bumps its ref_count. The upsert locks the row
+    until commit, so collect_garbage() cannot delete the file concurrently;
+    the staged file is moved into place only if the blob is not already
+    on disk, otherwise it is discarded.
+    """
+    db.execute(_blob_upsert(db, staged))
+    return _place_blob(staged)
+
+
+async def acquire_blob_async(db: AsyncSession, staged: StagedBlob) -> str:
+    """Async-session variant of :func:`acquire_blob`."""
+    await db.execute(_blob_upsert(db, staged))
+    return await run_in_upload_pool(_place_blob, staged)
+
+
+def release_blob(db: Session, sha256: str) -> None:
+    """Drop one reference to a blob; the file is removed later by collect_garbage()."""
+    db.execute(
+        update(EvidenceBlob)
+        .where(EvidenceBlob.sha256 == sha256, EvidenceBlob.ref_count > 0)
+        .values(ref_count=EvidenceBlob.ref_count - 1, released_at=datetime.utcnow())
+    )
+
+
+def delete_evidence(db: Session, evidence: Evidence) -> None:
+    """Delete an Evidence row and release its blob in the caller's transaction."""
+    if evidence.storage_path == blob_path(evidence.sha256):
+        release_blob(db, evidence.sha256)
+    db.execute(delete(Indicator).where(Indicator.evidence_id == evidence.id))
+    db.delete(evidence)
+
+
+def collect_garbage(db: Session, grace_seconds: int = 3600) -> dict:
+    """Remove unreferenced blobs and abandoned temporary files.
+
+    Blobs are removed once their ref_count has been zero for
+    ``grace_seconds``. Each candidate row is locked (skipping rows busy in
+    another transaction) and re-checked before its file is deleted.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+    removed = 0
+    candidates = db.execute(
+        select(EvidenceBlob.sha256).where(EvidenceBlob.ref_count <= 0, EvidenceBlob.released_at < cutoff)
+    ).scalars().all()
+    db.rollback()
+    for sha256 in candidates:
+        blob = db.execute(
+            select(EvidenceBlob)
+            .where(EvidenceBlob.sha256 == sha256, EvidenceBlob.ref_count <= 0)
+            .with_for_update(skip_locked=True)
+        ).scalar_one_or_none()
+        if blob is None:
+            db.rollback()
+            continue
+        if os.path.exists(blob.storage_path):
+            os.remove(blob.storage_path)
+        db.delete(blob)
+        db.commit()
+        removed += 1
+
+    # Files left behind by crashed uploads or rolled-back transactions.
+    orphans = 0
+    cutoff_ts = time.time() - grace_seconds
+    for root, _dirs, files in os.walk(UPLOAD_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.getmtime(path) >= cutoff_ts:
+                continue
+            if name.endswith(".part"):
+                os.remove(path)
+                orphans += 1
+            elif root.startswith(BLOB_DIR) and name.endswith(".enc"):
+                if db.get(EvidenceBlob, name[: -len(".enc")]) is None:
+                    os.remove(path)
+                    orphans += 1
+    db.rollback()
+    return {"blobs_removed": removed, "orphan_files_removed": orphans}
+
 
 def save_encrypted_file(file_bytes: bytes, filename: str) -> str:
-    if not os.path.exists(UPLOAD_DIR):
-        os.makedirs(UPLOAD_DIR)
-    
-    encrypted_data = encrypt_file(file_bytes)
+    """Encrypt ``file_bytes`` to UPLOAD_DIR/<filename>.enc (not content-addressed)."""
+    import io
+
+    staged = stage_encrypted_stream(io.BytesIO(file_bytes))
     file_path = os.path.join(UPLOAD_DIR, filename + ".enc")
+    os.replace(staged.tmp_path, file_path)
+    return file_path
+
+
+def is_segmented(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def decrypt_stream(path: str) -> Iterator[bytes]:
+    """Yield the plaintext of an evidence file chunk by chunk.
+
+    Segmented files are decrypted one segment at a time and rejected if
+    truncated or modified. Legacy Fernet files are decrypted whole and
+    yielded as a single chunk.
+    """
+    with open(path, "rb") as f:
+        header = f.read(HEADER_SIZE)
+        if not header.startswith(MAGIC):
+            yield decrypt_file(header + f.read())
+            return
+
+        _magic, segment_size, prefix = _HEADER.unpack(header)
+        segment_cipher = get_ciphers()[1]
+        stored_size = segment_size + TAG_SIZE
+        index = 0
+        current = f.read(stored_size)
+        while True:
+            following = f.read(stored_size)
+            last = not following
+            nonce = _segment_nonce(prefix, index)
+            # InvalidTag here means tampering, truncation or a wrong key.
+            yield segment_cipher.decrypt(nonce, current, _segment_aad(header, last))
+            if last:
+                return
+            current = following
+            index += 1
+
+
+
+def _segment_count(file_size: int, segment_size: int) -> int:
+    stored_size = segment_size + TAG_SIZE
+    return max(1, -(-(file_size - HEADER_SIZE) // stored_size))
+
+
+def read_legacy(path: str) -> bytes | None:
+    """Decrypted content of a legacy Fernet file, or None for a segmented one.
+
+    Legacy files can only be decrypted whole; readers that need both the
+    size and the content should decrypt once here instead of calling
+    plaintext_size() and then decrypt_stream()/decrypt_range().
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) == MAGIC:
+            return None
+        f.seek(0)
+        return decrypt_file(f.read())
+
+
+def plaintext_size(path: str) -> int:
+    """Size of the decrypted content, computed from the file layout when possible.
+
+    Legacy Fernet files have to be decrypted to be measured; see read_legacy().
+    """
+    with open(path, "rb") as f:
+        header = f.read(HEADER_SIZE)
+        if not header.startswith(MAGIC):
+            return len(decrypt_file(header + f.read()))
+        _magic, segment_size, _prefix = _HEADER.unpack(header)
+        file_size = os.fstat(f.fileno()).st_size
+    return file_size - HEADER_SIZE - _segment_count(file_size, segment_size) * TAG_SIZE
+
+
+def decrypt_range(path: str, start: int, end: int) -> Iterator[bytes]:
+    """Yield plaintext bytes ``start``..``end`` (inclusive).
+
+    Segmented files seek straight to the segments that overlap the range
+    and decrypt only those; each is still authenticated. Legacy Fernet
+    files have to be decrypted whole and sliced.
+    """
+    with open(path, "rb") as f:
+        header = f.read(HEADER_SIZE)
+        if not header.startswith(MAGIC):
+            yield decrypt_file(header + f.read())[start : end + 1]
+            return
+
+        _magic, segment_size, prefix = _HEADER.unpack(header)
+        segment_cipher = get_ciphers()[1]
+        stored_size = segment_size + TAG_SIZE
+        last_index = _segment_count(os.fstat(f.fileno()).st_size, segment_size) - 1
+        first = start // segment_size
+        f.seek(HEADER_SIZE + first * stored_size)
+        for index in range(first, min(end // segment_size, last_index) + 1):
+            nonce = _segment_nonce(prefix, index)
+            plaintext = segment_cipher.decrypt(nonce, f.read(stored_size), _segment_aad(header, index == last_index))
+            offset = index * segment_size
+            yield plaintext[max(start - offset, 0) : end - offset + 1]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .db import SessionLocal
 
-    with open(file_path, "wb") as f:
-        f.write(encrypted_data)
+    parser = argparse.ArgumentParser(description="Evidence storage maintenance")
+    parser.add_argument("command", choices=["gc"], help="gc: delete unreferenced blobs and stale temp files")
+    parser.add_argument("--grace", type=int, default=3600, help="Seconds a blob must stay unreferenced before removal")
+    args = parser.parse_args()
 
-    return file_path
\ No newline at end of file
+    with SessionLocal() as session:
+        print(collect_garbage(session, grace_seconds=args.grace))
@@ -2,20 +2,51 @@ import hashlib
 import hmac
 import json
 import os
+import threading
 import time
-from typing import Tuple
+from collections import OrderedDict
+from functools import lru_cache
+from typing import TYPE_CHECKING, Iterable, Tuple
 
-import httpx
+from . import metrics
 
+if TYPE_CHECKING:
+    import httpx
 
+
+@lru_cache(maxsize=1)
+def get_cert_secrets() -> tuple[str, ...]:
+    """Active CERT signing secrets, resolved once per process.
+
+    ``CERT_WEBHOOK_SECRETS`` is a comma-separated list for key rotation:
+    the first entry signs outgoing webhooks and every entry is accepted
+    when verifying. Falls back to the single ``CERT_WEBHOOK_SECRET``.
+    """
+    configured = [s.strip() for s in os.getenv("CERT_WEBHOOK_SECRETS", "").split(",") if s.strip()]
+    return tuple(configured) or (os.getenv("CERT_WEBHOOK_SECRET", "dev_cert_secret"),)
+
+
+@lru_cache(maxsize=1)
 def get_cert_webhook_config() -> Tuple[str | None, str]:
-    url = os.getenv("CERT_WEBHOOK_URL")
-    secret = os.getenv("CERT_WEBHOOK_SECRET", "dev_cert_secret")
-    return url, secret
+    return os.getenv("CERT_WEBHOOK_URL"), get_cert_secrets()[0]
+
+
+def reload_cert_webhook_config() -> None:
+    """Re-read CERT_WEBHOOK_* from the environment, e.g. after rotating secrets."""
+    get_cert_secrets.cache_clear()
+    get_cert_webhook_config.cache_clear()
+    _mac_template.cache_clear()
+
+
+@lru_cache(maxsize=8)
+def _mac_template(secret: str):
+    # HMAC keyed once; copy() skips re-deriving the inner/outer pads per message.
+    return hmac.new(secret.encode("utf-8"), digestmod=hashlib.sha256)
 
 
 def _compute_signature(message: bytes, secret: str) -> str:
-    mac = hmac.new(secret.encode("utf-8"), msg=message, digestmod=hashlib.sha256)
+    mac = _mac_template(secret).copy()
+    mac.update(message)
     return mac.hexdigest()
 
 
@@ -26,37 +57,154 @@ def build_signature_headers(payload_bytes: bytes, secret: str, timestamp: int |
     return {"X-CERT-Signature": f"t={ts},v1={digest_hex}"}
 
 
-def verify_signature(header_value: str, payload_bytes: bytes, secret: str, tolerance_seconds: int = 300) -> bool:
+def parse_signature_header(header_value: str) -> tuple[int, str] | None:
+    """Split ``t=<unix>,v1=<hex>`` into (timestamp, digest); None if malformed."""
     try:
         parts = dict(part.split("=", 1) for part in header_value.split(","))
-        ts = int(parts.get("t", "0"))
-        v1 = parts.get("v1", "")
+        return int(parts.get("t", "0")), parts.get("v1", "")
     except Exception:
+        return None
+
+
+def verify_signature(
+    header_value: str,
+    payload_bytes: bytes,
+    secret: str | Iterable[str],
+    tolerance_seconds: int = 300,
+) -> bool:
+    """Check the signature against ``secret`` or any of several rotated secrets."""
+    parsed = parse_signature_header(header_value)
+    if parsed is None:
         return False
+    ts, v1 = parsed
 
-    if abs(time.time() - ts) > tolerance_seconds:
+    # Cheap checks first: stale or malformed headers never reach the HMAC.
+    if abs(time.time() - ts) > tolerance_seconds or len(v1) != 64:
         return False
 
-    expected = _compute_signature(f"{ts}.".encode("utf-8") + payload_bytes, secret)
+    message = f"{ts}.".encode("utf-8") + payload_bytes
+    candidates = (secret,) if isinstance(secret, str) else secret
     try:
-        return hmac.compare_digest(expected, v1)
+        return any(hmac.compare_digest(_compute_signature(message, s), v1) for s in candidates)
     except Exception:
         return False
 
 
-async def post_cert_webhook(payload: dict, *, url: str | None = None, secret: str | None = None, timeout_seconds: float = 5.0) -> tuple[int, str]:
+class ReplayCache:
+    """Signatures seen within the tolerance window, bounded in size.
+
+    A signed request is only valid for ``window_seconds`` around its
+    timestamp, so a digest needs to be remembered just that long. Entries
+    are kept in arrival order and expired from the front; if more than
+    ``max_entries`` arrive within one window the oldest are dropped early
+    (cert_acks' unique key still rejects those replays, just later).
+    """
+
+    def __init__(self, window_seconds: int = 300, max_entries: int = 100_000):
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self._seen: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.evicted = 0
+
+    def add(self, digest: str, now: float | None = None) -> bool:
+        """Record ``digest``; False if it was already seen inside the window."""
+        now = time.time() if now is None else now
+        with self._lock:
+            cutoff = now - 2 * self.window_seconds  # timestamps are valid on both sides of now
+            while self._seen:
+                oldest, seen_at = next(iter(self._seen.items()))
+                if seen_at >= cutoff:
+                    break
+                del self._seen[oldest]
+            if digest in self._seen:
+                self.rejected += 1
+                return False
+            self._seen[digest] = now
+            if len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+                self.evicted += 1
+            return True
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+
+_replay_cache: ReplayCache | None = None
+
+
+def get_replay_cache() -> ReplayCache:
+    global _replay_cache
+    if _replay_cache is None:
+        _replay_cache = ReplayCache(
+            window_seconds=int(os.getenv("CERT_SIGNATURE_TOLERANCE_SECONDS", "300")),
+            max_entries=int(os.getenv("CERT_REPLAY_CACHE_SIZE", "100000")),
+        )
+    return _replay_cache
+
+
+# One keep-alive connection pool per worker instead of a new TCP/TLS
+# connection per event. Sized by WEBHOOK_CONCURRENCY.
+_client: "httpx.AsyncClient | None" = None
+
+
+def get_http_client() -> "httpx.AsyncClient":
+    global _client
+    if _client is None or _client.is_closed:
+        import httpx  # deferred: only processes that deliver webhooks need it
+
+        concurrency = int(os.getenv("WEBHOOK_CONCURRENCY", "4"))
+        _client = httpx.AsyncClient(
+            timeout=float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", "5")),
+            limits=httpx.Limits(
+                max_connections=concurrency,
+                max_keepalive_connections=concurrency,
+                keepalive_expiry=30.0,
+            ),
+        )
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def _post_signed(data: bytes, content_type: str, url: str | None, secret: str | None, timeout_seconds: float | None) -> tuple[int, str]:
+    kind = "batch" if content_type == "application/x-ndjson" else "single"
+    started = time.perf_counter()
+    status = "error"
+    try:
+        status, text = await _send_signed(data, content_type, url, secret, timeout_seconds)
+    finally:
+        metrics.WEBHOOK_LATENCY.labels(kind).observe(time.perf_counter() - started)
+        metrics.WEBHOOK_REQUESTS.labels(kind, status).inc()
+    return status, text
+
+
+async def _send_signed(data: bytes, content_type: str, url: str | None, secret: str | None, timeout_seconds: float | None) -> tuple[int, str]:
     configured_url, configured_secret = get_cert_webhook_config()
     target_url = url or configured_url or "http://nginx/api/v1/cert/ingest"
     signing_secret = secret or configured_secret
 
-    data = json.dumps(payload, separators=(",", ":")).encode("utf-8")
     headers = {
-        "Content-Type": "application/json",
+        "Content-Type": content_type,
         **build_signature_headers(data, signing_secret),
     }
+    kwargs = {"timeout": timeout_seconds} if timeout_seconds is not None else {}
+    resp = await get_http_client().post(target_url, content=data, headers=headers, **kwargs)
+    return resp.status_code, resp.text
+
 
-    async with httpx.AsyncClient(timeout=timeout_seconds) as client:
-        resp = await client.post(target_url, content=data, headers=headers)
-        return resp.status_code, resp.text
+async def post_cert_webhook(payload: dict, *, url: str | None = None, secret: str | None = None, timeout_seconds: float | None = None) -> tuple[int, str]:
+    data = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return await _post_signed(data, "application/json", url, secret, timeout_seconds)
 
 
+async def post_cert_batch(payloads: list[dict], *, url: str | None = None, secret: str | None = None, timeout_seconds: float | None = None) -> tuple[int, str]:
+    """POST several events as one signed NDJSON body (one JSON object per line)."""
+    data = b"\n".join(json.dumps(p, separators=(",", ":")).encode("utf-8") for p in payloads)
+    return await _post_signed(data, "application/x-ndjson", url, secret, timeout_seconds)
@@ -0,0 +1,73 @@
+"""Microbenchmark: per-request cost of the require_user dependency.
+
+Times verify_access_token on its own, then compares requests to an open
+route with the same route behind require_user, in-process over ASGI so
+network noise doesn't hide the difference. No database is touched.
+
+    python benchmarks/auth_overhead.py --requests 20000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+from fastapi import Depends, FastAPI  # noqa: E402
+
+from app import auth  # noqa: E402
+
+
+def bench_verify(token: str, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        auth.verify_access_token(token)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def bench_route(client: httpx.AsyncClient, path: str, headers: dict, requests: int) -> float:
+    for _ in range(min(200, requests)):  # warm up
+        await client.get(path, headers=headers)
+    started = time.perf_counter()
+    for _ in range(requests):
+        resp = await client.get(path, headers=headers)
+        resp.raise_for_status()
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--iterations", type=int, default=100000)
+    parser.add_argument("--revoked", type=int, default=10000, help="Revoked sessions held in the cache")
+    args = parser.parse_args()
+
+    for session_id in range(1, args.revoked + 1):
+        auth.get_revocations().add(-session_id)
+    token = auth.issue_access_token(1, "bench@example.com", session_id=1)
+
+    app = FastAPI()
+
+    @app.get("/open")
+    async def open_route() -> dict:
+        return {"ok": True}
+
+    @app.get("/protected", dependencies=[Depends(auth.require_user)])
+    async def protected_route() -> dict:
+        return {"ok": True}
+
+    headers = {"Authorization": f"Bearer {token}"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        open_us = await bench_route(client, "/open", headers, args.requests)
+        protected_us = await bench_route(client, "/protected", headers, args.requests)
+
+    print(f"verify_access_token   {bench_verify(token, args.iterations):8.2f} us/call")
+    print(f"open route            {open_us:8.2f} us/request")
+    print(f"protected route       {protected_us:8.2f} us/request  (+{protected_us - open_us:.2f} us)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+"""Benchmark: incident inserts one at a time vs. batched INSERT ... RETURNING.
+
+"single" mirrors the old create_incident path: add, commit and refresh one
+Incident per row. "bulk" mirrors POST /incidents:bulk: one multi-row
+INSERT ... RETURNING per 1000 rows and a single commit.
+
+    DATABASE_URL=postgresql+psycopg://... python benchmarks/bulk_ingest.py --rows 20000
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert  # noqa: E402
+
+from app.db import Base, SessionLocal, engine  # noqa: E402
+from app.models import Incident  # noqa: E402
+
+
+def run_single(rows: int) -> float:
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        for i in range(rows):
+            incident = Incident(reporter_id=f"bench-single-{i}", evidence_type="feed", risk_label="Pending")
+            db.add(incident)
+            db.commit()
+            db.refresh(incident)
+    return time.perf_counter() - started
+
+
+def run_bulk(rows: int, batch_size: int) -> float:
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        stmt = insert(Incident).returning(Incident.id, sort_by_parameter_order=True)
+        for offset in range(0, rows, batch_size):
+            now = datetime.utcnow()
+            params = [
+                {"reporter_id": f"bench-bulk-{i}", "evidence_type": "feed", "risk_label": "Pending", "created_at": now}
+                for i in range(offset, min(rows, offset + batch_size))
+            ]
+            db.execute(stmt, params).scalars().all()
+        db.commit()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--single-rows", type=int, default=None, help="Rows for the slow path (default: --rows)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    single_rows = args.single_rows or args.rows
+
+    single = run_single(single_rows)
+    bulk = run_bulk(args.rows, args.batch_size)
+    single_rate = single_rows / single
+    bulk_rate = args.rows / bulk
+    print(f"single  {single_rows:>8} rows {single:8.2f}s {single_rate:10.0f} rows/s")
+    print(f"bulk    {args.rows:>8} rows {bulk:8.2f}s {bulk_rate:10.0f} rows/s  ({bulk_rate / single_rate:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Benchmark: memory and classification throughput vs. pre-forked worker count.
+
+For each ``--workers`` value, starts ``python -m app.serve`` on a local
+port, waits until /health reports every worker warm, then records the
+total RSS and PSS of the master and its workers (PSS counts shared
+copy-on-write pages once, split between the processes sharing them) and
+drives POST /api/v1/classify with ``--clients`` concurrent clients for
+``--seconds``. The result cache is disabled so every request runs the
+model. Uses the database from DATABASE_URL; nothing is written to it.
+
+    python benchmarks/serve_workers.py --workers 1 2 4 8 --clients 32
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx  # noqa: E402
+
+from app import auth  # noqa: E402
+
+TEXTS = [
+    "Your account has been suspended. Verify your credentials at the link below.",
+    "We observed high-volume traffic saturating the web server from multiple sources.",
+    "Malicious attachment with trojan detected in the forwarded email.",
+    "Files on the shared drive were encrypted and a ransom note was left behind.",
+    "Monthly newsletter with product updates and no suspicious links.",
+]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return float("nan")
+    k = max(0, min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+def process_tree(pid: int) -> list[int]:
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children", encoding="ascii") as f:
+            children = [int(p) for p in f.read().split()]
+    except OSError:
+        return pids
+    for child in children:
+        pids += process_tree(child)
+    return pids
+
+
+def memory_mb(pids: list[int]) -> tuple[float, float]:
+    """Summed (RSS, PSS) of ``pids`` in MiB, from /proc/<pid>/smaps_rollup."""
+    rss = pss = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/smaps_rollup", encoding="ascii") as f:
+                for line in f:
+                    if line.startswith("Rss:"):
+                        rss += int(line.split()[1])
+                    elif line.startswith("Pss:"):
+                        pss += int(line.split()[1])
+        except OSError:
+            continue
+    return rss / 1024, pss / 1024
+
+
+async def wait_ready(base_url: str, workers: int, timeout: float) -> float:
+    """Seconds until /health has answered 200 from ``workers`` distinct pids."""
+    started = time.perf_counter()
+    ready: set[int] = set()
+    async with httpx.AsyncClient(base_url=base_url, timeout=5.0) as client:
+        while len(ready) < workers:
+            if time.perf_counter() - started > timeout:
+                raise TimeoutError(f"only {len(ready)}/{workers} workers ready after {timeout:.0f}s")
+            try:
+                resp = await client.get("/health")
+            except httpx.TransportError:
+                await asyncio.sleep(0.5)
+                continue
+            if resp.status_code == 200:
+                ready.add(resp.json()["pid"])
+            else:
+                await asyncio.sleep(0.2)
+    return time.perf_counter() - started
+
+
+async def drive(base_url: str, token: str, clients: int, seconds: float) -> tuple[list[float], int]:
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + seconds
+
+    async def client_loop(client, n):
+        nonlocal errors
+        i = n
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            resp = await client.post("/api/v1/classify", json={"text": TEXTS[i % len(TEXTS)]})
+            if resp.status_code == 200:
+                latencies.append((time.perf_counter() - started) * 1000)
+            else:
+                errors += 1
+            i += 1
+
+    limits = httpx.Limits(max_connections=clients)
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0, limits=limits, headers=headers) as client:
+        await asyncio.gather(*(client_loop(client, n) for n in range(clients)))
+    return latencies, errors
+
+
+def run_one(workers: int, args, token: str) -> dict:
+    base_url = f"http://127.0.0.1:{args.port}"
+    env = dict(os.environ, ML_RESULT_CACHE_SIZE="0", WEBHOOK_DISPATCHER="0")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.serve", "--workers", str(workers), "--bind", f"127.0.0.1:{args.port}"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL if not args.verbose else None,
+    )
+    try:
+        ready_seconds = asyncio.run(wait_ready(base_url, workers, args.startup_timeout))
+        rss, pss = memory_mb(process_tree(server.pid))
+        latencies, errors = asyncio.run(drive(base_url, token, args.clients, args.seconds))
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+    return {
+        "workers": workers,
+        "ready_seconds": ready_seconds,
+        "rss_mb": rss,
+        "pss_mb": pss,
+        "requests_per_second": len(latencies) / args.seconds,
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent classify clients")
+    parser.add_argument("--seconds", type=float, default=30.0, help="Load duration per worker count")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--startup-timeout", type=float, default=600.0)
+    parser.add_argument("--verbose", action="store_true", help="Show server logs")
+    args = parser.parse_args()
+
+    token = auth.issue_access_token(0, "bench@example.com", 0)
+    for workers in args.workers:
+        r = run_one(workers, args, token)
+        print(
+            f"workers={r['workers']:<2} ready={r['ready_seconds']:6.1f}s rss={r['rss_mb']:8.0f}MiB "
+            f"pss={r['pss_mb']:8.0f}MiB req/s={r['requests_per_second']:7.1f} "
+            f"p50={r['p50_ms']:7.1f}ms p99={r['p99_ms']:7.1f}ms errors={r['errors']}",
+            flush=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
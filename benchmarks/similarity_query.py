@@ -0,0 +1,116 @@
+"""Benchmark: near-duplicate lookup latency with a large LSH index.
+
+Fills incident_signatures / lsh_buckets with ``--incidents`` synthetic
+signatures (random background plus planted clusters of near-duplicates),
+then times similarity.neighbours() for perturbed copies of the planted
+ones and reports p50/p95/p99 and recall. Run it against a scratch
+database: it inserts that many incidents.
+
+    DATABASE_URL=postgresql+psycopg://... python benchmarks/similarity_query.py --incidents 1000000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from sqlalchemy import func, insert, select  # noqa: E402
+
+from app import similarity  # noqa: E402
+from app.db import AsyncSessionLocal, Base, SessionLocal, engine  # noqa: E402
+from app.models import Incident, IncidentSignature, LshBucket  # noqa: E402
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+def perturb(sig: np.ndarray, rng, fraction: float) -> np.ndarray:
+    """Copy of ``sig`` with ``fraction`` of its minhashes replaced (similarity ~ 1 - fraction)."""
+    out = sig.copy()
+    idx = rng.choice(sig.size, size=int(sig.size * fraction), replace=False)
+    out[idx] = rng.integers(0, 2**31 - 1, size=idx.size, dtype=np.uint32)
+    return out
+
+
+def populate(total: int, clusters: int, cluster_size: int, batch_size: int, rng) -> list[np.ndarray]:
+    """Insert ``total`` incidents with signatures; returns the planted cluster centres."""
+    centres = [rng.integers(0, 2**31 - 1, size=similarity.NUM_PERM, dtype=np.uint32) for _ in range(clusters)]
+    planted = [perturb(c, rng, 0.05) for c in centres for _ in range(cluster_size)]
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        offset = 0
+        while offset < total:
+            n = min(batch_size, total - offset)
+            now = datetime.utcnow()
+            ids = db.execute(
+                insert(Incident).returning(Incident.id, sort_by_parameter_order=True),
+                [{"reporter_id": "bench-lsh", "evidence_type": "email", "risk_label": "Pending", "created_at": now}] * n,
+            ).scalars().all()
+            sigs = rng.integers(0, 2**31 - 1, size=(n, similarity.NUM_PERM), dtype=np.uint32)
+            for i in range(n):
+                if offset + i < len(planted):
+                    sigs[i] = planted[offset + i]
+            db.execute(insert(IncidentSignature), [
+                {"incident_id": incident_id, "cluster_id": incident_id, "signature": similarity.to_bytes(sig), "created_at": now}
+                for incident_id, sig in zip(ids, sigs)
+            ])
+            db.execute(insert(LshBucket), [
+                {"band": band, "bucket": bucket, "incident_id": incident_id}
+                for incident_id, sig in zip(ids, sigs)
+                for band, bucket in similarity.band_keys(sig)
+            ])
+            db.commit()
+            offset += n
+            rate = offset / (time.perf_counter() - started)
+            print(f"\rpopulated {offset}/{total} ({rate:.0f}/s)", end="", flush=True)
+    print()
+    return centres
+
+
+async def run_queries(centres, queries: int, rng) -> tuple[list[float], float]:
+    latencies, recalled = [], 0
+    async with AsyncSessionLocal() as db:
+        for q in range(queries):
+            query = perturb(centres[q % len(centres)], rng, 0.08)
+            started = time.perf_counter()
+            found = await similarity.neighbours(db, query, limit=20)
+            latencies.append((time.perf_counter() - started) * 1000)
+            recalled += bool(found)
+    return latencies, recalled / queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--incidents", type=int, default=1_000_000)
+    parser.add_argument("--clusters", type=int, default=100)
+    parser.add_argument("--cluster-size", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        existing = db.execute(select(func.count()).select_from(IncidentSignature)).scalar_one()
+    if existing:
+        sys.exit(f"incident_signatures already has {existing} rows; use an empty database")
+
+    centres = populate(args.incidents, args.clusters, args.cluster_size, args.batch_size, rng)
+    latencies, recall = asyncio.run(run_queries(centres, args.queries, rng))
+    print(
+        f"{args.incidents} indexed, {args.queries} queries: "
+        f"p50={percentile(latencies, 50):.2f}ms p95={percentile(latencies, 95):.2f}ms "
+        f"p99={percentile(latencies, 99):.2f}ms recall={recall:.1%}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Startup report: import time per module and time until /health is ready.
+
+Runs ``python -X importtime -c "import app.main"`` ``--runs`` times in
+fresh interpreters and reports the median total plus the slowest modules
+(cumulative, i.e. including what they import), then times
+``python -m app.migrations upgrade`` and a single uvicorn process from
+spawn to the first 200 from /health. ``--json`` writes the numbers;
+``--baseline`` compares against an earlier file and exits non-zero if
+import or ready time regressed by more than ``--tolerance``.
+
+    DATABASE_URL=sqlite:////tmp/startup.db ML_PRELOAD=0 python benchmarks/startup_time.py --json startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times() -> dict[str, float]:
+    """Cumulative import time in ms per module for one cold ``import app.main``."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _self, cumulative, module = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            times[module.strip()] = int(cumulative) / 1000
+    return times
+
+
+def migrate_seconds() -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-m", "app.migrations", "upgrade"], cwd=ROOT, check=True, capture_output=True)
+    return time.perf_counter() - started
+
+
+def ready_seconds(port: int, timeout: float) -> float:
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"server exited with {server.returncode} before becoming ready")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            time.sleep(0.05)
+        raise TimeoutError(f"/health not ready after {timeout:.0f}s")
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to list")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--ready-timeout", type=float, default=300.0)
+    parser.add_argument("--json", help="Write the report here")
+    parser.add_argument("--baseline", help="Earlier --json report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before failing (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    runs = [import_times() for _ in range(args.runs)]
+    modules = {name: statistics.median(r.get(name, 0.0) for r in runs) for name in runs[0]}
+    report = {
+        "import_ms": modules.get("app.main", 0.0),
+        "migrate_seconds": migrate_seconds(),
+        "ready_seconds": ready_seconds(args.port, args.ready_timeout),
+        "modules_ms": dict(sorted(modules.items(), key=lambda item: -item[1])[: args.top]),
+        "app_modules_ms": {name: ms for name, ms in sorted(modules.items()) if name.startswith("app.")},
+    }
+
+    print(f"import app.main  {report['import_ms']:8.1f} ms (median of {args.runs})")
+    print(f"migrate          {report['migrate_seconds'] * 1000:8.1f} ms")
+    print(f"spawn to ready   {report['ready_seconds'] * 1000:8.1f} ms")
+    print("slowest imports (cumulative):")
+    for name, ms in report["modules_ms"].items():
+        print(f"  {ms:8.1f} ms  {name}")
+    print("app modules (cumulative):")
+    for name, ms in report["app_modules_ms"].items():
+        print(f"  {ms:8.1f} ms  {name}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        failed = False
+        for key in ("import_ms", "ready_seconds"):
+            before, after = baseline[key], report[key]
+            change = (after - before) / before if before else 0.0
+            print(f"{key}: {before:.3f} -> {after:.3f} ({change:+.0%})")
+            failed |= change > args.tolerance
+        if failed:
+            sys.exit("startup regressed beyond tolerance")
+
+
+if __name__ == "__main__":
+    main()
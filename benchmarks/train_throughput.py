@@ -0,0 +1,72 @@
+"""Benchmark: CPU fine-tuning wall time, old pipeline vs cached/length-grouped.
+
+Runs ``ml.train_finetuned`` three times on the same CSV with a fixed step
+budget: the legacy pipeline, the new one with an empty tokenized cache,
+and the new one again with the cache warm. Prints tokenize/train/wall
+seconds and samples per second for each. GPUs are hidden so the numbers
+reflect CPU-only hosts.
+
+    python benchmarks/train_throughput.py --dataset data/incidents.csv --label_column category --max_steps 200
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import ml  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dataset", required=True)
+    parser.add_argument("--text_column", default="text")
+    parser.add_argument("--label_column", default="label")
+    parser.add_argument("--base_model", default=ml.DEFAULT_BASE_MODEL)
+    parser.add_argument("--max_steps", type=int, default=200)
+    parser.add_argument("--batch_size", type=int, default=8)
+    parser.add_argument("--max_length", type=int, default=256)
+    parser.add_argument("--torch_threads", type=int, default=None)
+    parser.add_argument("--interop_threads", type=int, default=None)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="train-bench-")
+    cache_dir = os.path.join(workdir, "tokenized")
+    common = dict(
+        base_model=args.base_model,
+        batch_size=args.batch_size,
+        max_steps=args.max_steps,
+        torch_threads=args.torch_threads,
+        interop_threads=args.interop_threads,
+    )
+    try:
+        runs = {
+            "legacy": ml.train_finetuned(
+                args.dataset, args.text_column, args.label_column,
+                model_out=os.path.join(workdir, "legacy"), legacy=True, **common,
+            ),
+        }
+        for name in ("cached_cold", "cached_warm"):
+            runs[name] = ml.train_finetuned(
+                args.dataset, args.text_column, args.label_column,
+                model_out=os.path.join(workdir, name), max_length=args.max_length, cache_dir=cache_dir, **common,
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for name, report in runs.items():
+        print(
+            f"{name:<12} tokenize={report['tokenize_seconds']:7.2f}s train={report['train_seconds']:8.2f}s "
+            f"wall={report['wall_seconds']:8.2f}s samples/s={report['train_samples_per_second'] or 0:7.2f}"
+        )
+    baseline = runs["legacy"]["wall_seconds"]
+    print(f"warm-cache speedup: {baseline / runs['cached_warm']['wall_seconds']:.2f}x")
+    print(json.dumps(runs, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Load test: /health latency while large evidence uploads are in flight.
+
+Probes /health at a fixed rate, first on an idle server and then while
+``--uploads`` concurrent clients repeatedly POST ``--size-mb`` files to
+/api/v1/incidents. If the event loop is never blocked, p99 should stay
+about the same between the two phases.
+
+    python benchmarks/upload_health_latency.py --base-url http://localhost:8000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import httpx
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return float("nan")
+    k = max(0, min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+async def probe_health(client, stop, interval, samples):
+    while not stop.is_set():
+        started = time.perf_counter()
+        resp = await client.get("/health")
+        resp.raise_for_status()
+        samples.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(interval)
+
+
+async def upload_loop(client, stop, payload, results):
+    while not stop.is_set():
+        started = time.perf_counter()
+        resp = await client.post(
+            "/api/v1/incidents",
+            data={"reporter_id": "loadtest", "evidence_type": "file"},
+            files={"file": ("evidence.bin", payload, "application/octet-stream")},
+        )
+        results.append((resp.status_code, time.perf_counter() - started))
+
+
+async def run_phase(base_url, seconds, uploads, payload, interval):
+    stop = asyncio.Event()
+    samples, upload_results = [], []
+    timeout = httpx.Timeout(120.0)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout) as health_client, \
+            httpx.AsyncClient(base_url=base_url, timeout=timeout) as upload_client:
+        tasks = [asyncio.create_task(probe_health(health_client, stop, interval, samples))]
+        tasks += [asyncio.create_task(upload_loop(upload_client, stop, payload, upload_results)) for _ in range(uploads)]
+        await asyncio.sleep(seconds)
+        stop.set()
+        await asyncio.gather(*tasks)
+    return samples, upload_results
+
+
+def report(name, samples, upload_results):
+    line = (
+        f"{name:<10} health n={len(samples):<5} p50={percentile(samples, 50):7.2f}ms "
+        f"p95={percentile(samples, 95):7.2f}ms p99={percentile(samples, 99):7.2f}ms"
+    )
+    if upload_results:
+        ok = [d for status, d in upload_results if status < 300]
+        rejected = sum(1 for status, _ in upload_results if status == 503)
+        mean = statistics.mean(ok) if ok else float("nan")
+        line += f" | uploads ok={len(ok)} rejected={rejected} mean={mean:.2f}s"
+    print(line)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--seconds", type=float, default=20.0, help="Duration of each phase")
+    parser.add_argument("--uploads", type=int, default=8, help="Concurrent upload clients")
+    parser.add_argument("--size-mb", type=float, default=50.0, help="Size of each uploaded file")
+    parser.add_argument("--interval-ms", type=float, default=20.0, help="Delay between /health probes")
+    args = parser.parse_args()
+
+    payload = os.urandom(int(args.size_mb * 1024 * 1024))
+    interval = args.interval_ms / 1000
+
+    report("idle", *await run_phase(args.base_url, args.seconds, 0, payload, interval))
+    report("uploading", *await run_phase(args.base_url, args.seconds, args.uploads, payload, interval))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
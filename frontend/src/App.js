@@ -224,6 +224,7 @@ const LoginForm = ({ onSwitch }) => {
       
       // Save token and redirect to dashboard
       localStorage.setItem('access_token', data.access_token);
+      localStorage.setItem('refresh_token', data.refresh_token);
       setMessage(`Login successful! Redirecting to dashboard...`);
       setTimeout(() => {
         window.location.href = '/dashboard';
@@ -0,0 +1,60 @@
+// Prefer same-origin API calls behind nginx
+export const API_BASE = process.env.REACT_APP_API_BASE || '';
+
+// Access tokens expire after ACCESS_TOKEN_TTL_SECONDS (15 min by default).
+// Refresh tokens are single use, so concurrent 401s share one refresh call.
+let refreshing = null;
+
+export const clearSession = () => {
+  localStorage.removeItem('access_token');
+  localStorage.removeItem('refresh_token');
+};
+
+const refreshSession = () => {
+  if (!refreshing) {
+    const refreshToken = localStorage.getItem('refresh_token');
+    refreshing = (async () => {
+      if (!refreshToken) return false;
+      try {
+        const response = await fetch(`${API_BASE}/api/v1/auth/refresh`, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ refresh_token: refreshToken }),
+        });
+        if (!response.ok) return false;
+        const data = await response.json();
+        localStorage.setItem('access_token', data.access_token);
+        localStorage.setItem('refresh_token', data.refresh_token);
+        return true;
+      } catch (error) {
+        return false;
+      }
+    })().finally(() => {
+      refreshing = null;
+    });
+  }
+  return refreshing;
+};
+
+const withAuth = (options) => {
+  const token = localStorage.getItem('access_token');
+  const headers = { ...(options.headers || {}) };
+  if (token) headers.Authorization = `Bearer ${token}`;
+  return { ...options, headers };
+};
+
+// fetch() for protected routes: sends the access token and, on a 401,
+// refreshes the session once and retries. If the refresh fails the stored
+// tokens are cleared and the user is sent back to the login page.
+export const apiFetch = async (path, options = {}) => {
+  const response = await fetch(`${API_BASE}${path}`, withAuth(options));
+  if (response.status !== 401) return response;
+
+  if (await refreshSession()) {
+    const retried = await fetch(`${API_BASE}${path}`, withAuth(options));
+    if (retried.status !== 401) return retried;
+  }
+  clearSession();
+  window.location.assign('/');
+  throw new Error('Your session has expired. Please log in again.');
+};
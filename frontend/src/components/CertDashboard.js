@@ -1,5 +1,23 @@
 import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
+import { apiFetch } from '../api';
+
+const RISK_PRIORITY = { red: 9.0, amber: 6.5, green: 3.0 };
+
+// Map an /api/v1/incidents item onto the fields this dashboard renders
+const toDashboardIncident = (item) => {
+  const risk = (item.risk_label || '').toLowerCase();
+  return {
+    id: `INC-${String(item.id).padStart(3, '0')}`,
+    reporterId: item.reporter_id,
+    evidenceType: item.evidence_type,
+    classificationResult: item.risk_label,
+    priorityScore: RISK_PRIORITY[risk] ?? 5.0,
+    timestamp: item.created_at,
+    status: risk === 'pending' ? 'Under Investigation' : 'Active',
+    source: 'Cyber Incident Portal'
+  };
+};
 
 const CertDashboard = () => {
   const navigate = useNavigate();
@@ -8,68 +26,22 @@ const CertDashboard = () => {
   const [filter, setFilter] = useState('all');
   const [sortBy, setSortBy] = useState('priority');
 
-  // Mock data for demo - replace with actual API calls
   useEffect(() => {
     const fetchIncidents = async () => {
       setLoading(true);
-      // Simulate API call
-      await new Promise(resolve => setTimeout(resolve, 1000));
-      
-      const mockIncidents = [
-        {
-          id: 'INC-001',
-          reporterId: 'user123@example.com',
-          evidenceType: 'File Upload',
-          classificationResult: 'OPSEC risk',
-          priorityScore: 9.2,
-          timestamp: '2024-01-15T10:30:00Z',
-          status: 'Active',
-          source: 'Cyber Incident Portal'
-        },
-        {
-          id: 'INC-002',
-          reporterId: 'user456@example.com',
-          evidenceType: 'URL Analysis',
-          classificationResult: 'Malicious Website',
-          priorityScore: 7.8,
-          timestamp: '2024-01-15T09:15:00Z',
-          status: 'Under Investigation',
-          source: 'Safety Web Portal'
-        },
-        {
-          id: 'INC-003',
-          reporterId: 'user789@example.com',
-          evidenceType: 'File Upload',
-          classificationResult: 'Phishing Attempt',
-          priorityScore: 6.5,
-          timestamp: '2024-01-15T08:45:00Z',
-          status: 'Resolved',
-          source: 'Cyber Incident Portal'
-        },
-        {
-          id: 'INC-004',
-          reporterId: 'user321@example.com',
-          evidenceType: 'URL Analysis',
-          classificationResult: 'Suspicious Content',
-          priorityScore: 4.2,
-          timestamp: '2024-01-15T07:20:00Z',
-          status: 'Active',
-          source: 'Safety Web Portal'
-        },
-        {
-          id: 'INC-005',
-          reporterId: 'user654@example.com',
-          evidenceType: 'File Upload',
-          classificationResult: 'Malware Detected',
-          priorityScore: 8.9,
-          timestamp: '2024-01-15T06:10:00Z',
-          status: 'Under Investigation',
-          source: 'Cyber Incident Portal'
+      try {
+        const response = await apiFetch('/api/v1/incidents?limit=100');
+        if (!response.ok) {
+          throw new Error(`Failed to load incidents (${response.status})`);
         }
-      ];
-      
-      setIncidents(mockIncidents);
-      setLoading(false);
+        const data = await response.json();
+        setIncidents(data.items.map(toDashboardIncident));
+      } catch (error) {
+        console.error(error);
+        setIncidents([]);
+      } finally {
+        setLoading(false);
+      }
     };
 
     fetchIncidents();
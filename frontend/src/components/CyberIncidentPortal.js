@@ -1,8 +1,6 @@
 import React, { useState } from 'react';
 import { useNavigate } from 'react-router-dom';
-
-// Prefer same-origin API calls behind nginx
-const API_BASE = process.env.REACT_APP_API_BASE || '';
+import { apiFetch } from '../api';
 
 const CyberIncidentPortal = () => {
   const navigate = useNavigate();
@@ -51,8 +49,12 @@ const CyberIncidentPortal = () => {
       fd.append('reporter_id', 'portal-user');
       fd.append('evidence_type', 'cyber');
       fd.append('file', formData.evidence);
+      const description = [formData.description, formData.url, formData.additionalInfo].filter(Boolean).join('\n');
+      if (description) {
+        fd.append('description', description);
+      }
 
-      const createResp = await fetch(`${API_BASE}/api/v1/incidents`, {
+      const createResp = await apiFetch('/api/v1/incidents', {
         method: 'POST',
         body: fd,
       });
@@ -64,14 +66,14 @@ const CyberIncidentPortal = () => {
       const incidentId = createJson.incident_id;
 
       // 2) Mark as Red to trigger CERT webhook automatically
-      const riskResp = await fetch(`${API_BASE}/api/v1/incidents/${incidentId}/risk`, {
+      const riskResp = await apiFetch(`/api/v1/incidents/${incidentId}/risk`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ risk_label: 'Red' }),
       });
       const riskJson = await riskResp.json();
-      if (!riskResp.ok || !riskJson.webhook_sent) {
-        throw new Error(riskJson?.detail || 'Incident created, but webhook failed to send');
+      if (!riskResp.ok || !riskJson.webhook_queued) {
+        throw new Error(riskJson?.detail || 'Incident created, but CERT alert could not be queued');
       }
 
       // 3) Show results
@@ -88,7 +90,7 @@ const CyberIncidentPortal = () => {
         incidentId,
       };
       setResult(done);
-      setMessage(`Incident #${incidentId} reported. CERT alert sent.`);
+      setMessage(`Incident #${incidentId} reported. CERT alert queued.`);
     } catch (error) {
       setMessage(error.message || 'Error submitting incident report. Please try again.');
     } finally {
@@ -1,5 +1,6 @@
 import React from 'react';
 import { useNavigate } from 'react-router-dom';
+import { API_BASE, clearSession } from '../api';
 
 const MainDashboard = () => {
   const navigate = useNavigate();
@@ -35,8 +36,16 @@ const MainDashboard = () => {
   ];
 
   const handleLogout = () => {
-    // Clear any stored tokens and redirect to login
-    localStorage.removeItem('access_token');
+    // Revoke the session server-side, then clear stored tokens and redirect to login
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (refreshToken) {
+      fetch(`${API_BASE}/api/v1/auth/logout`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ refresh_token: refreshToken }),
+      }).catch(() => {});
+    }
+    clearSession();
     navigate('/');
   };
 
@@ -0,0 +1,51 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# app.db builds its engines at import time; point them at a scratch SQLite
+# file, and run from a scratch directory so evidence blobs and the key file
+# (relative paths in app.storage) stay out of the checkout.
+_WORKDIR = tempfile.mkdtemp(prefix="overfit-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_WORKDIR, 'test.db')}")
+os.environ.setdefault("ML_PRELOAD", "0")
+os.environ.setdefault("WEBHOOK_DISPATCHER", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(_WORKDIR)
+
+
+@pytest.fixture(scope="session")
+def api_client():
+    """TestClient for the full app over a migrated scratch database."""
+    from fastapi.testclient import TestClient
+
+    from app import main, migrations
+
+    migrations.upgrade()
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def auth_headers():
+    from app import auth
+
+    return {"Authorization": f"Bearer {auth.issue_access_token(1, 'analyst@example.com', 1)}"}
+
+
+@pytest.fixture
+def upload(api_client, auth_headers):
+    """Create an incident from ``content``; returns the API response body."""
+
+    def _upload(content: bytes, filename: str = "evidence.txt", evidence_type: str = "log", reporter_id: str = "r1") -> dict:
+        resp = api_client.post(
+            "/api/v1/incidents",
+            headers=auth_headers,
+            data={"reporter_id": reporter_id, "evidence_type": evidence_type},
+            files={"file": (filename, content, "text/plain")},
+        )
+        assert resp.status_code == 200, resp.text
+        return resp.json()
+
+    return _upload
@@ -0,0 +1,69 @@
+import json
+from datetime import datetime
+
+from app import aggregates
+from app.db import SessionLocal
+
+
+def _bulk(api_client, auth_headers, rows: list[dict]) -> list[int]:
+    body = "\n".join(json.dumps(row) for row in rows)
+    resp = api_client.post("/api/v1/incidents:bulk", headers=auth_headers, content=body)
+    assert resp.status_code == 200, resp.text
+    return [r["id"] for r in resp.json()["results"]]
+
+
+def _relabel(api_client, auth_headers, incident_id: int, risk_label: str) -> None:
+    resp = api_client.post(f"/api/v1/incidents/{incident_id}/risk", headers=auth_headers, json={"risk_label": risk_label})
+    assert resp.status_code == 200, resp.text
+
+
+def test_incremental_rollups_match_a_rebuild(api_client, auth_headers, upload):
+    uploaded = upload(b"rollup evidence", evidence_type="screenshot")["incident_id"]
+    # Spread across hour and day buckets, including a bucket boundary.
+    ids = _bulk(api_client, auth_headers, [
+        {"reporter_id": "r1", "evidence_type": "log", "created_at": "2026-03-01T23:59:59"},
+        {"reporter_id": "r1", "evidence_type": "log", "risk_label": "Green", "created_at": "2026-03-02T00:00:00"},
+        {"reporter_id": "r2", "evidence_type": "email", "risk_label": "Amber", "created_at": "2026-03-02T10:30:00+05:30"},
+        {"reporter_id": "r2", "evidence_type": "email"},
+    ])
+
+    _relabel(api_client, auth_headers, ids[0], "Amber")
+    _relabel(api_client, auth_headers, ids[0], "Red")
+    _relabel(api_client, auth_headers, ids[1], "Green")  # unchanged: no delta
+    _relabel(api_client, auth_headers, ids[2], "Green")
+    _relabel(api_client, auth_headers, uploaded, "Amber")
+
+    with SessionLocal() as db:
+        report = aggregates.verify(db)
+        assert report["buckets"] > 0
+        assert report["mismatches"] == []
+
+        incremental = aggregates.stored(db)
+        aggregates.rebuild(db)
+        assert aggregates.stored(db) == incremental
+        assert aggregates.verify(db)["mismatches"] == []
+
+        day = aggregates.bucket_start(datetime(2026, 3, 2), "day")
+        assert incremental[("day", "risk_label", day, "Green")] >= 2
+        assert incremental[("day", "risk_label", day, "Amber")] == 0
+
+
+def test_verify_reports_drift(api_client):
+    with SessionLocal() as db:
+        aggregates.rebuild(db)
+        start = aggregates.bucket_start(datetime(2026, 1, 1), "hour")
+        aggregates.apply_deltas(db, aggregates.Deltas({("hour", "risk_label", start, "Red"): 1}))
+        db.commit()
+
+        mismatches = aggregates.verify(db)["mismatches"]
+        assert mismatches == [{
+            "granularity": "hour",
+            "dimension": "risk_label",
+            "bucket_start": start.isoformat(),
+            "value": "Red",
+            "expected": 0,
+            "stored": 1,
+        }]
+
+        aggregates.rebuild(db)
+        assert aggregates.verify(db)["mismatches"] == []
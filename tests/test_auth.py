@@ -0,0 +1,47 @@
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from app import auth
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+
+    @app.get("/protected")
+    async def protected(claims: auth.TokenClaims = Depends(auth.require_user)) -> dict:
+        return {"sub": claims.user_id}
+
+    return TestClient(app)
+
+
+def test_valid_token_round_trips():
+    token = auth.issue_access_token(7, "a@example.com", 99)
+    claims = auth.verify_access_token(token)
+    assert (claims.user_id, claims.email, claims.session_id) == (7, "a@example.com", 99)
+
+
+@pytest.mark.parametrize("token", [
+    "\xe9.abc",
+    "abc.\xe9",
+    "not-a-token",
+    "abc.!!!",
+])
+def test_malformed_tokens_are_invalid(token):
+    with pytest.raises(auth.InvalidToken):
+        auth.verify_access_token(token)
+
+
+def test_tampered_token_is_invalid():
+    signature = auth.issue_access_token(7, "a@example.com", 99).partition(".")[2]
+    other = auth.issue_access_token(8, "b@example.com", 99).partition(".")[0]
+    with pytest.raises(auth.InvalidToken, match="bad signature"):
+        auth.verify_access_token(f"{other}.{signature}")
+
+
+def test_non_ascii_bearer_gets_401(client):
+    # Header values travel as latin-1, so this reaches the app as "é.abc".
+    resp = client.get("/protected", headers={"Authorization": "Bearer \xe9.abc".encode("latin-1")})
+    assert resp.status_code == 401
+    assert client.get("/protected", headers={"Authorization": f"Bearer {auth.issue_access_token(1, 'x@example.com', 1)}"}).status_code == 200
@@ -0,0 +1,115 @@
+import json
+import time
+import uuid
+
+import pytest
+from sqlalchemy import func, select
+
+from app import webhooks
+from app.db import SessionLocal
+from app.models import CertAcknowledgement
+
+
+@pytest.fixture(autouse=True)
+def cert_secrets(monkeypatch):
+    """Rotation in progress: "current" signs, "previous" is still accepted."""
+    monkeypatch.setenv("CERT_WEBHOOK_SECRETS", "current,previous")
+    monkeypatch.setattr(webhooks, "_replay_cache", webhooks.ReplayCache())
+    webhooks.reload_cert_webhook_config()
+    yield
+    monkeypatch.undo()
+    webhooks.reload_cert_webhook_config()
+
+
+def _events(n: int) -> bytes:
+    nonce = str(uuid.uuid4())
+    return b"\n".join(json.dumps({"incident_id": i + 1, "risk_label": "Red", "nonce": nonce}).encode() for i in range(n))
+
+
+def _ingest(api_client, body: bytes, secret: str = "current", content_type: str = "application/x-ndjson"):
+    headers = {"Content-Type": content_type, **webhooks.build_signature_headers(body, secret)}
+    return api_client.post("/api/v1/cert/ingest", content=body, headers=headers)
+
+
+def _acks(signature: str) -> list[int]:
+    with SessionLocal() as db:
+        return db.execute(
+            select(CertAcknowledgement.seq).where(CertAcknowledgement.signature == signature).order_by(CertAcknowledgement.seq)
+        ).scalars().all()
+
+
+def _digest(body: bytes, secret: str = "current") -> str:
+    return webhooks.parse_signature_header(webhooks.build_signature_headers(body, secret)["X-CERT-Signature"])[1]
+
+
+def test_replayed_payload_is_rejected(api_client):
+    body = _events(1)
+    headers = {"Content-Type": "application/json", **webhooks.build_signature_headers(body, "current")}
+
+    first = api_client.post("/api/v1/cert/ingest", content=body, headers=headers)
+    replay = api_client.post("/api/v1/cert/ingest", content=body, headers=headers)
+
+    assert first.status_code == 200
+    assert first.json() == {"received": True, "incident_id": 1, "count": 1}
+    assert replay.status_code == 409
+
+
+def test_replay_on_another_worker_is_rejected_by_the_database(api_client, monkeypatch):
+    body = _events(2)
+    headers = {"Content-Type": "application/x-ndjson", **webhooks.build_signature_headers(body, "current")}
+    assert api_client.post("/api/v1/cert/ingest", content=body, headers=headers).status_code == 200
+
+    # A worker that has not seen the digest only has the unique key to go on.
+    monkeypatch.setattr(webhooks, "_replay_cache", webhooks.ReplayCache())
+    replay = api_client.post("/api/v1/cert/ingest", content=body, headers=headers)
+
+    assert replay.status_code == 409
+    assert _acks(_digest(body)) == [0, 1]
+
+
+def test_signature_from_rotated_secret_is_accepted(api_client):
+    assert _ingest(api_client, _events(1), secret="previous").status_code == 200
+    assert _ingest(api_client, _events(1), secret="retired").status_code == 401
+
+
+def test_partly_duplicated_batch_inserts_only_new_rows(api_client):
+    body = _events(3)
+    digest = _digest(body)
+    with SessionLocal() as db:
+        db.add(CertAcknowledgement(signature=digest, seq=1, payload="{}"))
+        db.commit()
+
+    resp = _ingest(api_client, body)
+
+    assert resp.status_code == 200
+    assert resp.json()["count"] == 2
+    assert _acks(digest) == [0, 1, 2]
+    with SessionLocal() as db:
+        # The pre-existing row was left alone, not overwritten.
+        assert db.execute(
+            select(func.count()).where(CertAcknowledgement.signature == digest, CertAcknowledgement.payload == "{}")
+        ).scalar_one() == 1
+
+
+def test_replay_cache_forgets_digests_after_the_window():
+    cache = webhooks.ReplayCache(window_seconds=10)
+    now = time.time()
+
+    assert cache.add("a", now)
+    assert not cache.add("a", now + 5)
+    assert cache.rejected == 1
+    # Timestamps are valid up to window_seconds either side of now.
+    assert not cache.add("a", now + 19)
+    assert cache.add("a", now + 21)
+
+
+def test_replay_cache_is_bounded():
+    cache = webhooks.ReplayCache(window_seconds=10, max_entries=2)
+    now = time.time()
+    for digest in "abc":
+        assert cache.add(digest, now)
+
+    assert len(cache) == 2
+    assert cache.evicted == 1
+    assert cache.add("a", now)
+    assert not cache.add("c", now)
@@ -0,0 +1,64 @@
+import pytest
+from fastapi import HTTPException
+
+from app.api import _parse_range
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-9", (0, 9)),
+    ("bytes=5-", (5, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=90-500", (90, 99)),
+    ("", None),
+    ("bytes=0-1,5-6", None),
+    ("bytes=abc", None),
+    # last < first is an invalid spec: ignored, so the full body is served.
+    ("bytes=5-2", None),
+])
+def test_parse_range(header, expected):
+    assert _parse_range(header, 100) == expected
+
+
+def test_range_past_end_is_not_satisfiable():
+    with pytest.raises(HTTPException) as exc:
+        _parse_range("bytes=100-", 100)
+    assert exc.value.status_code == 416
+    assert exc.value.headers["Content-Range"] == "bytes */100"
+
+
+@pytest.fixture
+def legacy_evidence(upload, tmp_path):
+    """An uploaded Evidence row repointed at a legacy whole-file Fernet copy."""
+    from app import storage
+    from app.db import SessionLocal
+    from app.models import Evidence
+
+    content = b"legacy evidence line\n" * 50
+    created = upload(content)
+    path = str(tmp_path / "legacy.enc")
+    with open(path, "wb") as f:
+        f.write(storage.encrypt_file(content))
+    with SessionLocal() as db:
+        db.get(Evidence, created["evidence_id"]).storage_path = path
+        db.commit()
+    return created["evidence_id"], content
+
+
+@pytest.mark.parametrize("range_header, status, expected", [
+    (None, 200, slice(None)),
+    ("bytes=10-29", 206, slice(10, 30)),
+])
+def test_legacy_download_decrypts_once(api_client, auth_headers, legacy_evidence, monkeypatch, range_header, status, expected):
+    from app import storage
+
+    evidence_id, content = legacy_evidence
+    calls = []
+    decrypt_file = storage.decrypt_file
+    monkeypatch.setattr(storage, "decrypt_file", lambda data: calls.append(1) or decrypt_file(data))
+    headers = dict(auth_headers, **({"Range": range_header} if range_header else {}))
+
+    resp = api_client.get(f"/api/v1/evidence/{evidence_id}/content", headers=headers)
+
+    assert resp.status_code == status
+    assert resp.content == content[expected]
+    assert len(calls) == 1
@@ -0,0 +1,97 @@
+import json
+import uuid
+
+import pytest
+
+TIED = "2026-04-01T12:00:00"
+
+
+@pytest.fixture
+def reporter(api_client, auth_headers):
+    """A fresh reporter id with incidents created through the bulk route."""
+    reporter_id = f"pager-{uuid.uuid4().hex[:8]}"
+
+    def _create(rows: list[dict]) -> list[int]:
+        body = "\n".join(json.dumps({"reporter_id": reporter_id, "evidence_type": "log", **row}) for row in rows)
+        resp = api_client.post("/api/v1/incidents:bulk", headers=auth_headers, content=body)
+        assert resp.status_code == 200, resp.text
+        return [r["id"] for r in resp.json()["results"]]
+
+    _create.id = reporter_id
+    return _create
+
+
+def _pages(api_client, auth_headers, **params) -> list[list[dict]]:
+    pages, cursor = [], None
+    while True:
+        query = dict(params, **({"cursor": cursor} if cursor else {}))
+        resp = api_client.get("/api/v1/incidents", headers=auth_headers, params=query)
+        assert resp.status_code == 200, resp.text
+        body = resp.json()
+        pages.append(body["items"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def _ids(pages: list[list[dict]]) -> list[int]:
+    return [item["id"] for page in pages for item in page]
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 7, 8])
+def test_pages_through_identical_timestamps(api_client, auth_headers, reporter, limit):
+    tied = reporter([{"created_at": TIED} for _ in range(7)])
+    newer = reporter([{"created_at": "2026-04-01T12:00:01"}])
+    older = reporter([{"created_at": "2026-04-01T11:59:59"}])
+
+    pages = _pages(api_client, auth_headers, reporter_id=reporter.id, limit=limit)
+    ids = _ids(pages)
+
+    assert ids == newer + sorted(tied, reverse=True) + older
+    assert all(len(page) == limit for page in pages[:-1])
+    assert 0 < len(pages[-1]) <= limit
+
+
+def test_new_incidents_do_not_shift_later_pages(api_client, auth_headers, reporter):
+    tied = reporter([{"created_at": TIED} for _ in range(6)])
+    first = api_client.get("/api/v1/incidents", headers=auth_headers, params={"reporter_id": reporter.id, "limit": 3}).json()
+
+    # Lands at the top of the listing, ahead of the cursor.
+    reporter([{"created_at": TIED}, {"created_at": "2026-04-02T00:00:00"}])
+    rest = _pages(api_client, auth_headers, reporter_id=reporter.id, limit=3, cursor=first["next_cursor"])
+
+    assert [i["id"] for i in first["items"]] + _ids(rest) == sorted(tied, reverse=True)
+
+
+def test_filters_apply_on_every_page(api_client, auth_headers, reporter):
+    rows = [
+        {"created_at": TIED, "risk_label": risk, "evidence_type": evidence_type}
+        for risk in ("Red", "Green")
+        for evidence_type in ("log", "email")
+        for _ in range(3)
+    ]
+    ids = reporter(rows)
+    red_logs = [i for i, row in zip(ids, rows) if row["risk_label"] == "Red" and row["evidence_type"] == "log"]
+    window = reporter([
+        {"created_at": "2026-04-03T00:00:00", "risk_label": "Red"},
+        {"created_at": "2026-04-03T06:00:00+05:30", "risk_label": "Red"},
+        {"created_at": "2026-04-04T00:00:00", "risk_label": "Red"},
+    ])
+
+    pages = _pages(api_client, auth_headers, reporter_id=reporter.id, risk_label="Red", evidence_type="log", limit=2)
+    assert _ids(pages) == [window[2], window[1], window[0]] + sorted(red_logs, reverse=True)
+    assert all(item["risk_label"] == "Red" and item["evidence_type"] == "log" for page in pages for item in page)
+
+    # created_after is inclusive, created_before exclusive; offsets are converted to UTC.
+    pages = _pages(
+        api_client, auth_headers, reporter_id=reporter.id, limit=1,
+        created_after="2026-04-02T00:30:00Z", created_before="2026-04-04T00:00:00Z",
+    )
+    assert _ids(pages) == [window[1], window[0]]
+    pages = _pages(api_client, auth_headers, reporter_id=reporter.id, limit=1, created_after="2026-04-03T00:00:00Z")
+    assert _ids(pages) == [window[2], window[1], window[0]]
+
+
+def test_invalid_cursor_is_rejected(api_client, auth_headers):
+    resp = api_client.get("/api/v1/incidents", headers=auth_headers, params={"cursor": "not-a-cursor"})
+    assert resp.status_code == 400
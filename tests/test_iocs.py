@@ -0,0 +1,63 @@
+import pytest
+
+from app import iocs
+
+
+def test_url_host_is_also_an_indicator():
+    found = iocs.extract("beacon to http://Evil.com/gate.php and https://198.51.100.4:8443/x and http://[2001:db8::1]/p")
+    assert ("url", "http://evil.com/gate.php") in found
+    assert ("domain", "evil.com") in found
+    assert ("ipv4", "198.51.100.4") in found
+    assert ("ipv6", "2001:db8::1") in found
+
+
+def test_defanged_indicators_are_refanged():
+    found = iocs.extract("C2 at hxxp://evil[.]com/a, mail from bad(at)phish[.]org, host 203.0.113[.]9")
+    assert {("url", "http://evil.com/a"), ("domain", "evil.com"), ("email", "bad@phish.org"), ("ipv4", "203.0.113.9")} <= found
+
+
+@pytest.mark.parametrize("value, kind, normalized", [
+    ("evil[.]com", "domain", "evil.com"),
+    ("hxxps://Evil.com/Path", "url", "https://evil.com/Path"),
+    ("10.0.0.1", "ipv4", "10.0.0.1"),
+    ("D41D8CD98F00B204E9800998ECF8427E", "md5", "d41d8cd98f00b204e9800998ecf8427e"),
+])
+def test_lookup_values_normalize_like_extracted_ones(value, kind, normalized):
+    assert iocs.guess_kind(value) == kind
+    assert iocs.normalize(kind, value) == normalized
+
+
+def test_not_tlds_are_not_domains():
+    assert ("domain", "report.txt") not in iocs.extract("see report.txt")
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 64])
+def test_indicators_split_across_chunks(chunk_size):
+    text = b"alert http://evil.com/gate from 203.0.113.7 hash " + b"a" * 64 + b" mail x@phish.org\n"
+    extractor = iocs.IOCExtractor()
+    for i in range(0, len(text), chunk_size):
+        extractor.feed(text[i:i + chunk_size])
+    assert extractor.finish() == iocs.extract(text.decode())
+
+
+def test_multibyte_characters_split_across_chunks():
+    text = "café → http://évil.example/ ok 192.0.2.1".encode("utf-8")
+    extractor = iocs.IOCExtractor()
+    for i in range(len(text)):
+        extractor.feed(text[i:i + 1])
+    assert ("ipv4", "192.0.2.1") in extractor.finish()
+
+
+def test_indicator_count_is_capped():
+    extractor = iocs.IOCExtractor(max_indicators=5)
+    extractor.feed(" ".join(f"10.0.0.{i}" for i in range(50)).encode())
+    assert len(extractor.finish()) == 5
+    assert extractor.truncated
+
+
+def test_lookup_by_url_host(upload, api_client, auth_headers):
+    incident_id = upload(b"phishing kit served from http://pivot-host.example/login")["incident_id"]
+    resp = api_client.get("/api/v1/indicators/lookup", params={"value": "pivot-host[.]example"}, headers=auth_headers)
+    assert resp.status_code == 200
+    assert resp.json()["kind"] == "domain"
+    assert [i["id"] for i in resp.json()["incidents"]] == [incident_id]
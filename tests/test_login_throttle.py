@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app import api, passwords
+
+
+def test_limiter_blocks_after_max_attempts_until_window_ends():
+    limiter = passwords.AttemptLimiter(max_attempts=2, window_seconds=10)
+    limiter.hit("k", now=0)
+    assert limiter.retry_after("k", now=1) == 0
+    limiter.hit("k", now=1)
+    assert limiter.retry_after("k", now=2) == pytest.approx(8)
+    assert limiter.retry_after("k", now=10) == 0
+    limiter.reset("k")
+    assert limiter.retry_after("k", now=2) == 0
+
+
+def test_limiter_holds_at_most_max_keys_evicting_least_recent():
+    limiter = passwords.AttemptLimiter(max_attempts=1, window_seconds=60, max_keys=3)
+    for key in ("a", "b", "c"):
+        limiter.hit(key, now=0)
+    limiter.hit("a", now=1)  # touch: "b" is now the least recent
+    limiter.hit("d", now=2)
+    assert len(limiter._windows) == 3
+    assert list(limiter._windows) == ["c", "a", "d"]
+    assert limiter.retry_after("b", now=3) == 0
+    assert limiter.retry_after("a", now=3) > 0
+
+
+def _request(peer, real_ip=None):
+    headers = {"X-Real-IP": real_ip} if real_ip else {}
+    return SimpleNamespace(client=SimpleNamespace(host=peer), headers=headers)
+
+
+def test_proxy_header_ignored_by_default(monkeypatch):
+    monkeypatch.setattr(api, "TRUST_PROXY_HEADERS", False)
+    assert api.client_ip(_request("198.51.100.1", "203.0.113.5")) == "198.51.100.1"
+
+
+def test_proxy_header_only_from_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(api, "TRUST_PROXY_HEADERS", True)
+    monkeypatch.setattr(api, "TRUSTED_PROXIES", ())
+    assert api.client_ip(_request("10.0.0.2", "203.0.113.5")) == "203.0.113.5"
+    monkeypatch.setattr(api, "TRUSTED_PROXIES", (api.ipaddress.ip_network("10.0.0.0/24"),))
+    assert api.client_ip(_request("10.0.0.2", "203.0.113.5")) == "203.0.113.5"
+    assert api.client_ip(_request("198.51.100.1", "203.0.113.5")) == "198.51.100.1"
+
+
+def test_spoofed_real_ip_cannot_dodge_ip_throttle(api_client, monkeypatch):
+    monkeypatch.setattr(api, "TRUST_PROXY_HEADERS", False)
+    monkeypatch.setattr(passwords, "ip_limiter", passwords.AttemptLimiter(max_attempts=1, window_seconds=60))
+    passwords.ip_limiter.hit("testclient")
+    resp = api_client.post(
+        "/api/v1/login/token",
+        data={"username": "someone@example.com", "password": "x"},
+        headers={"X-Real-IP": "203.0.113.77"},
+    )
+    assert resp.status_code == 429
+    assert int(resp.headers["Retry-After"]) >= 1
+
+
+def test_full_password_queue_returns_429(api_client, monkeypatch):
+    monkeypatch.setattr(passwords, "_pending", passwords.PASSWORD_QUEUE_LIMIT)
+    resp = api_client.post("/api/v1/users/", json={"email": "queue-full@example.com", "password": "pw-123456"})
+    assert resp.status_code == 429
+    assert resp.headers["Retry-After"] == "1"
+    resp = api_client.post("/api/v1/login/token", data={"username": "queue-full@example.com", "password": "pw-123456"})
+    assert resp.status_code == 429
@@ -0,0 +1,49 @@
+import json
+import os
+
+from app import ml
+
+
+def _write(path, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def test_int8_export_is_served_only_while_it_matches_the_weights(tmp_path):
+    model_dir = str(tmp_path)
+    _write(os.path.join(model_dir, "config.json"), b"{}")
+    _write(os.path.join(model_dir, "model.safetensors"), b"v1")
+    _write(ml._optimized_path(model_dir, ml.TORCH_INT8_FILE), b"int8")
+
+    # An export without a recorded source is not trusted.
+    assert ml.available_backends(model_dir) == ["fp32"]
+
+    with open(ml._optimized_path(model_dir, ml.EXPORT_SOURCE_FILE), "w", encoding="utf-8") as f:
+        json.dump(ml._source_fingerprint(model_dir), f)
+    assert ml.available_backends(model_dir)[0] == "torch-int8"
+
+    # Retraining rewrites the weights; the old export must not be picked.
+    _write(os.path.join(model_dir, "model.safetensors"), b"v2-retrained")
+    assert not ml.export_is_current(model_dir)
+    assert ml.available_backends(model_dir) == ["fp32"]
+
+
+def test_finetuned_version_tracks_weight_contents(tmp_path):
+    model_dir = str(tmp_path / "model")
+    _write(os.path.join(model_dir, "config.json"), b"{}")
+    _write(os.path.join(model_dir, "model.safetensors"), b"v1")
+    first = ml._finetuned_version(model_dir, "fp32")
+    assert ml._finetuned_version(model_dir, "fp32") == first
+    assert ml._finetuned_version(model_dir, "torch-int8") != first
+
+    # Retrained within the same second, same size: still a new version.
+    stat = os.stat(os.path.join(model_dir, "model.safetensors"))
+    _write(os.path.join(model_dir, "model.safetensors"), b"v2")
+    os.utime(os.path.join(model_dir, "model.safetensors"), ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    second = ml._finetuned_version(model_dir, "fp32")
+    assert second != first
+
+    # Identical weights saved again hash the same despite the new mtime.
+    _write(os.path.join(model_dir, "model.safetensors"), b"v2")
+    assert ml._finetuned_version(model_dir, "fp32") == second
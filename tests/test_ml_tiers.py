@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from app import ml
+
+
+class _UniformEncoder:
+    """Every text and label embeds the same, so the fast tier never has a margin."""
+
+    model_id = "uniform"
+
+    def encode(self, texts):
+        return np.ones((len(texts), 4)) / 2
+
+
+@pytest.fixture
+def zero_shot_calls(monkeypatch):
+    calls = []
+
+    def fake_zero_shot(texts, labels, multi_label=True):
+        calls.append(list(texts))
+        return [[(labels[0], 0.9), (labels[1], 0.1)] for _ in texts]
+
+    monkeypatch.setenv("ML_TIERED", "1")
+    monkeypatch.setenv("ML_RESULT_CACHE_SIZE", "0")
+    monkeypatch.setenv("ML_BATCHING", "0")
+    monkeypatch.setattr(ml, "_result_cache", None)
+    monkeypatch.setattr(ml, "_encoder", _UniformEncoder())
+    monkeypatch.setattr(ml, "_encoder_model", ml.get_embedding_model())
+    monkeypatch.setattr(ml, "_label_embeddings", {})
+    monkeypatch.setattr(ml, "_tier_counts", {"fast": 0, "escalated": 0})
+    monkeypatch.setattr(ml, "_run_zero_shot", fake_zero_shot)
+    return calls
+
+
+def test_entry_points_escalate_low_margin_texts(zero_shot_calls):
+    assert ml.classify_text("a")[0] == (ml.SECURITY_LABELS[0], 0.9)
+    assert [r[0][1] for r in ml.classify_many(["b", "c"], batch_size=2)] == [0.9, 0.9]
+    assert zero_shot_calls == [["a"], ["b", "c"]]
+    assert ml.tier_stats()["escalated"] == 3
+
+
+def test_confident_texts_stay_in_fast_tier(zero_shot_calls, monkeypatch):
+    monkeypatch.setenv("ML_ESCALATION_MARGIN", "-1")
+    list(ml.classify_many(["a", "b"]))
+    ml.classify_text("c")
+    assert zero_shot_calls == []
+    assert ml.tier_stats()["fast"] == 3
+
+
+def test_tiering_is_opt_in(zero_shot_calls, monkeypatch):
+    monkeypatch.delenv("ML_TIERED")
+    ml.classify_text("a")
+    assert zero_shot_calls == [["a"]]
+    assert ml.tier_stats()["fast"] + ml.tier_stats()["escalated"] == 0
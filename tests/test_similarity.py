@@ -0,0 +1,156 @@
+import json
+import os
+import random
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+from sqlalchemy import select
+
+from app import jobs, similarity
+from app.db import AsyncSessionLocal, SessionLocal
+from app.models import ClassificationJob, IncidentSignature
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORDS = "login password invoice account verify bank urgent payment link portal server alert update".split()
+
+
+def _text(seed: int, words: int = 150) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) + str(rng.randrange(1000)) for _ in range(words))
+
+
+def _edit(text: str, every: int) -> str:
+    """Replace every ``every``-th word, giving a controllable near-duplicate."""
+    words = text.split()
+    return " ".join(f"changed{i}" if i % every == 0 else w for i, w in enumerate(words))
+
+
+def _similarity(a: str, b: str) -> float:
+    return float(similarity.estimate(similarity.signature(a), similarity.signature(b)[None, :])[0])
+
+
+def test_signature_is_deterministic_across_processes():
+    text = _text(1)
+    code = "from app import similarity; import sys; print(similarity.to_bytes(similarity.signature(sys.argv[1])).hex())"
+    outputs = {
+        subprocess.run(
+            [sys.executable, "-c", code, text],
+            cwd=ROOT, env={**os.environ, "PYTHONHASHSEED": seed}, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        for seed in ("1", "2")
+    }
+
+    assert outputs == {similarity.to_bytes(similarity.signature(text)).hex()}
+
+
+def test_short_text_has_no_signature():
+    assert similarity.signature("abcd") is None
+    assert similarity.signature("abcde") is not None
+
+
+def test_near_duplicates_share_a_bucket_and_dissimilar_texts_do_not():
+    base = _text(2)
+    near = _edit(base, 40)
+    other = _text(3)
+    keys = set(similarity.band_keys(similarity.signature(base)))
+
+    assert _similarity(base, near) >= 0.85
+    assert keys & set(similarity.band_keys(similarity.signature(near)))
+    assert _similarity(base, other) < 0.2
+    assert not keys & set(similarity.band_keys(similarity.signature(other)))
+
+
+def test_signature_round_trips_through_bytes():
+    sig = similarity.signature(_text(4))
+    assert np.array_equal(similarity.from_bytes(similarity.to_bytes(sig)), sig)
+
+
+@pytest.fixture
+def classify(api_client, auth_headers, monkeypatch):
+    """Create incidents from descriptions and run the worker over them.
+
+    The model is replaced by a stub that labels everything "phishing" and
+    records which texts actually reached it.
+    """
+    seen: list[str] = []
+
+    def fake_classify(texts):
+        seen.extend(texts)
+        return [[("phishing", 0.8)] for _ in texts]
+
+    monkeypatch.setattr(jobs.ClassificationWorker, "_classify", staticmethod(fake_classify))
+
+    def _run(*descriptions: str) -> list[int]:
+        body = "\n".join(json.dumps({"reporter_id": "r1", "evidence_type": "text", "description": d}) for d in descriptions)
+        resp = api_client.post("/api/v1/incidents:bulk", headers=auth_headers, content=body)
+        assert resp.status_code == 200, resp.text
+        worker = jobs.ClassificationWorker(batch_size=100, lanes=["default"])
+        while api_client.portal.call(worker.run_once):
+            pass
+        return [r["id"] for r in resp.json()["results"]]
+
+    _run.seen = seen
+    return _run
+
+
+def _jobs(incident_ids: list[int]) -> dict[int, ClassificationJob]:
+    with SessionLocal() as db:
+        rows = db.execute(select(ClassificationJob).where(ClassificationJob.incident_id.in_(incident_ids))).scalars()
+        return {job.incident_id: job for job in rows}
+
+
+def _clusters(incident_ids: list[int]) -> dict[int, int]:
+    with SessionLocal() as db:
+        return dict(db.execute(
+            select(IncidentSignature.incident_id, IncidentSignature.cluster_id)
+            .where(IncidentSignature.incident_id.in_(incident_ids))
+        ).all())
+
+
+def test_near_duplicate_joins_cluster_and_reuses_label(classify):
+    base = _text(5)
+    (original,) = classify(base)
+    near, unrelated = classify(_edit(base, 40), _text(6))
+
+    clusters = _clusters([original, near, unrelated])
+    assert clusters[near] == clusters[original] == original
+    assert clusters[unrelated] == unrelated
+
+    found = _jobs([original, near, unrelated])
+    assert found[near].status == "done" and found[near].reused_from == original
+    assert found[unrelated].status == "done" and found[unrelated].reused_from is None
+    assert base in classify.seen and _edit(base, 40) not in classify.seen
+
+
+@pytest.mark.parametrize("offset, reused", [(0.0, True), (1 / similarity.NUM_PERM, False)])
+def test_reuse_requires_the_reuse_threshold(classify, monkeypatch, offset, reused):
+    base = _text(7 if reused else 8)
+    candidate = _edit(base, 25)
+    score = _similarity(base, candidate)
+    assert similarity.SIMILARITY_THRESHOLD <= score < 1
+    # The candidate still clusters with the original either way; only the
+    # label reuse depends on the stricter threshold.
+    monkeypatch.setattr(similarity, "SIMILARITY_REUSE_THRESHOLD", score + offset)
+
+    (original,) = classify(base)
+    (duplicate,) = classify(candidate)
+
+    assert _clusters([duplicate])[duplicate] == original
+    assert (_jobs([duplicate])[duplicate].reused_from == original) is reused
+    assert (candidate in classify.seen) is not reused
+
+
+def test_neighbours_respect_threshold(api_client, classify):
+    base = _text(9)
+    (original,) = classify(base)
+    sig = similarity.signature(_edit(base, 25))
+    score = _similarity(base, _edit(base, 25))
+
+    async def lookup(threshold):
+        async with AsyncSessionLocal() as db:
+            return await similarity.neighbours(db, sig, threshold=threshold)
+
+    assert original in [n for n, _c, _s in api_client.portal.call(lookup, score)]
+    assert original not in [n for n, _c, _s in api_client.portal.call(lookup, score + 1 / similarity.NUM_PERM)]
@@ -0,0 +1,103 @@
+import io
+import os
+import uuid
+
+import pytest
+
+from app import storage
+from app.db import SessionLocal
+from app.models import EvidenceBlob
+
+
+@pytest.fixture
+def db(api_client):
+    with SessionLocal() as session:
+        yield session
+
+
+def _blob(db, sha256: str) -> EvidenceBlob | None:
+    db.expire_all()
+    return db.get(EvidenceBlob, sha256)
+
+
+def _part_files() -> list[str]:
+    return [name for name in os.listdir(storage.UPLOAD_DIR) if name.endswith(".part")]
+
+
+def test_duplicate_upload_shares_one_blob(db, upload):
+    content = f"duplicate evidence {uuid.uuid4()}".encode()
+    first = upload(content)
+    path = storage.blob_path(first["sha256"])
+    before = os.stat(path)
+
+    second = upload(content)
+
+    assert second["sha256"] == first["sha256"]
+    assert _blob(db, first["sha256"]).ref_count == 2
+    after = os.stat(path)
+    assert (after.st_ino, after.st_mtime_ns) == (before.st_ino, before.st_mtime_ns)
+    assert _part_files() == []
+
+
+def test_deleting_one_reference_keeps_the_blob(db, upload, api_client, auth_headers):
+    content = f"shared evidence {uuid.uuid4()}".encode()
+    first = upload(content)
+    second = upload(content)
+    sha256 = first["sha256"]
+
+    resp = api_client.delete(f"/api/v1/evidence/{first['evidence_id']}", headers=auth_headers)
+    assert resp.status_code == 200
+    assert _blob(db, sha256).ref_count == 1
+    storage.collect_garbage(db, grace_seconds=0)
+    assert os.path.exists(storage.blob_path(sha256))
+    resp = api_client.get(f"/api/v1/evidence/{second['evidence_id']}/content", headers=auth_headers)
+    assert resp.content == content
+
+    resp = api_client.delete(f"/api/v1/evidence/{second['evidence_id']}", headers=auth_headers)
+    assert resp.status_code == 200
+    assert _blob(db, sha256).ref_count == 0
+    assert api_client.delete(f"/api/v1/evidence/{second['evidence_id']}", headers=auth_headers).status_code == 404
+
+
+def test_collect_garbage_removes_only_unreferenced_blobs(db, upload, api_client, auth_headers):
+    kept = upload(f"kept {uuid.uuid4()}".encode())
+    dropped = upload(f"dropped {uuid.uuid4()}".encode())
+    api_client.delete(f"/api/v1/evidence/{dropped['evidence_id']}", headers=auth_headers)
+
+    # Still inside the grace period: nothing goes.
+    storage.collect_garbage(db, grace_seconds=3600)
+    assert os.path.exists(storage.blob_path(dropped["sha256"]))
+
+    result = storage.collect_garbage(db, grace_seconds=0)
+
+    assert result["blobs_removed"] >= 1
+    assert _blob(db, dropped["sha256"]) is None
+    assert not os.path.exists(storage.blob_path(dropped["sha256"]))
+    assert _blob(db, kept["sha256"]).ref_count == 1
+    assert os.path.exists(storage.blob_path(kept["sha256"]))
+
+
+def test_collect_garbage_skips_blob_reacquired_mid_run(db, upload, api_client, auth_headers):
+    content = f"reacquired {uuid.uuid4()}".encode()
+    created = upload(content)
+    sha256 = created["sha256"]
+    api_client.delete(f"/api/v1/evidence/{created['evidence_id']}", headers=auth_headers)
+    assert _blob(db, sha256).ref_count == 0
+
+    # Another upload of the same content lands after the candidate scan
+    # but before the row is locked and re-checked.
+    rollback = db.rollback
+
+    def rollback_then_acquire():
+        rollback()
+        db.rollback = rollback
+        with SessionLocal() as other:
+            storage.acquire_blob(other, storage.stage_encrypted_stream(io.BytesIO(content)))
+            other.commit()
+
+    db.rollback = rollback_then_acquire
+    storage.collect_garbage(db, grace_seconds=0)
+
+    blob = _blob(db, sha256)
+    assert blob is not None and blob.ref_count == 1
+    assert b"".join(storage.decrypt_stream(storage.blob_path(sha256))) == content
@@ -0,0 +1,106 @@
+import os
+
+import pytest
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import InvalidToken
+
+from app import storage
+
+SEGMENT = 16
+
+
+def _encrypt(tmp_path, data: bytes, name: str = "evidence.enc") -> str:
+    path = str(tmp_path / name)
+    with open(path, "wb") as out:
+        encryptor = storage.SegmentEncryptor(out, segment_size=SEGMENT)
+        # Odd-sized writes so segment boundaries never line up with update() calls.
+        for start in range(0, len(data), 7):
+            encryptor.update(data[start : start + 7])
+        assert encryptor.finalize() == storage.compute_sha256(data)
+    return path
+
+
+def _segments(path: str) -> tuple[bytes, list[bytes]]:
+    with open(path, "rb") as f:
+        raw = f.read()
+    body = raw[storage.HEADER_SIZE :]
+    stored = SEGMENT + storage.TAG_SIZE
+    return raw[: storage.HEADER_SIZE], [body[i : i + stored] for i in range(0, len(body), stored)]
+
+
+def _write(path: str, header: bytes, segments: list[bytes]) -> None:
+    with open(path, "wb") as f:
+        f.write(header + b"".join(segments))
+
+
+@pytest.mark.parametrize("size", [0, 1, SEGMENT, 3 * SEGMENT, 3 * SEGMENT + 1])
+def test_round_trip(tmp_path, size):
+    data = os.urandom(size)
+    path = _encrypt(tmp_path, data)
+
+    assert storage.is_segmented(path)
+    assert b"".join(storage.decrypt_stream(path)) == data
+    assert storage.plaintext_size(path) == size
+    if size:
+        assert b"".join(storage.decrypt_range(path, 1, size - 1)) == data[1:]
+
+
+def test_final_segment_is_never_empty_for_exact_multiples(tmp_path):
+    _header, segments = _segments(_encrypt(tmp_path, os.urandom(2 * SEGMENT)))
+    assert len(segments) == 2
+
+
+def test_dropping_the_final_segment_is_rejected(tmp_path):
+    path = _encrypt(tmp_path, os.urandom(3 * SEGMENT + 1))
+    header, segments = _segments(path)
+    # The new final segment was sealed with last=0, so the AAD no longer matches.
+    _write(path, header, segments[:-1])
+
+    with pytest.raises(InvalidTag):
+        list(storage.decrypt_stream(path))
+
+
+def test_reordered_segments_are_rejected(tmp_path):
+    path = _encrypt(tmp_path, os.urandom(3 * SEGMENT + 1))
+    header, segments = _segments(path)
+    _write(path, header, [segments[1], segments[0], *segments[2:]])
+
+    with pytest.raises(InvalidTag):
+        list(storage.decrypt_stream(path))
+
+
+@pytest.mark.parametrize("offset", [0, len(storage.MAGIC), storage.HEADER_SIZE - 1, storage.HEADER_SIZE + 3, -1])
+def test_tampered_bytes_are_rejected(tmp_path, offset):
+    path = _encrypt(tmp_path, os.urandom(2 * SEGMENT + 5))
+    with open(path, "rb") as f:
+        raw = bytearray(f.read())
+    raw[offset] ^= 0x01
+    with open(path, "wb") as f:
+        f.write(raw)
+
+    # A broken magic makes it look like a legacy Fernet token, which fails too.
+    with pytest.raises((InvalidTag, InvalidToken)):
+        list(storage.decrypt_stream(path))
+
+
+def test_segments_from_another_file_are_rejected(tmp_path):
+    data = os.urandom(2 * SEGMENT + 5)
+    header, segments = _segments(_encrypt(tmp_path, data, "a.enc"))
+    _other_header, other_segments = _segments(_encrypt(tmp_path, data, "b.enc"))
+    path = str(tmp_path / "mixed.enc")
+    _write(path, header, [segments[0], other_segments[1], segments[2]])
+
+    with pytest.raises(InvalidTag):
+        list(storage.decrypt_stream(path))
+
+
+def test_legacy_fernet_file_still_decrypts(tmp_path):
+    data = os.urandom(3 * SEGMENT + 1)
+    path = str(tmp_path / "legacy.enc")
+    with open(path, "wb") as f:
+        f.write(storage.encrypt_file(data))
+
+    assert not storage.is_segmented(path)
+    assert b"".join(storage.decrypt_stream(path)) == data
+    assert storage.plaintext_size(path) == len(data)
+    assert b"".join(storage.decrypt_range(path, 5, 20)) == data[5:21]